@@ -3,22 +3,24 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
-load_dotenv()
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# .env ищется сразу в корне проекта, без обхода каталогов; если файла нет - берутся значения по умолчанию
+load_dotenv(BASE_DIR / '.env')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-bsmu^)i)-c1ngqg1%&+jovx#_b0vo(3ndk+fdy6*2_g1(q!&d+'
+SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-bsmu^)i)-c1ngqg1%&+jovx#_b0vo(3ndk+fdy6*2_g1(q!&d+')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# В продакшене DEBUG=0 и ALLOWED_HOSTS=example.com,www.example.com
+DEBUG = bool(int(os.getenv('DEBUG', 1)))
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -38,6 +40,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shop.metrics.MetricsMiddleware',
+    'shop.serving.MediaMiddleware',
+    'shop.templateprofile.TemplateProfileMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,14 +55,27 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'app.urls'
 
+# Шаблоны компилируются один раз на процесс (cached loader); при DEBUG кеш сбрасывается автоперезагрузкой,
+# когда файл шаблона меняется. TEMPLATE_DEBUG хранит в узлах позиции в исходнике для страницы ошибки -
+# это лишняя работа при каждом рендере, в продакшене выключен
+TEMPLATE_DEBUG = bool(int(os.getenv('TEMPLATE_DEBUG', int(DEBUG))))
+# Время рендера и SQL-запросы по каждому include и тегу shop_tags (shop/templateprofile.py)
+TEMPLATE_PROFILE = bool(int(os.getenv('TEMPLATE_PROFILE', 0)))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [
             BASE_DIR / 'templates'
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'debug': TEMPLATE_DEBUG,
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -85,6 +103,30 @@ DATABASES = {
 }
 
 
+# Cache
+# Общий для всех воркеров кеш (Redis), без REDIS_URL - локальный кеш процесса
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Sessions
+# Сессия читается из кеша, в базу пишется только при изменении (write-through).
+# Сообщения (messages) по умолчанию хранятся в cookie и сессию не трогают
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+SESSION_SWEEP_BATCH_SIZE = int(os.getenv('SESSION_SWEEP_BATCH_SIZE', 1000))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -127,8 +169,46 @@ STATICFILES_DIRS = [
     BASE_DIR / 'shop/static'
 ]
 
+# Загрузки получают хеш содержимого в имени (кешируются клиентом навсегда).
+# В продакшене статика собирается командой build_static: бандлы, хеш содержимого
+# в имени файла и предсжатые копии .gz/.br
+STORAGES = {
+    'default': {'BACKEND': 'shop.storage.HashedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+if not DEBUG:
+    STORAGES['staticfiles'] = {'BACKEND': 'shop.storage.CompressedManifestStaticFilesStorage'}
+
+# Бандлы статики: имя бандла в shop/dist/ -> файлы, из которых он собирается
+STATIC_BUNDLES = {
+    'app.css': [
+        'shop/vendor/glightbox/css/glightbox.min.css',
+        'shop/vendor/nouislider/nouislider.min.css',
+        'shop/vendor/choices.js/public/assets/styles/choices.min.css',
+        'shop/vendor/swiper/swiper-bundle.min.css',
+        'shop/css/style.default.css',
+        'shop/css/additional_style.css',
+    ],
+    'app.js': [
+        'shop/vendor/bootstrap/js/bootstrap.bundle.min.js',
+        'shop/vendor/glightbox/js/glightbox.min.js',
+        'shop/vendor/nouislider/nouislider.min.js',
+        'shop/vendor/swiper/swiper-bundle.min.js',
+        'shop/vendor/choices.js/public/assets/scripts/choices.min.js',
+        'shop/js/front.js',
+    ],
+}
+STATIC_BUNDLES_ENABLED = bool(int(os.getenv('STATIC_BUNDLES_ENABLED', int(not DEBUG))))
+# Отдавать статику самим Django (если перед приложением нет nginx)
+STATIC_SERVE = bool(int(os.getenv('STATIC_SERVE', 0)))
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Отдавать загрузки самим Django (MediaMiddleware), по умолчанию только при DEBUG - в продакшене их отдаёт nginx
+MEDIA_SERVE = bool(int(os.getenv('MEDIA_SERVE', int(DEBUG))))
+# Внутренний location nginx, например /protected-media/: Django проверяет запрос и отвечает заголовком
+# X-Accel-Redirect, а сам файл nginx отдаёт через sendfile
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -141,14 +221,55 @@ STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
 
 # Email
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
-EMAIL_HOST = os.getenv('EMAIL_HOST')
-EMAIL_PORT = os.getenv('EMAIL_PORT')
-EMAIL_USE_TLS = bool(int(os.getenv('EMAIL_USE_TLS')))
-EMAIL_USE_SSL = bool(int(os.getenv('EMAIL_USE_SSL')))
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
+EMAIL_USE_TLS = bool(int(os.getenv('EMAIL_USE_TLS', 0)))
+EMAIL_USE_SSL = bool(int(os.getenv('EMAIL_USE_SSL', 0)))
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 
+# Cart
+# Через сколько часов без активности корзина считается брошенной и товар возвращается на склад
+CART_TTL_HOURS = int(os.getenv('CART_TTL_HOURS', 72))
+CART_SWEEP_BATCH_SIZE = int(os.getenv('CART_SWEEP_BATCH_SIZE', 500))
+# Через сколько дней после оплаты заказ переносится в архивные таблицы (archive_orders)
+ORDER_ARCHIVE_DAYS = int(os.getenv('ORDER_ARCHIVE_DAYS', 180))
+ORDER_ARCHIVE_BATCH_SIZE = int(os.getenv('ORDER_ARCHIVE_BATCH_SIZE', 500))
+
+# Sitemap и товарные фиды
+# Собираются командой build_feeds в FEEDS_ROOT и отдаются по адресам /sitemap.xml, /products.xml, /products.csv
+FEEDS_ROOT = os.getenv('FEEDS_ROOT', BASE_DIR / 'feeds')
+# Адрес сайта для абсолютных ссылок в sitemap и фидах, без завершающего /
+SITE_URL = os.getenv('SITE_URL', 'http://127.0.0.1:8000').rstrip('/')
+FEED_CURRENCY = 'USD'
+
+# Metrics
+# Каталог, через который воркеры складывают метрики для /metrics/ (лучше tmpfs, очищать при деплое).
+# Без него /metrics/ показывает только метрики того процесса, который ответил
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+# Токен для сборщика метрик: Authorization: Bearer <токен>; без токена метрики видны только персоналу
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Warm-up
+# Файл создаётся командой warm_caches после прогрева; пока его нет, /ready/ отвечает 503
+WARMUP_READY_FILE = os.getenv('WARMUP_READY_FILE', BASE_DIR / '.warmup-ready')
+
+# Pre-rendering
+# Статические копии анонимных страниц каталога (prerender_pages), nginx отдаёт их без Django
+PRERENDER_ROOT = os.getenv('PRERENDER_ROOT', BASE_DIR / 'prerendered')
+
+
+# Rate limiting
+RATELIMIT_ENABLE = bool(int(os.getenv('RATELIMIT_ENABLE', 1)))
+# Счетчики лежат в этом кеше. С LocMemCache (нет REDIS_URL) у каждого процесса свои счетчики -
+# при N воркерах клиент фактически получает N лимитов; общий лимит - только с Redis
+RATELIMIT_CACHE = 'default'
+# Заголовок с реальным IP клиента, если приложение стоит за прокси, например 'HTTP_X_REAL_IP'
+RATELIMIT_IP_HEADER = os.getenv('RATELIMIT_IP_HEADER')
+# Переопределение лимитов по группам: {'login': '5/m'}
+RATELIMITS = {}
 
 # Languages
 gettext = lambda s: s
@@ -1,12 +1,15 @@
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+from django.urls import path, re_path, include
 from django.conf.urls.i18n import i18n_patterns
+from django.views.static import serve
 
 from app import settings
+from shop.serving import serve_static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Файлы собираются командой build_feeds; в продакшене их лучше отдавать nginx напрямую из FEEDS_ROOT
+    re_path(r'^(?P<path>sitemap(-[\w-]+)?\.xml|products\.(xml|csv))$', serve, {'document_root': settings.FEEDS_ROOT}),
     path('', include('shop.urls')),
     path('i18n/', include('django.conf.urls.i18n'))
 ]
@@ -15,5 +18,7 @@ urlpatterns += i18n_patterns(
     path('', include('shop.urls'))
 )
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.STATIC_SERVE:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static)
+    ]
@@ -1,9 +1,23 @@
-from django.contrib import admin
+import csv
+import io
+from uuid import uuid4
+
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.safestring import mark_safe
 
 from modeltranslation.admin import TranslationAdmin
 
 from .models import *
+from .bulkedit import FIELDS, PREVIEW_ROWS, apply_changes, diff, read_csv
+from .exports import export_action
+from .forms import ProductBulkEditForm, ProductUploadForm
+from .inventory import record
+from .sales import DASHBOARD_DAYS, dashboard
 
 
 class GalleryInline(admin.TabularInline):
@@ -38,6 +52,93 @@ class ProductAdmin(TranslationAdmin):
     list_filter = ('title', 'price')
     list_display_links = ('pk', 'title')
     inlines = (GalleryInline,)
+    actions = ('bulk_edit',)
+    # Загруженный CSV ждёт подтверждения в кеше, форма подтверждения передаёт только ключ
+    bulk_edit_timeout = 60 * 60
+
+    def get_urls(self):
+        return [
+            path('bulk-edit/', self.admin_site.admin_view(self.bulk_edit_view), name='shop_product_bulk_edit'),
+        ] + super().get_urls()
+
+    def bulk_edit_view(self, request):
+        """Массовое изменение цен и остатков из CSV: загрузка, предпросмотр изменений, применение.
+        list_editable сохраняет каждую строку полным save(), здесь - bulk_update пачками только по изменённым полям"""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        if request.method == 'POST' and 'apply' in request.POST:
+            text = cache.get(f'bulkedit:{request.POST.get("token", "")}')
+            if text is None:
+                self.message_user(request, 'Загрузка устарела, загрузите файл ещё раз', messages.ERROR)
+                return redirect('admin:shop_product_bulk_edit')
+            key, rows, errors = read_csv(text)
+            stats, apply_errors = apply_changes(key, rows)
+            cache.delete(f'bulkedit:{request.POST["token"]}')
+            self.message_user(request, f'Изменено товаров: {stats["changed"]}, без изменений: {stats["unchanged"]}, '
+                                       f'пропущено: {len(errors) + len(apply_errors)}')
+            return redirect('admin:shop_product_changelist')
+
+        form = ProductUploadForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            try:
+                text = form.cleaned_data['file'].read().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                form.add_error('file', 'Файл должен быть в кодировке UTF-8')
+            else:
+                if form.cleaned_data['delimiter'] != ',':
+                    # В кеше и при применении - всегда CSV через запятую
+                    rows = csv.reader(io.StringIO(text), delimiter=form.cleaned_data['delimiter'])
+                    text = rows_to_csv(rows)
+                return self.bulk_edit_preview(request, text)
+        return self.bulk_edit_response(request, {'form': form, 'title': 'Загрузка цен и остатков'})
+
+    @admin.action(description='Изменить выбранные товары')
+    def bulk_edit(self, request, queryset):
+        """Одинаковые значения для выбранных товаров - через тот же предпросмотр, что и загрузка CSV"""
+        form = ProductBulkEditForm(request.POST if 'preview' in request.POST else None)
+        if form.is_valid():
+            fields = [name for name in FIELDS if form.cleaned_data[name].strip()]
+            if fields:
+                values = [form.cleaned_data[name] for name in fields]
+                text = rows_to_csv([['id'] + fields] + [[pk] + values for pk in queryset.values_list('pk', flat=True)])
+                return self.bulk_edit_preview(request, text)
+            form.add_error(None, 'Укажите хотя бы одно значение')
+        return self.bulk_edit_response(request, {
+            'form': form, 'title': 'Изменение выбранных товаров', 'action': 'bulk_edit',
+            'selected': request.POST.getlist(admin.helpers.ACTION_CHECKBOX_NAME),
+        })
+
+    def bulk_edit_preview(self, request, text):
+        """Проверка всех строк и сравнение с базой без записи"""
+        key, rows, errors = read_csv(text)
+        stats, changes, diff_errors = diff(key, rows) if key else ({}, [], [])
+        token = uuid4().hex
+        cache.set(f'bulkedit:{token}', text, self.bulk_edit_timeout)
+        return self.bulk_edit_response(request, {
+            'title': 'Проверка изменений',
+            'token': token,
+            'stats': stats,
+            'errors': sorted(errors + diff_errors)[:PREVIEW_ROWS],
+            'errors_count': len(errors) + len(diff_errors),
+            'changes': [(line, product, sorted(edited.items())) for line, product, edited in changes[:PREVIEW_ROWS]],
+        })
+
+    def bulk_edit_response(self, request, context):
+        return TemplateResponse(request, 'admin/shop/product/bulk_edit.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            **context,
+        })
+
+    def save_model(self, request, obj, form, change):
+        """Изменение остатка из админки (в том числе list_editable) записывается в журнал движений"""
+        if 'quantity' not in form.changed_data:
+            return super().save_model(request, obj, form, change)
+        old = Product.objects.select_for_update().filter(pk=obj.pk).values_list('quantity', flat=True).first() or 0
+        super().save_model(request, obj, form, change)
+        delta = obj.quantity - old
+        record([StockMovement(product=obj, delta=delta,
+                              kind=StockMovement.RESTOCK if delta > 0 else StockMovement.ADJUSTMENT)])
 
     def get_photo(self, obj):
         """Отображение миниатюры"""
@@ -49,6 +150,12 @@ class ProductAdmin(TranslationAdmin):
     get_photo.short_description = 'Миниатюра'
 
 
+def rows_to_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     """Отображение отзывов"""
@@ -59,13 +166,15 @@ class ReviewAdmin(admin.ModelAdmin):
 class MailAdmin(admin.ModelAdmin):
     """Почтовые подписки"""
     list_display = ('pk', 'mail', 'user')
+    actions = (export_action('mails', 'csv'), export_action('mails', 'jsonl'))
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """Корзина"""
-    list_display = ('customer', 'created_at', 'is_completed', 'shipping')
+    list_display = ('customer', 'created_at', 'updated_at', 'is_completed', 'shipping', 'total_price', 'total_quantity')
     list_filter = ('customer', 'is_completed')
+    actions = (export_action('orders', 'csv', lookup='order__in'), export_action('orders', 'jsonl', lookup='order__in'))
 
 
 @admin.register(Customer)
@@ -73,13 +182,15 @@ class CustomerAdmin(admin.ModelAdmin):
     """Заказчики"""
     list_display = ('user', 'first_name', 'last_name', 'email')
     list_filter = ('user',)
+    actions = (export_action('customers', 'csv'), export_action('customers', 'jsonl'))
 
 
 @admin.register(OrderProduct)
 class OrderProductAdmin(admin.ModelAdmin):
     """Товары в заказах"""
-    list_display = ('product', 'order', 'quantity', 'added_at')
+    list_display = ('product', 'order', 'quantity', 'price', 'added_at')
     list_filter = ('product',)
+    actions = (export_action('orders', 'csv'), export_action('orders', 'jsonl'))
 
 
 @admin.register(ShippingAddress)
@@ -87,6 +198,68 @@ class ShippingAddressAdmin(admin.ModelAdmin):
     """Адреса доставки"""
     list_display = ('customer', 'city', 'state')
     list_filter = ('customer',)
+    actions = (export_action('shipping', 'csv'), export_action('shipping', 'jsonl'))
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Журнал движений товара, только для чтения"""
+    list_display = ('pk', 'product', 'kind', 'delta', 'order', 'created_at')
+    list_filter = ('kind',)
+    list_select_related = ('product',)
+    raw_id_fields = ('product', 'order')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Архив заказов (archive_orders), только для чтения"""
+    list_display = ('pk', 'customer', 'created_at', 'completed_at', 'total_price', 'total_quantity', 'archived_at')
+    list_select_related = ('customer',)
+    raw_id_fields = ('customer',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SalesDaily)
+class SalesDashboardAdmin(admin.ModelAdmin):
+    """Дашборд продаж вместо списка: выручка и продажи из агрегатов rollup_sales"""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        days = request.GET.get('days', '30')
+        days = int(days) if days.isdigit() and int(days) in DASHBOARD_DAYS else 30
+        context = {
+            **self.admin_site.each_context(request),
+            **dashboard(days),
+            'title': 'Продажи',
+            'opts': self.model._meta,
+            'periods': DASHBOARD_DAYS,
+        }
+        return TemplateResponse(request, 'admin/shop/sales_dashboard.html', context)
 
 
 admin.site.register(Gallery)
@@ -0,0 +1,124 @@
+import gzip
+import json
+import os
+from pathlib import Path
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Prefetch, Q, Sum, prefetch_related_objects
+from django.db.models.functions import TruncHour
+
+from .models import ArchivedOrder, ArchivedOrderProduct, Order, OrderProduct, ShippingAddress
+from .money import Money, MoneyField
+
+ORDER_FIELDS = ('pk', 'created_at', 'total_price', 'total_quantity')
+
+
+# Чтение: рабочие и архивные таблицы через одни и те же функции
+
+def completed_orders(user, cursor=None, limit=10):
+    """Завершённые заказы покупателя из рабочих и архивных таблиц, новые сверху, вместе со строками.
+    Обе таблицы читаются одинаковым keyset-запросом по (created_at, pk) на limit заказов и сливаются;
+    строки загружаются одним запросом на таблицу и только для попавших на страницу заказов"""
+    sources = (
+        (Order.objects.filter(customer__user=user, is_completed=True), OrderProduct),
+        (ArchivedOrder.objects.filter(customer__user=user), ArchivedOrderProduct),
+    )
+    pages = []
+    for orders, lines in sources:
+        orders = orders.only(*ORDER_FIELDS).order_by('-created_at', '-pk')
+        if cursor:
+            created_at, pk = cursor
+            orders = orders.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+        pages.append((list(orders[:limit]), lines))
+
+    page = sorted((order for orders, lines in pages for order in orders),
+                  key=lambda order: (order.created_at, order.pk), reverse=True)[:limit]
+    for orders, lines in pages:
+        prefetch_related_objects([order for order in orders if order in page], Prefetch(
+            'ordered', queryset=lines.objects.select_related('product').order_by('pk')))
+    return page
+
+
+def sales_lines(start, end):
+    """Продажи по часам из строк рабочих и архивных заказов, оплаченных в [start, end):
+    [(час, id товара, id категории, штук, выручка)]"""
+    totals = {}
+    for lines in (OrderProduct.objects, ArchivedOrderProduct.objects):
+        rows = (lines.filter(order__completed_at__gte=start, order__completed_at__lt=end,
+                             product__isnull=False, price__isnull=False)
+                .annotate(hour=TruncHour('order__completed_at'))
+                .values_list('hour', 'product_id', 'product__category_id')
+                .annotate(units=Sum('quantity'), revenue=Sum(F('price') * F('quantity'), output_field=MoneyField()))
+                .order_by())
+        for hour, product_id, category_id, units, revenue in rows:
+            key = hour, product_id, category_id
+            total_units, total_revenue = totals.get(key, (0, Money(0)))
+            totals[key] = total_units + units, total_revenue + revenue
+    return [key + value for key, value in totals.items()]
+
+
+# Перенос в архив
+
+def write_jsonl(directory, orders, lines):
+    """Копия пачки заказов в сжатом JSONL: заказ со строками и адресами на строку, суммы в центах"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'orders-{orders[0].pk}-{orders[-1].pk}.jsonl.gz'
+    tmp = path.with_name(path.name + '.tmp')
+    by_order = {}
+    for line in lines:
+        by_order.setdefault(line.order_id, []).append({
+            'product': line.product_id, 'quantity': line.quantity, 'price': line.price, 'added_at': line.added_at,
+        })
+    with gzip.open(tmp, 'wt', encoding='utf-8') as file:
+        for order in orders:
+            file.write(json.dumps({
+                'id': order.pk, 'customer': order.customer_id, 'created_at': order.created_at,
+                'updated_at': order.updated_at, 'completed_at': order.completed_at, 'shipping': order.shipping,
+                'total_price': order.total_price, 'total_quantity': order.total_quantity,
+                'shipping_addresses': order.shipping_addresses, 'lines': by_order.get(order.pk, []),
+            }, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+    os.replace(tmp, path)
+
+
+def archive_orders(cutoff, batch_size=500, jsonl_dir=None):
+    """Перенос заказов, оплаченных до cutoff, со строками и адресами доставки в архивные таблицы.
+    Пачками по batch_size заказов, каждая пачка - отдельная короткая транзакция.
+    jsonl_dir - дополнительно сохранить каждую пачку в сжатый JSONL.
+    Возвращает (кол-во заказов, кол-во строк)"""
+    orders_count = lines_count = 0
+    while True:
+        with transaction.atomic():
+            orders = list(Order.objects.select_for_update()
+                          .filter(is_completed=True, completed_at__lt=cutoff).order_by('pk')[:batch_size])
+            if not orders:
+                break
+            ids = [order.pk for order in orders]
+            lines = list(OrderProduct.objects.filter(order_id__in=ids).order_by('pk'))
+            addresses = {}
+            for address in (ShippingAddress.objects.filter(order_id__in=ids).order_by('pk')
+                            .values('order_id', 'customer_id', 'city', 'state', 'street', 'created_at')):
+                addresses.setdefault(address.pop('order_id'), []).append(
+                    dict(address, created_at=address['created_at'].isoformat()))
+
+            archived = ArchivedOrder.objects.bulk_create([ArchivedOrder(
+                id=order.pk, customer_id=order.customer_id, created_at=order.created_at,
+                updated_at=order.updated_at, completed_at=order.completed_at, shipping=order.shipping,
+                total_price=order.total_price, total_quantity=order.total_quantity,
+                shipping_addresses=addresses.get(order.pk, []),
+            ) for order in orders])
+            ArchivedOrderProduct.objects.bulk_create([ArchivedOrderProduct(
+                order_id=line.order_id, product_id=line.product_id, quantity=line.quantity,
+                price=line.price, added_at=line.added_at,
+            ) for line in lines], batch_size=1000)
+            if jsonl_dir:
+                write_jsonl(jsonl_dir, archived, lines)
+
+            ShippingAddress.objects.filter(order_id__in=ids).delete()
+            OrderProduct.objects.filter(order_id__in=ids).delete()
+            Order.objects.filter(pk__in=ids).delete()
+
+        orders_count += len(orders)
+        lines_count += len(lines)
+    return orders_count, lines_count
@@ -0,0 +1,157 @@
+import csv
+import io
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone, translation
+from modeltranslation.settings import DEFAULT_LANGUAGE
+from modeltranslation.utils import build_localized_fieldname
+
+from .inventory import record
+from .models import Product, StockMovement
+
+CHUNK_SIZE = 1000
+# Поля, которые правятся массово; color переводимый - правится на основном языке, как в админке
+FIELDS = ('price', 'quantity', 'size', 'color')
+KEYS = ('id', 'slug')
+NON_NEGATIVE = ('price', 'quantity', 'size')
+PREVIEW_ROWS = 200
+
+
+def clean_row(row):
+    """Строка правок {поле: текст} -> {поле: значение}; пустая ячейка - поле не меняется.
+    Ошибки - ValidationError со списком сообщений"""
+    values, errors = {}, []
+    for name in FIELDS:
+        raw = (row.get(name) or '').strip()
+        if not raw:
+            continue
+        field = Product._meta.get_field(name)
+        try:
+            value = field.clean(raw, None)
+        except ValidationError as error:
+            errors += [f'{name}: {message}' for message in error.messages]
+            continue
+        if name in NON_NEGATIVE and value < 0:
+            errors.append(f'{name}: не может быть отрицательным')
+            continue
+        values[name] = value
+    if errors:
+        raise ValidationError(errors)
+    return values
+
+
+def read_csv(text, delimiter=','):
+    """Правки из CSV: колонка id или slug и любые из FIELDS.
+    Возвращает (ключ, [(номер строки, ключ, {поле: значение})], [(номер строки, ошибка)])"""
+    reader = csv.DictReader(io.StringIO(text), delimiter=delimiter)
+    columns = set(reader.fieldnames or ())
+    key = next((key for key in KEYS if key in columns), None)
+    if key is None:
+        return None, [], [(1, 'Нужна колонка id или slug')]
+    if not columns & set(FIELDS):
+        return key, [], [(1, f'Нет колонок для изменения, допустимые: {", ".join(FIELDS)}')]
+
+    rows, errors, seen = [], [], set()
+    for line, row in enumerate(reader, start=2):
+        value = (row.get(key) or '').strip()
+        if key == 'id' and not value.isdigit():
+            errors.append((line, f'Некорректный id: {value!r}'))
+            continue
+        value = int(value) if key == 'id' else value
+        if not value:
+            errors.append((line, 'Пустой slug'))
+            continue
+        if value in seen:
+            errors.append((line, f'Товар {value} встречается повторно'))
+            continue
+        seen.add(value)
+        try:
+            rows.append((line, value, clean_row(row)))
+        except ValidationError as error:
+            errors += [(line, message) for message in error.messages]
+    return key, rows, errors
+
+
+def chunks(items, size=CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def load_products(key, values, lock=False):
+    """{ключ: товар} только с правимыми полями"""
+    products = Product.objects.filter(**{f'{key}__in': values})
+    if lock:
+        products = products.select_for_update()
+    color = build_localized_fieldname('color', DEFAULT_LANGUAGE)
+    products = products.only('pk', 'slug', 'updated_at', color, *FIELDS)
+    return {getattr(product, key): product for product in products}
+
+
+def diff(key, rows, lock=False):
+    """Сравнение правок с базой пачками по CHUNK_SIZE.
+    Возвращает (Counter, [(номер строки, товар, {поле: (было, стало)})], [(номер строки, ошибка)]);
+    строки без фактических изменений в список не попадают"""
+    stats, changes, errors = Counter(), [], []
+    with translation.override(DEFAULT_LANGUAGE):
+        for chunk in chunks(rows):
+            products = load_products(key, [value for line, value, fields in chunk], lock=lock)
+            for line, value, fields in chunk:
+                product = products.get(value)
+                if product is None:
+                    errors.append((line, f'Товар {value} не найден'))
+                    continue
+                edited = {name: (getattr(product, name), new) for name, new in fields.items()
+                          if getattr(product, name) != new}
+                if edited:
+                    changes.append((line, product, edited))
+                else:
+                    stats['unchanged'] += 1
+    stats['changed'] = len(changes)
+    return stats, changes, errors
+
+
+def bulk_set(changes, now):
+    """Один UPDATE на пачку: для каждого поля CASE по группам товаров с одинаковым новым значением,
+    товары без правки этого поля сохраняют своё. В отличие от bulk_update (WHEN на каждую строку)
+    выражение растёт с числом разных значений, а не строк: общая цена или остаток - один WHEN"""
+    groups = {}
+    for line, product, edited in changes:
+        for name, (old, new) in edited.items():
+            groups.setdefault(name, {}).setdefault(new, []).append(product.pk)
+    updates = {}
+    for name, values in groups.items():
+        field = Product._meta.get_field(name)
+        updates[name] = Case(*[When(pk__in=pks, then=Value(value, output_field=field)) for value, pks in values.items()],
+                             default=F(name), output_field=field)
+    if 'color' in updates:
+        # Переводимое поле: основной язык и исходная колонка, как при save()
+        updates[build_localized_fieldname('color', DEFAULT_LANGUAGE)] = updates['color']
+    Product.objects.rewrite(False).filter(pk__in=[product.pk for line, product, edited in changes]).update(
+        **updates, updated_at=now)
+
+
+def apply_changes(key, rows):
+    """Запись правок: пачка - одна транзакция, товары пачки блокируются одним запросом и меняются одним UPDATE
+    только по изменённым полям и updated_at - без полного save() с переводами и сигналами.
+    Изменения остатка попадают в журнал движений. Возвращает Counter (changed, unchanged) и ошибки, как diff"""
+    stats, errors = Counter(), []
+    with translation.override(DEFAULT_LANGUAGE):
+        for chunk in chunks(rows):
+            with transaction.atomic():
+                chunk_stats, changes, chunk_errors = diff(key, chunk, lock=True)
+                stats.update(chunk_stats)
+                errors += chunk_errors
+                if not changes:
+                    continue
+                bulk_set(changes, timezone.now())
+                movements = []
+                for line, product, edited in changes:
+                    if 'quantity' in edited:
+                        old, new = edited['quantity']
+                        movements.append(StockMovement(product_id=product.pk, delta=new - old,
+                                                       kind=StockMovement.RESTOCK if new > old else StockMovement.ADJUSTMENT))
+                record(movements)
+    return stats, errors
@@ -0,0 +1,69 @@
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+from django.utils.translation import get_language
+from django.views.decorators.http import condition
+
+from .models import Category, FavoriteProducts, Product
+
+
+def catalog_condition(last_modified_func):
+    """Conditional GET для страниц каталога.
+    last_modified_func(request, **kwargs) делает один запрос за временем последнего изменения,
+    результат запоминается на запросе и используется и для Last-Modified, и для ETag.
+    Ответ 304 отдается до выполнения view, шаблон не рендерится"""
+
+    def get_last_modified(request, *args, **kwargs):
+        if not hasattr(request, '_catalog_last_modified'):
+            # Непоказанные сообщения должны попасть на страницу - 304 отдавать нельзя
+            if len(get_messages(request)):
+                request._catalog_last_modified = None
+            else:
+                request._catalog_last_modified = last_modified_func(request, **kwargs)
+        return request._catalog_last_modified
+
+    def get_etag(request, *args, **kwargs):
+        last_modified = get_last_modified(request, *args, **kwargs)
+        if last_modified is None:
+            return None
+        # Страница отличается для разных пользователей (избранное, форма отзыва) и языков
+        key = f'{last_modified.isoformat()}|{request.user.pk}|{get_language()}|{request.get_full_path()}'
+        if request.user.is_authenticated:
+            # Избранное не меняет updated_at товаров - в ключ входит его версия
+            key += '|{count}:{last}'.format(**favorites_version(request.user))
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def get_public_last_modified(request, *args, **kwargs):
+        # Last-Modified без учета пользователя безопасен только для анонимов
+        if request.user.is_authenticated:
+            return None
+        return get_last_modified(request, *args, **kwargs)
+
+    return condition(etag_func=get_etag, last_modified_func=get_public_last_modified)
+
+
+def favorites_version(user):
+    """Версия избранного пользователя: количество и последний pk.
+    Меняется при любом добавлении или удалении, один агрегирующий запрос"""
+    return FavoriteProducts.objects.filter(user=user).aggregate(count=Count('pk'), last=Max('pk'))
+
+
+def category_last_modified(request, slug):
+    """Последнее изменение категории, ее подкатегорий и их товаров"""
+    dates = Category.objects.filter(slug=slug).aggregate(
+        category_date=Max('updated_at'),
+        subcategories_date=Max('subcategories__updated_at'),
+        products_date=Max('subcategories__products__updated_at'),
+    )
+    return max((date for date in dates.values() if date), default=None)
+
+
+def product_last_modified(request, slug):
+    """Последнее изменение товара (вместе с фото и отзывами) и похожих товаров его категории"""
+    dates = Product.objects.filter(slug=slug).aggregate(
+        product_date=Max('updated_at'),
+        category_date=Max('category__updated_at'),
+        related_date=Max('category__products__updated_at'),
+    )
+    return max((date for date in dates.values() if date), default=None)
@@ -0,0 +1,154 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+from django.db.models.functions import Coalesce, NullIf
+from django.utils.translation import get_language, gettext_lazy as _
+from modeltranslation.utils import build_localized_fieldname
+
+from . import metrics
+from .caching import category_last_modified
+from .models import Product
+from .money import Money
+
+# Ценовые диапазоны в основных единицах: (ключ для адреса, от, до)
+PRICE_BANDS = (
+    ('0-500', 0, 500),
+    ('500-1000', 500, 1000),
+    ('1000-2000', 1000, 2000),
+    ('2000-', 2000, None),
+)
+# Фильтры в адресе: ?type=<подкатегория>&color=...&size=...&price=<диапазон>, значения можно повторять
+FACETS = (
+    ('type', _('Подкатегории')),
+    ('color', _('Цвет')),
+    ('size', _('Размер')),
+    ('price', _('Цена')),
+)
+FACETS_CACHE_TIMEOUT = 60 * 60
+
+
+def color_expression(language):
+    """Цвет на текущем языке, при пустом переводе - на языке по умолчанию, как в modeltranslation"""
+    localized = build_localized_fieldname('color', language)
+    default = build_localized_fieldname('color', settings.LANGUAGE_CODE)
+    if localized == default:
+        return F(default)
+    return Coalesce(NullIf(F(localized), Value('')), F(default), output_field=CharField())
+
+
+def price_band_expression():
+    whens = []
+    for key, low, high in PRICE_BANDS:
+        condition = Q(price__gte=Money.parse(low))
+        if high is not None:
+            condition &= Q(price__lt=Money.parse(high))
+        whens.append(When(condition, then=Value(key)))
+    return Case(*whens, output_field=CharField())
+
+
+def annotate_facets(queryset, language):
+    """Значения всех фасетов товара как колонки запроса"""
+    return queryset.annotate(
+        facet_type=F('category__slug'),
+        facet_color=color_expression(language),
+        facet_size=F('size'),
+        facet_price=price_band_expression(),
+    )
+
+
+def selected_filters(query):
+    """Выбранные значения фасетов из GET-параметров: {фасет: множество строк}"""
+    filters = {}
+    for name, title in FACETS:
+        values = {value for value in query.getlist(name) if value}
+        if name == 'size':
+            values = {value for value in values if value.isdigit()}
+        if name == 'price':
+            values &= {key for key, low, high in PRICE_BANDS}
+        if values:
+            filters[name] = values
+    return filters
+
+
+def filter_products(queryset, filters, language):
+    """Товары, подходящие под все выбранные фасеты (внутри одного фасета - любое из значений)"""
+    if not filters:
+        return queryset
+    queryset = annotate_facets(queryset, language)
+    for name, values in filters.items():
+        if name == 'size':
+            values = {int(value) for value in values}
+        queryset = queryset.filter(**{f'facet_{name}__in': values})
+    return queryset
+
+
+def count_facets(products, filters, language):
+    """Счётчики всех фасетов одним запросом с GROUP BY по всем фасетам сразу.
+    Сочетаний значений немного, поэтому счётчик каждого фасета досчитывается в памяти:
+    строка учитывается, если проходит фильтры остальных фасетов (выбор внутри фасета счётчики не обнуляет)"""
+    names = [name for name, title in FACETS]
+    rows = (annotate_facets(products, language).order_by()
+            .values_list(*[f'facet_{name}' for name in names]).annotate(count=Count('pk')))
+    counts = {name: {} for name in names}
+    for *values, count in rows:
+        values = dict(zip(names, (str(value) for value in values)))
+        for name in names:
+            if all(values[other] in filters[other] for other in filters if other != name):
+                counts[name][values[name]] = counts[name].get(values[name], 0) + count
+    return counts
+
+
+def toggle_query(query, name, value):
+    """Строка запроса с добавленным или снятым значением фасета, с первой страницы"""
+    query = query.copy()
+    query.pop('page', None)
+    values = query.getlist(name)
+    query.setlist(name, [item for item in values if item != value] if value in values else values + [value])
+    return query.urlencode()
+
+
+def build_facets(request, category, subcategories):
+    """Фасеты страницы категории: для каждого - варианты с числом товаров, признаком выбора и ссылкой.
+    Результат кешируется по категории, языку, набору фильтров и времени последнего изменения категории"""
+    language = get_language()
+    filters = selected_filters(request.GET)
+    last_modified = getattr(request, '_catalog_last_modified', None)
+    if last_modified is None:
+        last_modified = category_last_modified(request, category.slug)
+    filters_key = '&'.join(f'{name}={",".join(sorted(values))}' for name, values in sorted(filters.items()))
+    key = f'{category.pk}|{language}|{last_modified and last_modified.isoformat()}|{filters_key}'
+    cache_key = f'facets:{hashlib.md5(key.encode()).hexdigest()}'
+
+    counts = cache.get(cache_key)
+    metrics.count_cache('facets', counts is not None)
+    if counts is None:
+        products = Product.objects.filter(category__in=[subcategory.pk for subcategory in subcategories])
+        counts = count_facets(products, filters, language)
+        cache.set(cache_key, counts, FACETS_CACHE_TIMEOUT)
+
+    labels = {
+        'type': {subcategory.slug: str(subcategory) for subcategory in subcategories},
+        'size': {size: f'{size} мм' for size in counts['size']},
+        'price': {key: f'${low}+' if high is None else f'${low} - ${high}' for key, low, high in PRICE_BANDS},
+    }
+    order = {
+        'type': [subcategory.slug for subcategory in subcategories],
+        'size': sorted(set(counts['size']) | filters.get('size', set()), key=int),
+        'color': sorted(set(counts['color']) | filters.get('color', set())),
+        'price': [key for key, low, high in PRICE_BANDS],
+    }
+
+    facets = []
+    for name, title in FACETS:
+        options = [{
+            'value': value,
+            'label': labels.get(name, {}).get(value, value),
+            'count': counts[name].get(value, 0),
+            'selected': value in filters.get(name, ()),
+            'query': toggle_query(request.GET, name, value),
+        } for value in order[name] if name != 'price' or value in counts[name] or value in filters.get(name, ())]
+        if options:
+            facets.append({'name': name, 'title': title, 'options': options})
+    return facets
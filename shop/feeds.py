@@ -0,0 +1,172 @@
+import csv
+import json
+import os
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.urls import reverse
+from django.utils import translation
+from modeltranslation.utils import build_localized_fieldname
+
+from .models import Category, Product, Gallery
+
+CHUNK_SIZE = 2000
+# Ограничение протокола sitemap: не больше 50 000 адресов в одном файле
+SITEMAP_LIMIT = 50000
+MANIFEST = 'manifest.json'
+FEED_COLUMNS = ('id', 'title', 'description', 'link', 'image_link', 'price', 'availability')
+NOIMAGE_URL = 'https://www.easytravel.com.tw/Ehotel/images/noimage.jpg'
+
+
+def languages():
+    return [code for code, name in settings.LANGUAGES]
+
+
+def products_per_sitemap():
+    """Каждый товар даёт по адресу на каждый язык"""
+    return SITEMAP_LIMIT // len(languages())
+
+
+def localized_url(view_name, language, slug):
+    with translation.override(language):
+        return settings.SITE_URL + reverse(view_name, kwargs={'slug': slug})
+
+
+def url_templates(view_name):
+    """Шаблон адреса для каждого языка: reverse один раз, дальше подстановка slug"""
+    return {language: localized_url(view_name, language, '__slug__') for language in languages()}
+
+
+def chunk_stamps():
+    """Куски sitemap по диапазонам pk и их отпечатки (кол-во товаров, последнее изменение).
+    Границы кусков не сдвигаются при удалении товаров, поэтому изменение одного товара
+    затрагивает только его кусок. Один агрегирующий запрос на весь каталог"""
+    size = products_per_sitemap()
+    stats = (Product.objects.annotate(chunk=F('pk') / size).values('chunk')
+             .annotate(count=Count('pk'), updated=Max('updated_at')).order_by('chunk'))
+    return {str(row['chunk']): f'{row["count"]}:{row["updated"].isoformat()}' for row in stats}
+
+
+def write_atomic(path, write):
+    """Файл пишется во временный и подменяется целиком: читатели не видят недописанный"""
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8', newline='') as file:
+        write(file)
+    os.replace(tmp, path)
+
+
+def write_urlset(file, entries):
+    """entries: (lastmod, {язык: адрес}) - для каждого языка своя запись со ссылками на остальные"""
+    file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+               'xmlns:xhtml="http://www.w3.org/1999/xhtml">\n')
+    for lastmod, urls in entries:
+        alternates = ''.join(f'<xhtml:link rel="alternate" hreflang="{language}" href={quoteattr(url)}/>'
+                             for language, url in urls.items())
+        for url in urls.values():
+            file.write(f'<url><loc>{escape(url)}</loc><lastmod>{lastmod:%Y-%m-%d}</lastmod>{alternates}</url>\n')
+    file.write('</urlset>\n')
+
+
+def translated_urls(templates, slug, titles):
+    """Адреса только на тех языках, на которые товар переведён; язык по умолчанию - всегда"""
+    return {language: templates[language].replace('__slug__', slug)
+            for language, title in zip(languages(), titles)
+            if title or language == settings.LANGUAGE_CODE}
+
+
+def product_entries(chunk):
+    size = products_per_sitemap()
+    templates = url_templates('product_page')
+    title_fields = [build_localized_fieldname('title', language) for language in languages()]
+    rows = (Product.objects.filter(pk__gte=chunk * size, pk__lt=(chunk + 1) * size).order_by('pk')
+            .values_list('slug', 'updated_at', *title_fields).iterator(chunk_size=CHUNK_SIZE))
+    for slug, updated_at, *titles in rows:
+        yield updated_at, translated_urls(templates, slug, titles)
+
+
+def category_entries():
+    templates = url_templates('category_detail')
+    title_fields = [build_localized_fieldname('title', language) for language in languages()]
+    rows = Category.objects.filter(parent=None).order_by('pk').values_list('slug', 'updated_at', *title_fields)
+    for slug, updated_at, *titles in rows:
+        yield updated_at, translated_urls(templates, slug, titles)
+
+
+def feed_rows(language):
+    """Строки товарного фида на одном языке: первая фотография берётся подзапросом в том же запросе"""
+    first_image = Gallery.objects.filter(product=OuterRef('pk')).order_by('pk').values('image')[:1]
+    template = url_templates('product_page')[language]
+    with translation.override(language):
+        rows = (Product.objects.annotate(first_image=Subquery(first_image)).order_by('pk')
+                .values_list('pk', 'title', 'description', 'slug', 'first_image', 'price', 'quantity')
+                .iterator(chunk_size=CHUNK_SIZE))
+        for pk, title, description, slug, image, price, quantity in rows:
+            yield (pk, title, description, template.replace('__slug__', slug),
+                   settings.SITE_URL + settings.MEDIA_URL + image if image else NOIMAGE_URL,
+                   f'{price} {settings.FEED_CURRENCY}', 'in stock' if quantity > 0 else 'out of stock')
+
+
+def write_feed_xml(file, rows):
+    """Товарный фид в формате RSS 2.0 Google Merchant Center"""
+    file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0"><channel>\n'
+               f'<title>Shop</title><link>{escape(settings.SITE_URL)}/</link>\n')
+    for pk, title, description, link, image_link, price, availability in rows:
+        file.write(f'<item><g:id>{pk}</g:id><title>{escape(title)}</title>'
+                   f'<description>{escape(description)}</description><link>{escape(link)}</link>'
+                   f'<g:image_link>{escape(image_link)}</g:image_link><g:price>{price}</g:price>'
+                   f'<g:availability>{availability}</g:availability></item>\n')
+    file.write('</channel></rss>\n')
+
+
+def write_feed_csv(file, rows):
+    writer = csv.writer(file)
+    writer.writerow(FEED_COLUMNS)
+    writer.writerows(rows)
+
+
+def write_index(file, names):
+    """names: (имя файла, дата последнего изменения или None)"""
+    file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    for name, lastmod in names:
+        lastmod = f'<lastmod>{lastmod}</lastmod>' if lastmod else ''
+        file.write(f'<sitemap><loc>{escape(settings.SITE_URL)}/{name}</loc>{lastmod}</sitemap>\n')
+    file.write('</sitemapindex>\n')
+
+
+def build_feeds(force=False):
+    """Пересобирает sitemap и товарные фиды в settings.FEEDS_ROOT.
+    Куски sitemap, в которых ничего не менялось с прошлой сборки, не перезаписываются.
+    Возвращает (пересобранные куски, удалённые куски)"""
+    root = Path(settings.FEEDS_ROOT)
+    root.mkdir(parents=True, exist_ok=True)
+    manifest_path = root / MANIFEST
+    previous = {} if force or not manifest_path.exists() else json.loads(manifest_path.read_text())
+
+    stamps = chunk_stamps()
+    changed = [chunk for chunk, stamp in stamps.items()
+               if previous.get(chunk) != stamp or not (root / f'sitemap-products-{chunk}.xml').exists()]
+    removed = [chunk for chunk in previous if chunk not in stamps]
+
+    for chunk in changed:
+        write_atomic(root / f'sitemap-products-{chunk}.xml',
+                     lambda file: write_urlset(file, product_entries(int(chunk))))
+    for chunk in removed:
+        (root / f'sitemap-products-{chunk}.xml').unlink(missing_ok=True)
+
+    write_atomic(root / 'sitemap-categories.xml', lambda file: write_urlset(file, category_entries()))
+    categories_updated = Category.objects.aggregate(date=Max('updated_at'))['date']
+    names = [('sitemap-categories.xml', categories_updated and categories_updated.isoformat())]
+    names += [(f'sitemap-products-{chunk}.xml', stamp.split(':', 1)[1]) for chunk, stamp in stamps.items()]
+    write_atomic(root / 'sitemap.xml', lambda file: write_index(file, names))
+
+    if changed or removed or not (root / 'products.xml').exists():
+        write_atomic(root / 'products.xml', lambda file: write_feed_xml(file, feed_rows(settings.LANGUAGE_CODE)))
+        write_atomic(root / 'products.csv', lambda file: write_feed_csv(file, feed_rows(settings.LANGUAGE_CODE)))
+
+    write_atomic(manifest_path, lambda file: json.dump(stamps, file, indent=2))
+    return changed, removed
@@ -64,3 +64,17 @@ class ShippingForm(forms.ModelForm):
             'state': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nevada'}),
             'street': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'West Warm Springs'}),
         }
+
+
+class ProductUploadForm(forms.Form):
+    """CSV с правками товаров для админки: колонка id или slug и поля price, quantity, size, color"""
+    file = forms.FileField(label='CSV-файл')
+    delimiter = forms.ChoiceField(label='Разделитель', choices=((',', 'Запятая'), (';', 'Точка с запятой')))
+
+
+class ProductBulkEditForm(forms.Form):
+    """Новые значения для выбранных товаров; пустое поле не меняется"""
+    price = forms.CharField(label='Цена', required=False)
+    quantity = forms.CharField(label='Количество на складе', required=False)
+    size = forms.CharField(label='Размер в мм', required=False)
+    color = forms.CharField(label='Цвет/Материал', required=False)
@@ -0,0 +1,92 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db.models import Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, StockMovement, StockSnapshot
+
+BATCH_SIZE = 1000
+# Движения моложе этого не попадают в снимок: id выдаётся до COMMIT, и транзакция с меньшим id
+# может зафиксироваться позже той, что уже видна. Транзакции корзины заметно короче
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+
+def record(movements):
+    """Запись движений одним INSERT; нулевые не пишутся.
+    Вызывается в той же транзакции, что и изменение Product.quantity"""
+    movements = [movement for movement in movements if movement.delta]
+    if movements:
+        StockMovement.objects.bulk_create(movements, batch_size=BATCH_SIZE)
+
+
+def cart_movement(product_id, delta, order_id):
+    """Резерв в корзину (delta < 0) или возврат из неё (delta > 0)"""
+    kind = StockMovement.RESERVATION if delta < 0 else StockMovement.RELEASE
+    return StockMovement(product_id=product_id, kind=kind, delta=delta, order_id=order_id)
+
+
+def ledger_levels(products, full=False, until=None):
+    """Остатки по журналу для queryset товаров: [(id, Product.quantity, остаток по журналу)].
+    Снимок плюс сумма движений после него - читается только хвост журнала по индексу (product, id).
+    full - без снимков, сумма всего журнала; until - учитывать движения с id не больше until.
+    Product.quantity и журнал читаются одним запросом, то есть из одного состояния базы"""
+    if full:
+        products = products.annotate(ledger_base=Value(0), ledger_from=Value(0))
+    else:
+        products = products.annotate(ledger_base=Coalesce('snapshot__quantity', 0),
+                                     ledger_from=Coalesce('snapshot__movement_id', 0))
+    tail = StockMovement.objects.filter(product=OuterRef('pk'), pk__gt=OuterRef('ledger_from'))
+    if until is not None:
+        tail = tail.filter(pk__lte=until)
+    tail = tail.order_by().values('product').annotate(total=Sum('delta')).values('total')
+    rows = (products.annotate(ledger_tail=Coalesce(Subquery(tail), 0)).order_by('pk')
+            .values_list('pk', 'quantity', 'ledger_base', 'ledger_tail'))
+    return [(pk, quantity, base + tail) for pk, quantity, base, tail in rows]
+
+
+def product_batches(batch_size):
+    """id товаров пачками по batch_size, по возрастанию"""
+    last_pk = 0
+    while True:
+        ids = list(Product.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        last_pk = ids[-1]
+        yield ids
+
+
+def take_snapshot(batch_size=BATCH_SIZE):
+    """Переносит движения в снимки остатков, пачками товаров по batch_size, один UPSERT на пачку.
+    Возвращает (кол-во товаров, id последнего учтённого движения)"""
+    watermark = (StockMovement.objects.filter(created_at__lt=timezone.now() - SNAPSHOT_LAG)
+                 .aggregate(last=Max('pk'))['last'])
+    if watermark is None:
+        return 0, 0
+
+    count = 0
+    for ids in product_batches(batch_size):
+        snapshots = [StockSnapshot(product_id=pk, quantity=level, movement_id=watermark)
+                     for pk, quantity, level in ledger_levels(Product.objects.filter(pk__in=ids), until=watermark)]
+        StockSnapshot.objects.bulk_create(snapshots, update_conflicts=True, unique_fields=['product'],
+                                          update_fields=['quantity', 'movement_id', 'created_at'])
+        count += len(snapshots)
+    return count, watermark
+
+
+def reconcile(batch_size=BATCH_SIZE, full=False, fix=False):
+    """Сверка журнала с Product.quantity пачками товаров.
+    Возвращает (Counter: products - проверено, mismatched - расхождений, [(id, quantity, по журналу)]).
+    fix - записать корректировки, после которых журнал сходится с Product.quantity"""
+    stats, mismatches = Counter(), []
+    for ids in product_batches(batch_size):
+        rows = ledger_levels(Product.objects.filter(pk__in=ids), full=full)
+        stats['products'] += len(rows)
+        batch = [(pk, quantity, level) for pk, quantity, level in rows if quantity != level]
+        stats['mismatched'] += len(batch)
+        mismatches += batch
+        if fix:
+            record([StockMovement(product_id=pk, kind=StockMovement.ADJUSTMENT, delta=quantity - level)
+                    for pk, quantity, level in batch])
+    return stats, mismatches
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.archive import archive_orders
+
+
+class Command(BaseCommand):
+    """Перенос давно оплаченных заказов из рабочих таблиц (Order, OrderProduct, ShippingAddress)
+    в архивные. История заказов и агрегаты продаж читают обе. Запускается периодически:
+    python manage.py archive_orders --days 180 --jsonl /backup/orders"""
+    help = 'Переносит старые завершённые заказы в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ORDER_ARCHIVE_DAYS,
+                            help='Архивировать заказы, оплаченные раньше, чем столько дней назад')
+        parser.add_argument('--batch-size', type=int, default=settings.ORDER_ARCHIVE_BATCH_SIZE,
+                            help='Сколько заказов переносить в одной транзакции')
+        parser.add_argument('--jsonl', metavar='DIR', help='Дополнительно сохранить пачки в сжатый JSONL')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        orders, lines = archive_orders(cutoff, batch_size=options['batch_size'], jsonl_dir=options['jsonl'])
+        self.stdout.write(self.style.SUCCESS(f'Перенесено в архив заказов: {orders}, строк: {lines}'))
@@ -0,0 +1,69 @@
+from statistics import mean
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from shop.models import Product
+from shop.querybudget import QueryReport
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """Задержка корзины: добавление и удаление товара, страницы корзины и оформления заказа.
+    Сравнивается до и после archive_orders - рабочие таблицы заказов должны стать меньше, а корзина быстрее.
+    Все запросы выполняются в транзакции, которая откатывается: данные в базе не меняются.
+    python manage.py benchmark_cart --repeat 200"""
+    help = 'Измеряет время запросов корзины'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=100, help='Сколько раз пройти по корзине')
+
+    def measure(self, repeat):
+        product = Product.objects.filter(quantity__gt=0).order_by('pk').first()
+        if product is None:
+            raise CommandError('Нет товаров в наличии')
+        user = User.objects.create_user('benchmark-cart')
+        client = Client()
+        client.force_login(user)
+        steps = {
+            'to_cart add': reverse('to_cart', kwargs={'product_id': product.pk, 'action': 'add'}),
+            'cart': reverse('cart'),
+            'checkout': reverse('checkout'),
+            'to_cart delete': reverse('to_cart', kwargs={'product_id': product.pk, 'action': 'delete'}),
+        }
+        # Первый проход заводит покупателя и корзину, он не считается
+        for url in steps.values():
+            client.get(url)
+
+        timings = {name: ([], []) for name in steps}
+        for _ in range(repeat):
+            for name, url in steps.items():
+                with QueryReport() as report:
+                    started = perf_counter()
+                    response = client.get(url)
+                    elapsed = perf_counter() - started
+                if response.status_code >= 400:
+                    raise CommandError(f'{url}: ответ {response.status_code}')
+                timings[name][0].append(elapsed)
+                timings[name][1].append(report.sql_time)
+        return timings
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic(), override_settings(RATELIMIT_ENABLE=False):
+                timings = self.measure(options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f'Проходов: {options["repeat"]}. Среднее, мс:')
+        self.stdout.write(f'  {"шаг":<16}{"запрос":>10}{"SQL":>10}')
+        for name, (requests, queries) in timings.items():
+            self.stdout.write(f'  {name:<16}{mean(requests) * 1000:>10.2f}{mean(queries) * 1000:>10.2f}')
@@ -0,0 +1,58 @@
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from django.views.static import serve
+
+from shop.serving import serve_media
+
+
+class Command(BaseCommand):
+    """Пропускная способность отдачи загрузок: django.views.static.serve (прежний путь через static())
+    против serve_media целиком, диапазоном, повторной проверкой (304) и через X-Accel-Redirect.
+    Ответ читается целиком, как его читал бы WSGI-сервер без sendfile.
+    python manage.py benchmark_media --dir products --repeat 50"""
+    help = 'Измеряет скорость отдачи файлов из MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default='products', help='Каталог внутри MEDIA_ROOT')
+        parser.add_argument('--repeat', type=int, default=20, help='Сколько раз отдать каждый файл')
+
+    def handle(self, *args, **options):
+        root = Path(settings.MEDIA_ROOT)
+        files = sorted(path.relative_to(root).as_posix() for path in (root / options['dir']).rglob('*') if path.is_file())
+        if not files:
+            raise CommandError(f'Нет файлов в {root / options["dir"]}')
+        factory = RequestFactory()
+        etags = {name: serve_media(factory.get('/'), name).headers['ETag'] for name in files}
+
+        modes = {
+            'static.serve': lambda name: serve(factory.get('/'), name, document_root=root),
+            'serve_media': lambda name: serve_media(factory.get('/'), name),
+            'range 64K': lambda name: serve_media(factory.get('/', HTTP_RANGE='bytes=0-65535'), name),
+            '304': lambda name: serve_media(factory.get('/', HTTP_IF_NONE_MATCH=etags[name]), name),
+        }
+        self.stdout.write(f'Файлов: {len(files)}, проходов: {options["repeat"]}')
+        self.stdout.write(f'  {"режим":<16}{"запросов/с":>12}{"МБ/с":>10}')
+        for mode, view in modes.items():
+            self.report(mode, view, files, options['repeat'])
+        with override_settings(MEDIA_ACCEL_REDIRECT='/protected-media/'):
+            self.report('x-accel', modes['serve_media'], files, options['repeat'])
+
+    def report(self, mode, view, files, repeat):
+        transferred = 0
+        started = perf_counter()
+        for _ in range(repeat):
+            for name in files:
+                response = view(name)
+                if response.status_code >= 400:
+                    raise CommandError(f'{name}: ответ {response.status_code}')
+                if response.streaming:
+                    transferred += sum(len(chunk) for chunk in response.streaming_content)
+                else:
+                    transferred += len(response.content)
+                response.close()
+        elapsed = perf_counter() - started
+        self.stdout.write(f'  {mode:<16}{repeat * len(files) / elapsed:>12.0f}{transferred / elapsed / 2 ** 20:>10.1f}')
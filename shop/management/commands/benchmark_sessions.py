@@ -0,0 +1,86 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from shop.models import Category, Product
+from shop.querybudget import QueryReport
+
+ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+
+def default_urls():
+    """Типичные страницы авторизованного покупателя"""
+    urls = [reverse('index'), reverse('cart'), reverse('checkout')]
+    category = Category.objects.filter(parent=None).first()
+    product = Product.objects.first()
+    if category:
+        urls.append(category.get_absolute_url())
+    if product:
+        urls.append(product.get_absolute_url())
+    return urls
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """Сравнение движков сессий: сколько SQL-запросов на запрос авторизованного пользователя
+    уходит в целом и в таблицу django_session (чтение/запись).
+    Все запросы выполняются в транзакции, которая откатывается: данные в базе не меняются.
+    python manage.py benchmark_sessions --engines db cached_db"""
+    help = 'Считает SQL-запросы на запрос для разных SESSION_ENGINE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engines', nargs='+', default=['db', 'cached_db'], choices=ENGINES)
+        parser.add_argument('--url', action='append', dest='urls', help='Адрес страницы, можно несколько раз')
+        parser.add_argument('--repeat', type=int, default=10, help='Сколько раз пройти по страницам')
+
+    def measure(self, engine, urls, repeat):
+        with override_settings(SESSION_ENGINE=ENGINES[engine]):
+            user = User.objects.create_user('benchmark-sessions')
+            client = Client()
+            client.force_login(user)
+            # Первый проход заводит корзину и прогревает кеш, он не считается
+            for url in urls:
+                client.get(url)
+
+            total = reads = writes = 0
+            for _ in range(repeat):
+                for url in urls:
+                    with QueryReport() as report:
+                        response = client.get(url)
+                    if response.status_code >= 400:
+                        raise CommandError(f'{url}: ответ {response.status_code}')
+                    total += len(report.queries)
+                    for sql in report.queries:
+                        if 'django_session' in sql:
+                            if sql.lstrip().upper().startswith('SELECT'):
+                                reads += 1
+                            else:
+                                writes += 1
+        requests = repeat * len(urls)
+        return total / requests, reads / requests, writes / requests
+
+    def handle(self, *args, **options):
+        urls = options['urls'] or default_urls()
+        results = {}
+        for engine in options['engines']:
+            try:
+                with transaction.atomic():
+                    results[engine] = self.measure(engine, urls, options['repeat'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+        self.stdout.write(f'Страниц: {len(urls)}, проходов: {options["repeat"]}. SQL-запросов на один запрос:')
+        self.stdout.write(f'  {"движок":<16}{"всего":>8}{"чтение сессии":>16}{"запись сессии":>16}')
+        for engine, (total, reads, writes) in results.items():
+            self.stdout.write(f'  {engine:<16}{total:>8.2f}{reads:>16.2f}{writes:>16.2f}')
@@ -0,0 +1,102 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Выполняется в отдельном "холодном" процессе: импорт Django, setup() и первый запрос
+PROBE_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import django
+django.setup()
+ready = time.perf_counter()
+from django.test import Client
+response = Client().get({url!r}, HTTP_HOST='localhost')
+finished = time.perf_counter()
+print(json.dumps({{'setup': ready - started, 'first_request': finished - ready, 'status': response.status_code}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Суммарное собственное время импорта (мкс) по пакетам верхнего уровня из вывода -X importtime"""
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us)
+    return packages
+
+
+class Command(BaseCommand):
+    """Замер холодного старта: django.setup() и первый запрос в новом процессе,
+    плюс разбивка времени импорта по пакетам (python -X importtime).
+    Результат можно сохранить (--output) и сравнивать с ним следующие замеры (--baseline)"""
+    help = 'Измеряет время холодного старта приложения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/', help='Адрес первого запроса')
+        parser.add_argument('--repeat', type=int, default=5, help='Сколько процессов запустить')
+        parser.add_argument('--top', type=int, default=15, help='Сколько самых медленных пакетов показать')
+        parser.add_argument('--output', help='Сохранить результат в JSON')
+        parser.add_argument('--baseline', help='JSON прошлого замера для сравнения')
+        parser.add_argument('--max-regression', type=float, default=0.2,
+                            help='Допустимое замедление относительно baseline (0.2 = 20%%)')
+
+    def run_probe(self, url):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'app.settings'))
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE_SCRIPT.format(url=url)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if process.returncode != 0:
+            raise CommandError(f'Процесс замера завершился с ошибкой:\n{process.stderr[-2000:]}')
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        result['imports'] = parse_importtime(process.stderr)
+        return result
+
+    def handle(self, *args, **options):
+        runs = [self.run_probe(options['url']) for _ in range(options['repeat'])]
+
+        imports = defaultdict(list)
+        for run in runs:
+            for package, self_us in run['imports'].items():
+                imports[package].append(self_us)
+
+        result = {
+            'url': options['url'],
+            'status': runs[-1]['status'],
+            'setup': statistics.median(run['setup'] for run in runs),
+            'first_request': statistics.median(run['first_request'] for run in runs),
+            'imports_us': {package: int(statistics.median(values)) for package, values in imports.items()},
+        }
+        result['total'] = result['setup'] + result['first_request']
+
+        self.stdout.write(f'Медиана по {len(runs)} запускам (ответ {result["status"]}):')
+        self.stdout.write(f'  django.setup():   {result["setup"] * 1000:8.1f} мс')
+        self.stdout.write(f'  первый запрос:    {result["first_request"] * 1000:8.1f} мс')
+        self.stdout.write(f'  итого:            {result["total"] * 1000:8.1f} мс')
+        self.stdout.write('Самые медленные пакеты при импорте (собственное время):')
+        slowest = sorted(result['imports_us'].items(), key=lambda item: item[1], reverse=True)
+        for package, self_us in slowest[:options['top']]:
+            self.stdout.write(f'  {package:<30} {self_us / 1000:8.1f} мс')
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(result, file, indent=2, ensure_ascii=False)
+
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            limit = baseline['total'] * (1 + options['max_regression'])
+            if result['total'] > limit:
+                raise CommandError(f'Старт замедлился: {result["total"] * 1000:.1f} мс, '
+                                   f'baseline {baseline["total"] * 1000:.1f} мс')
+            self.stdout.write(self.style.SUCCESS(
+                f'Без регрессии: {result["total"] * 1000:.1f} мс (baseline {baseline["total"] * 1000:.1f} мс)'
+            ))
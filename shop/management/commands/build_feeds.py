@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.feeds import build_feeds
+
+
+class Command(BaseCommand):
+    """Сборка sitemap.xml и товарных фидов (products.xml, products.csv) в settings.FEEDS_ROOT.
+    Товары читаются курсором, файлы пишутся потоком, sitemap делится на куски до 50 000 адресов.
+    Повторный запуск перезаписывает только куски с изменившимися товарами, поэтому команду можно
+    запускать часто (cron, systemd timer): python manage.py build_feeds"""
+    help = 'Собирает sitemap и товарные фиды'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересобрать все куски заново')
+
+    def handle(self, *args, **options):
+        changed, removed = build_feeds(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлы в {settings.FEEDS_ROOT}: пересобрано кусков sitemap: {len(changed)}, удалено: {len(removed)}'
+        ))
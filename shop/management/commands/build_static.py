@@ -0,0 +1,80 @@
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import rcssmin
+    import rjsmin
+except ImportError:  # минификаторы не обязательны, vendor-файлы уже минифицированы
+    rcssmin = rjsmin = None
+
+
+BUNDLES_DIR = Path(settings.BASE_DIR) / 'shop' / 'static' / 'shop' / 'dist'
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)(?P<url>[^\'")]+)\1\s*\)')
+SOURCE_MAP_RE = re.compile(r'^\s*(//|/\*)# sourceMappingURL=.*$', re.MULTILINE)
+
+
+def rebase_css_urls(content, source, bundle):
+    """Относительные url() в css пересчитываются от папки бандла"""
+    source_dir = posixpath.dirname(source)
+    bundle_dir = posixpath.dirname(bundle)
+
+    def replace(match):
+        url = match.group('url')
+        if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(source_dir, url))
+        return f'url("{posixpath.relpath(target, bundle_dir)}")'
+
+    return CSS_URL_RE.sub(replace, content)
+
+
+class Command(BaseCommand):
+    """Сборка статики для продакшена:
+    1. склеивает файлы из settings.STATIC_BUNDLES в shop/dist/app.css и shop/dist/app.js;
+    2. запускает collectstatic, который добавляет хеш содержимого в имена и кладет рядом .gz/.br"""
+    help = 'Собирает бандлы статики и запускает collectstatic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bundles-only', action='store_true',
+                            help='Только собрать бандлы, без collectstatic')
+
+    def handle(self, *args, **options):
+        BUNDLES_DIR.mkdir(parents=True, exist_ok=True)
+
+        for name, sources in settings.STATIC_BUNDLES.items():
+            bundle = f'shop/dist/{name}'
+            parts = []
+            for source in sources:
+                path = finders.find(source)
+                if not path:
+                    raise CommandError(f'Файл {source} из бандла {name} не найден')
+                content = Path(path).read_text(encoding='utf-8')
+                # Карты исходников в бандл не попадают, ссылки на них только дают 404
+                content = SOURCE_MAP_RE.sub('', content)
+                if name.endswith('.css'):
+                    content = rebase_css_urls(content, source, bundle)
+                parts.append(f'/* {source} */\n{content}')
+
+            if name.endswith('.js'):
+                # ; между файлами, чтобы не склеились выражения без точки с запятой в конце
+                content = '\n;\n'.join(parts)
+                if rjsmin:
+                    content = rjsmin.jsmin(content)
+            else:
+                content = '\n'.join(parts)
+                if rcssmin:
+                    content = rcssmin.cssmin(content)
+
+            (BUNDLES_DIR / name).write_text(content, encoding='utf-8')
+            self.stdout.write(f'{bundle}: {len(sources)} файлов, {len(content.encode()) // 1024} КБ')
+
+        if not options['bundles_only']:
+            call_command('collectstatic', interactive=False, verbosity=options['verbosity'])
+
+        self.stdout.write(self.style.SUCCESS('Статика собрана'))
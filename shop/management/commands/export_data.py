@@ -0,0 +1,37 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.exports import EXPORTS, FORMATS, CHUNK_SIZE, iter_export
+
+
+class Command(BaseCommand):
+    """Потоковая выгрузка заказов, адресов доставки, покупателей и подписчиков.
+    python manage.py export_data orders --format jsonl --output orders.jsonl"""
+    help = 'Выгружает данные магазина в CSV/JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', help='Файл для выгрузки (по умолчанию stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Сколько строк читать из базы за раз')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        lines = iter_export(options['name'], options['format'], chunk_size=options['chunk_size'])
+
+        count = 0
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+                for line in lines:
+                    file.write(line)
+                    count += 1
+        else:
+            for line in lines:
+                sys.stdout.write(line)
+                count += 1
+
+        # Статистика в stderr, чтобы не смешиваться с выгрузкой в stdout
+        self.stderr.write(f'Выгружено строк: {count} за {time.perf_counter() - started:.1f} с')
@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+NGINX_TEMPLATE = """\
+# Сгенерировано: python manage.py nginx_config
+# Файлы с хешем содержимого в имени (build_static) кешируются клиентом навсегда
+location ~ "^{static_url}(?<static_path>.+\\.[0-9a-f]{{12}}\\.[^./]+)$" {{
+    alias {static_root}/$static_path;
+    gzip_static on;
+{brotli}    add_header Cache-Control "public, max-age=31536000, immutable";
+    add_header Vary Accept-Encoding;
+    access_log off;
+}}
+
+location {static_url} {{
+    alias {static_root}/;
+    gzip_static on;
+{brotli}    add_header Cache-Control "public, no-cache";
+    add_header Vary Accept-Encoding;
+}}
+
+# Загрузки: имена с хешем содержимого (HashedFileSystemStorage) кешируются навсегда.
+# nginx сам отдаёт Range, ETag и 304, файл уходит через sendfile
+location ~ "^{media_url}(?<media_path>.+\\.[0-9a-f]{{12}}\\.[^./]+)$" {{
+    alias {media_root}/$media_path;
+    sendfile on;
+    add_header Cache-Control "public, max-age=31536000, immutable";
+    access_log off;
+}}
+
+location {media_url} {{
+    alias {media_root}/;
+    sendfile on;
+    add_header Cache-Control "public, no-cache";
+}}
+{media_accel}
+# sitemap и товарные фиды (build_feeds)
+location ~ "^/(sitemap(-[\\w-]+)?\\.xml|products\\.(xml|csv))$" {{
+    root {feeds_root};
+    gzip on;
+    gzip_types application/xml text/csv;
+    add_header Cache-Control "public, no-cache";
+}}
+"""
+
+# Ответы Django с X-Accel-Redirect (MEDIA_ACCEL_REDIRECT): снаружи недоступен.
+# Cache-Control приходит из ответа Django
+MEDIA_ACCEL_TEMPLATE = """
+location {accel_url} {{
+    internal;
+    alias {media_root}/;
+    sendfile on;
+}}
+"""
+
+# Подключается внутрь server {}; location @django проксирует в приложение и задаётся отдельно
+PRERENDER_TEMPLATE = """
+# Статические страницы каталога (prerender_pages) для анонимных посетителей.
+# Язык выбирается как в LocaleMiddleware: префикс адреса, cookie django_language, Accept-Language
+set $prerender_lang {default_language};
+if ($http_accept_language ~* "^{languages_re}") {{
+    set $prerender_lang $1;
+}}
+if ($cookie_django_language ~ "^{languages_re}$") {{
+    set $prerender_lang $1;
+}}
+if ($uri ~ "^/{languages_re}/") {{
+    set $prerender_lang $1;
+}}
+set $prerender_dir {prerender_root}/$prerender_lang;
+# Сессия, сообщения, параметры запроса (фильтры, сортировка, страницы) и не GET - всегда в Django
+if ($cookie_sessionid) {{
+    set $prerender_dir /nonexistent;
+}}
+if ($cookie_messages) {{
+    set $prerender_dir /nonexistent;
+}}
+if ($args) {{
+    set $prerender_dir /nonexistent;
+}}
+if ($request_method !~ ^(GET|HEAD)$) {{
+    set $prerender_dir /nonexistent;
+}}
+
+location / {{
+    root /;
+    try_files $prerender_dir$uri/index.html @django;
+    add_header Cache-Control "no-cache";
+    add_header Vary "Accept-Language, Cookie";
+}}
+"""
+
+
+class Command(BaseCommand):
+    """Генерация блоков location для отдачи собранной статики, загрузок, sitemap, фидов и статических страниц через nginx"""
+    help = 'Выводит конфигурацию nginx для статики'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-brotli', action='store_true',
+                            help='Не использовать brotli_static (нет модуля ngx_brotli)')
+        parser.add_argument('--prerender', action='store_true',
+                            help='Добавить отдачу статических страниц каталога (prerender_pages)')
+        parser.add_argument('--output', help='Записать конфигурацию в файл вместо вывода на экран')
+
+    def handle(self, *args, **options):
+        config = NGINX_TEMPLATE.format(
+            static_url=settings.STATIC_URL,
+            static_root=str(settings.STATIC_ROOT).rstrip('/'),
+            feeds_root=str(settings.FEEDS_ROOT).rstrip('/'),
+            media_url=settings.MEDIA_URL,
+            media_root=str(settings.MEDIA_ROOT).rstrip('/'),
+            media_accel=MEDIA_ACCEL_TEMPLATE.format(
+                accel_url=settings.MEDIA_ACCEL_REDIRECT.rstrip('/') + '/',
+                media_root=str(settings.MEDIA_ROOT).rstrip('/'),
+            ) if settings.MEDIA_ACCEL_REDIRECT else '',
+            brotli='' if options['no_brotli'] else '    brotli_static on;\n',
+        )
+        if options['prerender']:
+            config += PRERENDER_TEMPLATE.format(
+                default_language=settings.LANGUAGE_CODE,
+                languages_re='({})'.format('|'.join(code for code, name in settings.LANGUAGES)),
+                prerender_root=str(settings.PRERENDER_ROOT).rstrip('/'),
+            )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(config)
+            self.stdout.write(self.style.SUCCESS(f'Конфигурация записана в {options["output"]}'))
+        else:
+            self.stdout.write(config, ending='')
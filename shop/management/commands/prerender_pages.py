@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.prerender import prerender
+
+
+class Command(BaseCommand):
+    """Публикация статических копий анонимных страниц каталога (главная, первые страницы категорий, товары)
+    для обоих деревьев адресов (/ru/... и без префикса) в settings.PRERENDER_ROOT, откуда их отдаёт nginx
+    (python manage.py nginx_config --prerender). Страницы рендерятся пулом процессов; повторный запуск
+    перерисовывает только страницы, зависящие от изменённых товаров и категорий:
+    python manage.py prerender_pages --workers 4"""
+    help = 'Пререндерит страницы каталога в статические файлы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Перерисовать все страницы')
+        parser.add_argument('--workers', type=int, help='Число процессов (по умолчанию - по числу ядер)')
+        parser.add_argument('--batch-size', type=int, default=50, help='Страниц на одно задание процесса')
+
+    def handle(self, *args, **options):
+        rendered, removed = prerender(force=options['force'], workers=options['workers'],
+                                      batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлы в {settings.PRERENDER_ROOT}: перерисовано страниц: {rendered}, удалено: {removed}'
+        ))
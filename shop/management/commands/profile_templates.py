@@ -0,0 +1,47 @@
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from shop.management.commands.benchmark_sessions import default_urls
+from shop.templateprofile import install, profiling
+
+
+class Command(BaseCommand):
+    """Профиль рендера страниц: время и SQL-запросы по каждому include и тегу shop_tags.
+    Время и запросы узла - собственные, без вложенных в него include и тегов. Первый проход прогревает кеши и не считается.
+    python manage.py profile_templates --url /ru/category/rings/ --repeat 50 --user admin"""
+    help = 'Время рендера и SQL-запросы по include и тегам шаблонов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', dest='urls', help='Адрес страницы, можно несколько раз')
+        parser.add_argument('--repeat', type=int, default=20, help='Сколько раз запросить каждую страницу')
+        parser.add_argument('--user', help='Запрашивать от имени этого пользователя')
+
+    def handle(self, *args, **options):
+        client = Client()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Нет пользователя {options["user"]}')
+            client.force_login(user)
+        repeat = options['repeat']
+        install(force=True)
+
+        for url in options['urls'] or default_urls():
+            client.get(url)
+            elapsed = 0
+            with profiling() as stats:
+                for _ in range(repeat):
+                    started = perf_counter()
+                    response = client.get(url)
+                    elapsed += perf_counter() - started
+                    if response.status_code >= 400:
+                        raise CommandError(f'{url}: ответ {response.status_code}')
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{url}: {elapsed / repeat * 1000:.2f} мс на запрос'))
+            self.stdout.write(f'  {"узел":<56}{"вызовов":>9}{"мс":>9}{"SQL":>6}')
+            for label, (calls, seconds, queries) in sorted(stats.items(), key=lambda item: item[1][1], reverse=True):
+                self.stdout.write(f'  {label:<56}{calls / repeat:>9.1f}{seconds / repeat * 1000:>9.2f}'
+                                  f'{queries / repeat:>6.1f}')
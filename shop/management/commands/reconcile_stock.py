@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.inventory import BATCH_SIZE, reconcile
+
+
+class Command(BaseCommand):
+    """Сверка журнала движений с Product.quantity. По умолчанию остаток по журналу - снимок плюс
+    движения после него; --full пересчитывает весь журнал (проверяет и сами снимки).
+    Код выхода 1 при расхождениях, для cron и мониторинга:
+    python manage.py reconcile_stock --full"""
+    help = 'Сверяет журнал движений товаров с остатками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Сколько товаров сверять за один запрос')
+        parser.add_argument('--full', action='store_true', help='Суммировать весь журнал, без снимков')
+        parser.add_argument('--fix', action='store_true',
+                            help='Записать корректировки, чтобы журнал сошёлся с Product.quantity')
+        parser.add_argument('--show', type=int, default=20, help='Сколько расхождений вывести')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stats, mismatches = reconcile(batch_size=options['batch_size'], full=options['full'], fix=options['fix'])
+        for pk, quantity, level in mismatches[:options['show']]:
+            self.stdout.write(f'  товар {pk}: на складе {quantity}, по журналу {level} ({quantity - level:+d})')
+
+        summary = (f'Проверено товаров: {stats["products"]}, расхождений: {stats["mismatched"]} '
+                   f'за {time.perf_counter() - started:.1f} с')
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(summary))
+        elif options['fix']:
+            self.stdout.write(self.style.WARNING(f'{summary}; записаны корректировки'))
+        else:
+            raise CommandError(summary, returncode=1)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.sales import rollup_sales
+
+
+class Command(BaseCommand):
+    """Обновление агрегатов продаж по часам и дням для дашборда в админке.
+    Пересчитывается только то, что оплачено после последнего посчитанного часа,
+    поэтому запускать можно часто (cron, systemd timer): python manage.py rollup_sales"""
+    help = 'Обновляет агрегаты продаж'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Пересчитать всю историю заново')
+
+    def handle(self, *args, **options):
+        period = rollup_sales(rebuild=options['rebuild'])
+        if period is None:
+            self.stdout.write('Оплаченных заказов нет')
+            return
+        start, end = (timezone.localtime(moment) for moment in period)
+        self.stdout.write(self.style.SUCCESS(f'Агрегаты продаж пересчитаны с {start:%Y-%m-%d %H:%M} по {end:%Y-%m-%d %H:%M}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from shop.inventory import BATCH_SIZE, take_snapshot
+
+
+class Command(BaseCommand):
+    """Снимок остатков по журналу движений: после него остаток товара считается как снимок
+    плюс короткий хвост журнала. Запускается периодически (cron, systemd timer):
+    python manage.py snapshot_stock"""
+    help = 'Переносит движения товаров в снимки остатков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Сколько товаров обрабатывать за один запрос')
+
+    def handle(self, *args, **options):
+        products, watermark = take_snapshot(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Снимков остатков: {products}, учтены движения до #{watermark}'))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.utils import release_stale_carts
+
+
+class Command(BaseCommand):
+    """Возврат на склад товаров из брошенных корзин.
+    Запускается периодически (cron, systemd timer):
+    python manage.py sweep_carts --ttl-hours 72"""
+    help = 'Освобождает товар, зарезервированный в брошенных корзинах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-hours', type=int, default=settings.CART_TTL_HOURS,
+                            help='Сколько часов без активности корзина считается живой')
+        parser.add_argument('--batch-size', type=int, default=settings.CART_SWEEP_BATCH_SIZE,
+                            help='Сколько корзин обрабатывать в одной транзакции')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['ttl_hours'])
+        orders, lines, units = release_stale_carts(cutoff, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Очищено корзин: {orders}, строк: {lines}, возвращено на склад единиц товара: {units}'
+        ))
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.utils import clear_expired_sessions
+
+
+class Command(BaseCommand):
+    """Удаление истёкших сессий из базы, замена clearsessions для большой таблицы.
+    Запускается периодически (cron, systemd timer): python manage.py sweep_sessions.
+    Записи в кеше истекают сами, вместе с сессией"""
+    help = 'Удаляет истёкшие сессии пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.SESSION_SWEEP_BATCH_SIZE,
+                            help='Сколько сессий удалять одним запросом')
+
+    def handle(self, *args, **options):
+        deleted = clear_expired_sessions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено истёкших сессий: {deleted}'))
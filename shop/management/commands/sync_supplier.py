@@ -0,0 +1,46 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.prerender import prerender
+from shop.supplier import CHUNK_SIZE, sync_supplier_feed
+
+
+class Command(BaseCommand):
+    """Синхронизация цен и остатков с полным файлом поставщика (CSV: slug, price, quantity).
+    Меняются только товары, у которых строка файла изменилась с прошлой синхронизации, пачками
+    в коротких транзакциях. Запускается после каждой выгрузки поставщика:
+    python manage.py sync_supplier supplier.csv --prerender"""
+    help = 'Обновляет цены и остатки товаров из файла поставщика'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл поставщика, - для чтения из stdin')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Сколько строк обрабатывать в одной транзакции')
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument('--force', action='store_true',
+                            help='Не сверять отпечатки строк, проверить каждый товар')
+        parser.add_argument('--prerender', action='store_true',
+                            help='Перерисовать статические страницы изменённых товаров (prerender_pages)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            if options['path'] == '-':
+                stats = sync_supplier_feed(sys.stdin, options['chunk_size'], options['delimiter'], options['force'])
+            else:
+                with open(options['path'], encoding='utf-8-sig', newline='') as file:
+                    stats = sync_supplier_feed(file, options['chunk_size'], options['delimiter'], options['force'])
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк: {stats["scanned"]}, изменено товаров: {stats["changed"]}, без изменений: {stats["unchanged"]}, '
+            f'нет в каталоге: {stats["unknown"]}, с ошибками: {stats["invalid"]}. '
+            f'{elapsed:.1f} с, {stats["scanned"] / max(elapsed, 1e-6):.0f} строк/с'
+        ))
+        if options['prerender'] and stats['changed']:
+            rendered, removed = prerender()
+            self.stdout.write(f'Статические страницы: перерисовано {rendered}, удалено {removed}')
@@ -0,0 +1,106 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.urls import reverse
+from django.utils import translation
+
+from shop.models import Category, Product
+from shop.views.catalog import SubCategories
+
+
+def warmup_urls(top, pages):
+    """Главная, первые страницы родительских категорий и самые просматриваемые товары на каждом языке"""
+    categories = Category.objects.filter(parent=None).annotate(total=Count('subcategories__products'))
+    categories = [(slug, min(pages, ceil(total / SubCategories.paginate_by)))
+                  for slug, total in categories.values_list('slug', 'total')]
+    products = list(Product.objects.order_by('-watched').values_list('slug', flat=True)[:top])
+    urls = []
+    for language, _ in settings.LANGUAGES:
+        with translation.override(language):
+            urls.append(reverse('index'))
+            for slug, last_page in categories:
+                url = reverse('category_detail', kwargs={'slug': slug})
+                urls += [url] + [f'{url}?page={page}' for page in range(2, last_page + 1)]
+            urls += [reverse('product_page', kwargs={'slug': slug}) for slug in products]
+    return urls
+
+
+def fetch(base_url, path, timeout):
+    """GET страницы запущенного приложения: (адрес, статус, время в секундах)"""
+    started = time.perf_counter()
+    try:
+        with urlopen(Request(base_url + path, headers={'User-Agent': 'warm_caches'}), timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except HTTPError as error:
+        status = error.code
+    except URLError:
+        status = None
+    return path, status, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    """Прогрев только что запущенного приложения после деплоя или перезапуска.
+    Страницы запрашиваются по HTTP у работающего экземпляра, поэтому прогреваются его собственные
+    воркеры: загрузчик шаблонов, каталоги переводов, соединения с БД и её буферы.
+    Первый проход прогревает, второй проверяет: доля страниц, ответивших 200 быстрее --max-latency-ms,
+    считается готовностью. Если она не ниже --min-ready, создаётся файл WARMUP_READY_FILE,
+    и /ready/ начинает отвечать 200 - балансировщик включает экземпляр в работу.
+    python manage.py warm_caches --base-url http://127.0.0.1:8000"""
+    help = 'Прогревает приложение после запуска и отмечает готовность к приёму трафика'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='Адрес запущенного приложения')
+        parser.add_argument('--top', type=int, default=10, help='Сколько популярных товаров прогревать')
+        parser.add_argument('--pages', type=int, default=2, help='Сколько первых страниц каждой категории')
+        parser.add_argument('--workers', type=int, default=8, help='Число параллельных запросов')
+        parser.add_argument('--timeout', type=float, default=30, help='Таймаут запроса в секундах')
+        parser.add_argument('--max-latency-ms', type=float, default=300,
+                            help='Страница считается прогретой, если отвечает быстрее')
+        parser.add_argument('--min-ready', type=float, default=0.95,
+                            help='Доля прогретых страниц, при которой экземпляр готов (0.95 = 95%%)')
+
+    def run_pass(self, base_url, urls, options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            return list(pool.map(lambda path: fetch(base_url, path, options['timeout']), urls))
+
+    def handle(self, *args, **options):
+        ready_file = Path(settings.WARMUP_READY_FILE)
+        ready_file.unlink(missing_ok=True)
+
+        base_url = options['base_url'].rstrip('/')
+        urls = warmup_urls(options['top'], options['pages'])
+        if not urls:
+            raise CommandError('Нет страниц для прогрева')
+
+        cold = self.run_pass(base_url, urls, options)
+        if all(status is None for _, status, _ in cold):
+            raise CommandError(f'Приложение недоступно по адресу {base_url}')
+        warm = self.run_pass(base_url, urls, options)
+
+        limit = options['max_latency_ms'] / 1000
+        failed = [(path, status) for path, status, _ in warm if status != 200]
+        hits = sum(1 for _, status, elapsed in warm if status == 200 and elapsed <= limit)
+        hit_rate = hits / len(urls)
+
+        self.stdout.write(f'Страниц: {len(urls)}, параллельно: {options["workers"]}')
+        for title, results in (('первый проход', cold), ('второй проход', warm)):
+            timings = sorted(elapsed for _, _, elapsed in results)
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(f'  {title}: медиана {statistics.median(timings) * 1000:.1f} мс, '
+                              f'p95 {p95 * 1000:.1f} мс')
+        for path, status in failed:
+            self.stdout.write(self.style.WARNING(f'  {path}: ответ {status or "нет соединения"}'))
+
+        if hit_rate < options['min_ready']:
+            raise CommandError(f'Прогрето {hit_rate:.0%} страниц, нужно не меньше {options["min_ready"]:.0%}')
+        ready_file.write_text(f'{hit_rate:.3f}\n')
+        self.stdout.write(self.style.SUCCESS(f'Готов к трафику: прогрето {hit_rate:.0%} страниц'))
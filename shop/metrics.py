@@ -0,0 +1,175 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+
+# Описание метрик: имя -> (тип, описание, границы корзин гистограммы)
+METRICS = {
+    'shop_http_requests_total': ('counter', 'Запросы по view и классу ответа', None),
+    'shop_http_request_duration_seconds': ('histogram', 'Время обработки запроса по view',
+                                           (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)),
+    'shop_db_queries_per_request': ('histogram', 'SQL-запросов на один запрос по view',
+                                    (1, 2, 5, 10, 20, 50, 100)),
+    'shop_cart_actions_total': ('counter', 'Изменения корзины: add, delete, remove, set, clear, complete', None),
+    'shop_checkout_sessions_total': ('counter', 'Созданные сессии оплаты Stripe по результату', None),
+    'shop_mails_sent_total': ('counter', 'Отправленные письма рассылки', None),
+    'shop_cache_requests_total': ('counter', 'Обращения к кешу по имени и результату (hit, miss)', None),
+    'shop_template_render_seconds': ('histogram', 'Собственное время рендера include и тегов, без вложенных узлов (TEMPLATE_PROFILE)',
+                                     (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)),
+    'shop_template_queries_total': ('counter', 'SQL-запросы include и тегов, без вложенных узлов (TEMPLATE_PROFILE)', None),
+}
+
+
+class Registry:
+    """Счётчики и гистограммы текущего процесса.
+    Значения копятся в памяти и не чаще раза в METRICS_FLUSH_INTERVAL секунд сбрасываются в свой файл
+    в METRICS_DIR. Эндпоинт метрик складывает файлы всех процессов (воркеров gunicorn, команд)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.last_flush = 0
+        self.path = None
+
+    def key(self, name, labels):
+        if name not in METRICS:
+            raise KeyError(f'Неизвестная метрика {name}')
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self.key(name, labels)
+        buckets = METRICS[name][2]
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(buckets) + 1), 0, 0]
+            state[0][bisect_left(buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [[name, dict(labels), value] for (name, labels), value in self.values.items()]
+
+    def flush(self, force=False):
+        """Запись значений процесса в файл METRICS_DIR/<pid>-<время старта>.json"""
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or (not force and now - self.last_flush < settings.METRICS_FLUSH_INTERVAL):
+            return
+        self.last_flush = now
+        if self.path is None:
+            Path(directory).mkdir(parents=True, exist_ok=True)
+            self.path = Path(directory) / f'{os.getpid()}-{time.time_ns()}.json'
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.snapshot()))
+        os.replace(tmp, self.path)
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+atexit.register(registry.flush, force=True)
+
+
+def count_cache(cache_name, hit):
+    """Попадание или промах кеша, для доли попаданий по каждому кешу"""
+    inc('shop_cache_requests_total', cache=cache_name, result='hit' if hit else 'miss')
+
+
+def collect():
+    """Сумма значений всех процессов: {(имя, метки): значение}"""
+    registry.flush(force=True)
+    if settings.METRICS_DIR:
+        snapshots = []
+        for path in Path(settings.METRICS_DIR).glob('*.json'):
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):  # файл удалён или дописывается
+                continue
+    else:
+        snapshots = [registry.snapshot()]
+
+    totals = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot:
+            if name not in METRICS:
+                continue
+            key = name, tuple(sorted(labels.items()))
+            if METRICS[name][0] == 'counter':
+                totals[key] = totals.get(key, 0) + value
+            else:
+                buckets, total, count = totals.get(key, [[0] * len(value[0]), 0, 0])
+                totals[key] = [[a + b for a, b in zip(buckets, value[0])], total + value[1], count + value[2]]
+    return totals
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_prometheus():
+    """Текстовый формат Prometheus (text/plain; version=0.0.4)"""
+    totals = collect()
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        for (metric, labels), value in sorted(totals.items()):
+            if metric != name:
+                continue
+            if kind == 'counter':
+                lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Время ответа, число SQL-запросов и класс ответа по имени view (url_name)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'other'
+        inc('shop_http_requests_total', view=view, status=f'{response.status_code // 100}xx')
+        observe('shop_http_request_duration_seconds', elapsed, view=view)
+        observe('shop_db_queries_per_request', queries[0], view=view)
+        registry.flush()
+        return response
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_product_color_en_product_color_ru'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Последняя активность'),
+        ),
+        migrations.AlterField(
+            model_name='orderproduct',
+            name='added_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['is_completed', 'updated_at'], name='shop_order_activity_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+def merge_active_carts(apps, schema_editor):
+    """Сливает лишние активные корзины покупателя в самую свежую,
+    иначе уникальный индекс не создастся"""
+    Order = apps.get_model('shop', 'Order')
+    OrderProduct = apps.get_model('shop', 'OrderProduct')
+
+    duplicated = (Order.objects.filter(is_completed=False, customer__isnull=False)
+                  .values('customer').annotate(count=models.Count('pk')).filter(count__gt=1)
+                  .values_list('customer', flat=True))
+    for customer_id in duplicated:
+        orders = list(Order.objects.filter(customer_id=customer_id, is_completed=False).order_by('-updated_at', '-pk'))
+        kept, extra = orders[0], orders[1:]
+        lines = {line.product_id: line for line in OrderProduct.objects.filter(order=kept)}
+        for line in OrderProduct.objects.filter(order__in=extra):
+            if line.product_id in lines:
+                kept_line = lines[line.product_id]
+                kept_line.quantity = (kept_line.quantity or 0) + (line.quantity or 0)
+                kept_line.save(update_fields=['quantity'])
+                line.delete()
+            else:
+                line.order = kept
+                line.save(update_fields=['order'])
+                lines[line.product_id] = line
+        Order.objects.filter(pk__in=[order.pk for order in extra]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_order_updated_at_orderproduct_added_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_active_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_completed', False)), fields=('customer',), name='shop_order_one_active_cart'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    """Оставляет по одной записи на пару пользователь-товар"""
+    FavoriteProducts = apps.get_model('shop', 'FavoriteProducts')
+    keep = (FavoriteProducts.objects.values('user', 'product')
+            .annotate(keep_id=models.Min('pk')).values_list('keep_id', flat=True))
+    FavoriteProducts.objects.exclude(pk__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_catalog_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_favorites, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favoriteproducts',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='shop_favorite_unique'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:11
+
+from django.db import migrations, models
+
+import shop.money
+
+
+def price_to_cents(apps, schema_editor):
+    """FloatField в основных единицах -> целые центы"""
+    Product = apps.get_model('shop', 'Product')
+    Product.objects.update(price_cents=models.Func(models.F('price') * 100, function='ROUND'))
+
+
+def price_from_cents(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    Product.objects.update(price=models.ExpressionWrapper(models.F('price_cents') / 100.0,
+                                                          output_field=models.FloatField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_favorite_products_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='price_cents',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        # Временно nullable, чтобы миграцию можно было откатить
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=models.FloatField(null=True, verbose_name='Цена'),
+        ),
+        migrations.RunPython(price_to_cents, price_from_cents),
+        migrations.RemoveField(
+            model_name='product',
+            name='price',
+        ),
+        migrations.RenameField(
+            model_name='product',
+            old_name='price_cents',
+            new_name='price',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=shop.money.MoneyField(verbose_name='Цена'),
+        ),
+    ]
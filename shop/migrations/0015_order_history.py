@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:28
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+import shop.money
+
+
+def fill_totals(apps, schema_editor):
+    """Уже завершённые заказы: цены строк и итоги по текущим ценам товаров"""
+    Product = apps.get_model('shop', 'Product')
+    Order = apps.get_model('shop', 'Order')
+    OrderProduct = apps.get_model('shop', 'OrderProduct')
+    OrderProduct.objects.filter(order__is_completed=True, price__isnull=True).update(
+        price=models.Subquery(Product.objects.filter(pk=models.OuterRef('product_id')).values('price')[:1]))
+    lines = OrderProduct.objects.filter(order=models.OuterRef('pk')).order_by().values('order')
+    Order.objects.filter(is_completed=True).update(
+        total_price=Coalesce(models.Subquery(
+            lines.annotate(total=models.Sum(models.F('price') * models.F('quantity'))).values('total')), 0),
+        total_quantity=Coalesce(models.Subquery(
+            lines.annotate(total=models.Sum('quantity')).values('total')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_product_price_cents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=shop.money.MoneyField(default=0, verbose_name='Сумма'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_quantity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Кол-во товаров'),
+        ),
+        migrations.AddField(
+            model_name='orderproduct',
+            name='price',
+            field=shop.money.MoneyField(blank=True, null=True, verbose_name='Цена при покупке'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'is_completed', 'created_at'], include=('id', 'total_price', 'total_quantity'), name='shop_order_history_idx'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_order_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='supplier_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def opening_balance(apps, schema_editor):
+    """Текущие остатки - первые движения журнала, чтобы журнал сходился с Product.quantity"""
+    Product = apps.get_model('shop', 'Product')
+    StockMovement = apps.get_model('shop', 'StockMovement')
+    movements = (StockMovement(product_id=pk, kind='adjustment', delta=quantity)
+                 for pk, quantity in Product.objects.exclude(quantity=0).values_list('pk', 'quantity').iterator())
+    StockMovement.objects.bulk_create(movements, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_product_supplier_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='shop.product', verbose_name='Товар')),
+                ('quantity', models.IntegerField(verbose_name='Остаток')),
+                ('movement_id', models.BigIntegerField(default=0, verbose_name='Последнее учтённое движение')),
+                ('created_at', models.DateTimeField(auto_now=True, verbose_name='Снят')),
+            ],
+            options={
+                'verbose_name': 'Снимок остатка',
+                'verbose_name_plural': 'Снимки остатков',
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('reservation', 'Резерв в корзине'), ('release', 'Возврат из корзины'), ('sale', 'Продажа'), ('restock', 'Поступление'), ('adjustment', 'Корректировка')], max_length=20, verbose_name='Тип')),
+                ('delta', models.IntegerField(verbose_name='Изменение остатка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.order', verbose_name='Заказ')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='shop.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Движение товара',
+                'verbose_name_plural': 'Движения товаров',
+                'indexes': [models.Index(fields=['product', 'id'], name='shop_movement_product_idx')],
+            },
+        ),
+        migrations.RunPython(opening_balance, migrations.RunPython.noop),
+    ]
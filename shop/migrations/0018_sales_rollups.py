@@ -0,0 +1,85 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:41
+
+import django.db.models.deletion
+import shop.money
+from django.db import migrations, models
+
+
+def fill_completed_at(apps, schema_editor):
+    """Уже завершённые заказы: время оплаты неизвестно, берётся последняя активность"""
+    Order = apps.get_model('shop', 'Order')
+    Order.objects.filter(is_completed=True, completed_at__isnull=True).update(completed_at=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('units', models.IntegerField(verbose_name='Продано, шт.')),
+                ('revenue', shop.money.MoneyField(verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Продажи за день',
+                'verbose_name_plural': 'Продажи',
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('units', models.IntegerField(verbose_name='Продано, шт.')),
+                ('revenue', shop.money.MoneyField(verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Продажи за час',
+                'verbose_name_plural': 'Продажи по часам',
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Оплачен'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['completed_at'], name='shop_order_completed_idx'),
+        ),
+        migrations.AddField(
+            model_name='salesdaily',
+            name='category',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shop.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='salesdaily',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shop.product', verbose_name='Товар'),
+        ),
+        migrations.AddField(
+            model_name='saleshourly',
+            name='category',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shop.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='saleshourly',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shop.product', verbose_name='Товар'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesdaily',
+            constraint=models.UniqueConstraint(fields=('day', 'product'), name='shop_sales_daily_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='saleshourly',
+            constraint=models.UniqueConstraint(fields=('hour', 'product'), name='shop_sales_hourly_unique'),
+        ),
+        migrations.RunPython(fill_completed_at, migrations.RunPython.noop),
+    ]
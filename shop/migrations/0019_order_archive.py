@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:44
+
+import django.db.models.deletion
+import shop.money
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='order',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shop.order', verbose_name='Заказ'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(verbose_name='Создан')),
+                ('updated_at', models.DateTimeField(verbose_name='Последняя активность')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Оплачен')),
+                ('shipping', models.BooleanField(default=True, verbose_name='Доставка')),
+                ('total_price', shop.money.MoneyField(default=0, verbose_name='Сумма')),
+                ('total_quantity', models.PositiveIntegerField(default=0, verbose_name='Кол-во товаров')),
+                ('shipping_addresses', models.JSONField(blank=True, default=list, verbose_name='Адреса доставки')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Перенесён в архив')),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.customer', verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Архивный заказ',
+                'verbose_name_plural': 'Архив заказов',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(blank=True, default=0, null=True)),
+                ('price', shop.money.MoneyField(blank=True, null=True, verbose_name='Цена при покупке')),
+                ('added_at', models.DateTimeField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ordered', to='shop.archivedorder')),
+                ('product', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shop.product')),
+            ],
+            options={
+                'verbose_name': 'Товар в архивном заказе',
+                'verbose_name_plural': 'Товары в архивных заказах',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['customer', 'created_at'], include=('total_price', 'total_quantity'), name='shop_archive_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['completed_at'], name='shop_archive_completed_idx'),
+        ),
+    ]
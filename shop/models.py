@@ -1,6 +1,9 @@
 from django.db import models
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.db.models import F, Sum
+
+from .money import Money, MoneyField
 
 
 class Category(models.Model):
@@ -10,6 +13,7 @@ class Category(models.Model):
     slug = models.SlugField(unique=True, null=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True,
                                verbose_name='Категория', related_name='subcategories')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
 
     def get_absolute_url(self):
         """Ссылка на страницу категории"""
@@ -36,8 +40,9 @@ class Category(models.Model):
 class Product(models.Model):
     """Описание товаров"""
     title = models.CharField(max_length=255, verbose_name='Наименование товара')
-    price = models.FloatField(verbose_name='Цена')
+    price = MoneyField(verbose_name='Цена')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
     watched = models.IntegerField(default=0, verbose_name='Просмотры')
     quantity = models.IntegerField(default=0, verbose_name='Количество на складе')
     description = models.TextField(default='Здесь скоро будет описание', verbose_name='Описание товара')
@@ -46,15 +51,19 @@ class Product(models.Model):
     slug = models.SlugField(unique=True, null=True)
     size = models.IntegerField(default=30, verbose_name='Размер в мм')
     color = models.CharField(max_length=30, default='Серебро', verbose_name='Цвет/Материал')
+    # Отпечаток строки файла поставщика при последней синхронизации (sync_supplier)
+    supplier_hash = models.CharField(max_length=32, blank=True, editable=False)
 
     def get_absolute_url(self):
         """Ссылка на страницу товара"""
         return reverse('product_page', kwargs={'slug': self.slug})
 
     def get_first_photo(self):
-        """Для получения картинки"""
-        if self.images.first():
-            return self.images.first().image.url
+        """Для получения картинки.
+        Берёт images.all(), чтобы в списках товаров работал prefetch_related('images')"""
+        images = self.images.all()
+        if images:
+            return images[0].image.url
         else:
             return 'https://www.easytravel.com.tw/Ehotel/images/noimage.jpg'
 
@@ -67,6 +76,60 @@ class Product(models.Model):
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
+        indexes = [
+            # Время последнего изменения товаров категории для Last-Modified/ETag
+            models.Index(fields=['category', 'updated_at'], name='shop_product_cat_updated_idx'),
+        ]
+
+
+class StockMovement(models.Model):
+    """Движение товара по складу. Журнал только дополняется: строки не меняются и не удаляются.
+    delta - изменение доступного остатка (Product.quantity): резерв в корзину уменьшает его, возврат
+    из корзины увеличивает; продажа записывается парой "возврат резерва + продажа"."""
+    RESERVATION = 'reservation'
+    RELEASE = 'release'
+    SALE = 'sale'
+    RESTOCK = 'restock'
+    ADJUSTMENT = 'adjustment'
+    KINDS = (
+        (RESERVATION, 'Резерв в корзине'),
+        (RELEASE, 'Возврат из корзины'),
+        (SALE, 'Продажа'),
+        (RESTOCK, 'Поступление'),
+        (ADJUSTMENT, 'Корректировка'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='movements', verbose_name='Товар')
+    kind = models.CharField(max_length=20, choices=KINDS, verbose_name='Тип')
+    delta = models.IntegerField(verbose_name='Изменение остатка')
+    # Без внешнего ключа: заказ может уйти в архив (archive_orders) с тем же id
+    order = models.ForeignKey('Order', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                              related_name='+', verbose_name='Заказ')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время')
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.delta:+d}'
+
+    class Meta:
+        verbose_name = 'Движение товара'
+        verbose_name_plural = 'Движения товаров'
+        indexes = [
+            # Остаток = снимок + сумма движений товара после снимка
+            models.Index(fields=['product', 'id'], name='shop_movement_product_idx'),
+        ]
+
+
+class StockSnapshot(models.Model):
+    """Остаток товара по журналу на момент движения movement_id (snapshot_stock)"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='snapshot',
+                                   verbose_name='Товар')
+    quantity = models.IntegerField(verbose_name='Остаток')
+    movement_id = models.BigIntegerField(default=0, verbose_name='Последнее учтённое движение')
+    created_at = models.DateTimeField(auto_now=True, verbose_name='Снят')
+
+    class Meta:
+        verbose_name = 'Снимок остатка'
+        verbose_name_plural = 'Снимки остатков'
 
 
 class Gallery(models.Model):
@@ -115,6 +178,9 @@ class FavoriteProducts(models.Model):
     class Meta:
         verbose_name = 'Избранный товар'
         verbose_name_plural = 'Избранные товары'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='shop_favorite_unique'),
+        ]
 
 
 class Mail(models.Model):
@@ -151,8 +217,13 @@ class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, blank=True, null=True,
                                  verbose_name='Пользователь')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Последняя активность')
     is_completed = models.BooleanField(default=False, verbose_name='Завершен')
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name='Оплачен')
     shipping = models.BooleanField(default=True, verbose_name='Доставка')
+    # Итоги фиксируются при завершении заказа, история заказов не пересчитывает их по строкам
+    total_price = MoneyField(default=0, verbose_name='Сумма')
+    total_quantity = models.PositiveIntegerField(default=0, verbose_name='Кол-во товаров')
 
     def __str__(self):
         return str(self.pk)
@@ -160,20 +231,34 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
+        indexes = [
+            # Поиск брошенных корзин: незавершенные заказы без активности дольше TTL
+            models.Index(fields=['is_completed', 'updated_at'], name='shop_order_activity_idx'),
+            # История заказов покупателя: страница целиком читается из индекса (index-only scan в PostgreSQL)
+            models.Index(fields=['customer', 'is_completed', 'created_at'], include=['id', 'total_price', 'total_quantity'],
+                         name='shop_order_history_idx'),
+            # Инкрементальный пересчёт агрегатов продаж (rollup_sales) читает заказы по времени оплаты
+            models.Index(fields=['completed_at'], name='shop_order_completed_idx'),
+        ]
+        constraints = [
+            # У покупателя может быть только одна активная корзина
+            models.UniqueConstraint(fields=['customer'], condition=models.Q(is_completed=False),
+                                    name='shop_order_one_active_cart'),
+        ]
 
     @property
     def get_cart_total_price(self):
-        """Получение суммы товаров с корзины"""
-        order_products = self.ordered.all()
-        total_price = sum(product.get_total_price for product in order_products)
-        return total_price
+        """Получение суммы товаров с корзины (считается в базе, в целых центах)"""
+        total_price = self.ordered.aggregate(
+            total=Sum(F('product__price') * F('quantity'), output_field=MoneyField())
+        )['total']
+        return total_price or Money(0)
 
     @property
     def get_cart_total_quantity(self):
         """Получение ко-во товаров с корзины"""
-        order_products = self.ordered.all()
-        total_quantity = sum(product.quantity for product in order_products)
-        return total_quantity
+        total_quantity = self.ordered.aggregate(total=Sum('quantity'))['total']
+        return total_quantity or 0
 
 
 class OrderProduct(models.Model):
@@ -181,7 +266,9 @@ class OrderProduct(models.Model):
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
     order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, related_name='ordered')
     quantity = models.IntegerField(default=0, null=True, blank=True)
-    added_at = models.DateTimeField(auto_now_add=True)
+    added_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Цена на момент завершения заказа; у строк корзины пустая
+    price = MoneyField(null=True, blank=True, verbose_name='Цена при покупке')
 
     class Meta:
         verbose_name = 'Товар в заказе'
@@ -190,8 +277,15 @@ class OrderProduct(models.Model):
     @property
     def get_total_price(self):
         """Подсчитывает общую сумму:
-        Например: 5 часов по 300$ = 1500$"""
-        total_price = self.product.price * self.quantity
+        Например: 5 часов по 300$ = 1500$. В завершённом заказе - по цене на момент покупки.
+        None, если цена неизвестна: у старой строки нет ни цены, ни товара"""
+        if self.price is not None:
+            price = self.price
+        elif self.product is not None:
+            price = self.product.price
+        else:
+            return None
+        total_price = price * (self.quantity or 0)
         return total_price
 
 
@@ -210,3 +304,89 @@ class ShippingAddress(models.Model):
     class Meta:
         verbose_name = 'Адрес доставки'
         verbose_name_plural = 'Адреса доставки'
+
+
+class SalesHourly(models.Model):
+    """Продажи товара за час (rollup_sales). Товар и категория без внешнего ключа:
+    удаление товара не должно стирать историю выручки"""
+    hour = models.DateTimeField(verbose_name='Час')
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+                                verbose_name='Товар')
+    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+                                 verbose_name='Категория')
+    units = models.IntegerField(verbose_name='Продано, шт.')
+    revenue = MoneyField(verbose_name='Выручка')
+
+    class Meta:
+        verbose_name = 'Продажи за час'
+        verbose_name_plural = 'Продажи по часам'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'product'], name='shop_sales_hourly_unique'),
+        ]
+
+
+class SalesDaily(models.Model):
+    """Продажи товара за день, собираются из SalesHourly. Дашборд продаж читает только эти таблицы"""
+    day = models.DateField(verbose_name='День')
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+                                verbose_name='Товар')
+    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+                                 verbose_name='Категория')
+    units = models.IntegerField(verbose_name='Продано, шт.')
+    revenue = MoneyField(verbose_name='Выручка')
+
+    class Meta:
+        verbose_name = 'Продажи за день'
+        verbose_name_plural = 'Продажи'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='shop_sales_daily_unique'),
+        ]
+
+
+class ArchivedOrder(models.Model):
+    """Завершённый заказ, перенесённый из рабочих таблиц командой archive_orders. id заказа сохраняется,
+    адреса доставки хранятся вместе с заказом"""
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, blank=True, null=True, related_name='+',
+                                 verbose_name='Пользователь')
+    created_at = models.DateTimeField(verbose_name='Создан')
+    updated_at = models.DateTimeField(verbose_name='Последняя активность')
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name='Оплачен')
+    shipping = models.BooleanField(default=True, verbose_name='Доставка')
+    total_price = MoneyField(default=0, verbose_name='Сумма')
+    total_quantity = models.PositiveIntegerField(default=0, verbose_name='Кол-во товаров')
+    shipping_addresses = models.JSONField(default=list, blank=True, verbose_name='Адреса доставки')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Перенесён в архив')
+
+    def __str__(self):
+        return str(self.pk)
+
+    class Meta:
+        verbose_name = 'Архивный заказ'
+        verbose_name_plural = 'Архив заказов'
+        indexes = [
+            models.Index(fields=['customer', 'created_at'], include=['total_price', 'total_quantity'],
+                         name='shop_archive_history_idx'),
+            models.Index(fields=['completed_at'], name='shop_archive_completed_idx'),
+        ]
+
+
+class ArchivedOrderProduct(models.Model):
+    """Строка архивного заказа"""
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='ordered')
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                                related_name='+')
+    quantity = models.IntegerField(default=0, null=True, blank=True)
+    price = MoneyField(null=True, blank=True, verbose_name='Цена при покупке')
+    added_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Товар в архивном заказе'
+        verbose_name_plural = 'Товары в архивных заказах'
+
+    @property
+    def get_total_price(self):
+        """Сумма строки по цене на момент покупки; None для старых строк без цены"""
+        if self.price is None:
+            return None
+        return self.price * (self.quantity or 0)
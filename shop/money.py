@@ -0,0 +1,115 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import models
+
+CENTS = 100
+# Суммы хранятся в BIGINT: всё, что не помещается в знаковые 64 бита, отклоняется ещё при разборе
+MAX_CENTS = 2 ** 63 - 1
+
+
+class Money(int):
+    """Денежная сумма в минимальных единицах валюты (центах).
+    Это обычный int, поэтому сложение, умножение на количество и сравнение точные,
+    а в шаблонах и str() сумма выводится в основных единицах: Money(95050) -> '950.50'"""
+
+    @classmethod
+    def parse(cls, value):
+        """Сумма в основных единицах (Decimal, float, строка '950.50') -> Money"""
+        # Decimal принимает 'inf', 'NaN' и '1e400', а quantize() на них падает с InvalidOperation
+        # или возвращает NaN. Вызывающие ловят только ValueError - любая такая сумма отклоняется им
+        try:
+            amount = Decimal(str(value).strip().replace(',', '.'))
+            cents = (amount * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        except ArithmeticError:
+            raise ValueError(f'Некорректная сумма: {value!r}')
+        if not cents.is_finite():
+            raise ValueError(f'Некорректная сумма: {value!r}')
+        if abs(cents) > MAX_CENTS:
+            raise ValueError(f'Слишком большая сумма: {value!r}')
+        return cls(cents)
+
+    @property
+    def amount(self):
+        """Сумма в основных единицах"""
+        return Decimal(int(self)).scaleb(-2)
+
+    def __str__(self):
+        sign = '-' if self < 0 else ''
+        major, minor = divmod(abs(int(self)), CENTS)
+        return f'{sign}{major}.{minor:02d}'
+
+    def __repr__(self):
+        return f'Money({self})'
+
+    def __format__(self, format_spec):
+        if not format_spec:
+            return str(self)
+        return format(self.amount, format_spec)
+
+    def __add__(self, other):
+        return Money(int(self) + other) if isinstance(other, int) else NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return Money(int(self) - other) if isinstance(other, int) else NotImplemented
+
+    def __rsub__(self, other):
+        return Money(other - int(self)) if isinstance(other, int) else NotImplemented
+
+    def __mul__(self, other):
+        return Money(int(self) * other) if isinstance(other, int) else NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-int(self))
+
+
+class MoneyFormField(forms.DecimalField):
+    """Ввод суммы в основных единицах с двумя знаками после запятой"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('decimal_places', 2)
+        super().__init__(**kwargs)
+
+    def prepare_value(self, value):
+        return value.amount if isinstance(value, Money) else value
+
+    def clean(self, value):
+        value = super().clean(value)
+        return None if value is None else Money.parse(value)
+
+
+class MoneyField(models.BigIntegerField):
+    """Цена в целых центах. В Python значения приходят как Money,
+    в базе суммы и агрегаты считаются в целых числах.
+    Центы передаются только как Money: Money(10000) - это $100.00. Всё остальное - int, Decimal,
+    float, строка - сумма в основных единицах, как в формах, фикстурах и dumpdata: price=100 - тоже $100.00"""
+    description = 'Денежная сумма в минимальных единицах валюты'
+    default_error_messages = {'invalid': 'Значение “%(value)s” должно быть суммой, например 12.50.'}
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else Money(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Money):
+            return value
+        try:
+            return Money.parse(value)
+        except ValueError:
+            raise ValidationError(self.error_messages['invalid'], code='invalid', params={'value': value})
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, 'resolve_expression'):
+            return value
+        return int(self.to_python(value))
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return '' if value is None else str(value)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': MoneyFormField, **kwargs})
@@ -0,0 +1,138 @@
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone, translation
+
+from .feeds import languages, write_atomic
+from .models import Category, Product
+
+MANIFEST = 'manifest.json'
+# Токен CSRF в сохранённой странице был бы общим для всех посетителей и без cookie всё равно не прошёл бы
+# проверку, поэтому он вырезается; front.js получает свой токен через /csrf/ перед отправкой формы
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_DATA_RE = re.compile(r'(data-csrf=")[^"]*(")')
+
+
+def catalog_pages():
+    """Анонимные страницы каталога и объекты, от которых зависит их содержимое.
+    Возвращает {адрес без языкового префикса: множество ключей 'product:<pk>' / 'category:<pk>'}"""
+    parents = list(Category.objects.filter(parent=None).values_list('pk', 'slug'))
+    subcategories = {}
+    for pk, parent_id in Category.objects.filter(parent__isnull=False).values_list('pk', 'parent_id'):
+        subcategories.setdefault(parent_id, []).append(pk)
+    products_by_category = {}
+    products = list(Product.objects.order_by('pk').values_list('pk', 'slug', 'category_id'))
+    for pk, slug, category_id in products:
+        products_by_category.setdefault(category_id, []).append(pk)
+    top_products = Product.objects.order_by('-watched').values_list('pk', flat=True)[:3]
+
+    pages = {'index': {f'category:{pk}' for pk, slug in parents} | {f'product:{pk}' for pk in top_products}}
+    for pk, slug in parents:
+        # Первая страница категории и счётчики фильтров зависят от всех товаров подкатегорий
+        deps = {f'category:{pk}'}
+        for subcategory in subcategories.get(pk, []):
+            deps.add(f'category:{subcategory}')
+            deps.update(f'product:{product}' for product in products_by_category.get(subcategory, []))
+        pages[f'category_detail:{slug}'] = deps
+    for pk, slug, category_id in products:
+        related = [other for other in products_by_category[category_id] if other != pk][:5]
+        pages[f'product_page:{slug}'] = ({f'product:{pk}', f'category:{category_id}'}
+                                         | {f'product:{other}' for other in related})
+    return pages
+
+
+def page_paths(page, language):
+    """Адреса страницы на языке: из i18n_patterns (/ru/...) и из корневого дерева (без префикса)"""
+    name, _, slug = page.partition(':')
+    with translation.override(language):
+        path = reverse(name, kwargs={'slug': slug} if slug else {})
+    prefix = f'/{language}/'
+    return [path, '/' + path[len(prefix):]] if path.startswith(prefix) else [path]
+
+
+def page_file(root, language, path):
+    return Path(root) / language / path.strip('/') / 'index.html'
+
+
+def render_pages(jobs):
+    """Рендер пачки страниц в процессе пула: [(язык, адрес)] -> [(язык, адрес, записана ли страница)]"""
+    site = urlsplit(settings.SITE_URL)
+    client = Client(HTTP_HOST=site.netloc, secure=site.scheme == 'https')
+    results = []
+    for language, path in jobs:
+        response = client.get(path, HTTP_ACCEPT_LANGUAGE=language)
+        target = page_file(settings.PRERENDER_ROOT, language, path)
+        if response.status_code != 200:
+            target.unlink(missing_ok=True)
+            results.append((language, path, False))
+            continue
+        html = response.content.decode(response.charset or 'utf-8')
+        html = CSRF_DATA_RE.sub(r'\1\2', CSRF_INPUT_RE.sub(r'\1\2', html))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(target, lambda file: file.write(html))
+        results.append((language, path, True))
+    return results
+
+
+def init_worker():
+    """Процесс пула открывает свои соединения с БД (при fork унаследованные закрыты заранее)"""
+    import django
+    django.setup()
+
+
+def changed_objects(since):
+    """Ключи товаров и категорий, изменённых после since"""
+    keys = {f'product:{pk}' for pk in Product.objects.filter(updated_at__gte=since).values_list('pk', flat=True)}
+    keys |= {f'category:{pk}' for pk in Category.objects.filter(updated_at__gte=since).values_list('pk', flat=True)}
+    return keys
+
+
+def prerender(force=False, workers=None, batch_size=50):
+    """Пересобирает статические копии анонимных страниц каталога в settings.PRERENDER_ROOT.
+    Без force перерисовываются только новые страницы и страницы, зависящие от изменённых,
+    новых или удалённых товаров и категорий (карта зависимостей хранится в manifest.json).
+    Возвращает (перерисовано страниц, удалено страниц)"""
+    root = Path(settings.PRERENDER_ROOT)
+    manifest_path = root / MANIFEST
+    previous = {} if force or not manifest_path.exists() else json.loads(manifest_path.read_text())
+    started = timezone.now()
+
+    pages = catalog_pages()
+    old_pages = {page: set(deps) for page, deps in previous.get('pages', {}).items()}
+    if previous:
+        # Добавленные и удалённые товары меняют сам набор зависимостей страницы,
+        # изменённые - попадают в changed по updated_at
+        changed = changed_objects(datetime.fromisoformat(previous['built_at']))
+        stale = {page for page, deps in pages.items()
+                 if page not in old_pages or deps != old_pages[page] or deps & changed}
+    else:
+        stale = set(pages)
+    removed = set(old_pages) - set(pages)
+
+    jobs = [(language, path) for page in sorted(stale) for language in languages()
+            for path in page_paths(page, language)]
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+    # Соединения родителя не должны достаться процессам пула
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        rendered = sum(written for batch in pool.map(render_pages, batches) for language, path, written in batch)
+
+    for page in removed:
+        for language in languages():
+            for path in page_paths(page, language):
+                page_file(root, language, path).unlink(missing_ok=True)
+
+    root.mkdir(parents=True, exist_ok=True)
+    write_atomic(manifest_path, lambda file: json.dump({
+        'built_at': started.isoformat(),
+        'pages': {page: sorted(deps) for page, deps in pages.items()},
+    }, file))
+    return rendered, len(removed)
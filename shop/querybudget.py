@@ -0,0 +1,86 @@
+import re
+from collections import Counter, namedtuple
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Сколько SQL-запросов может сделать страница (max_queries) и сколько раз один и тот же
+# запрос с разными параметрами может повториться сверх первого (max_duplicates).
+# Повторы - признак N+1: запрос в цикле по товарам, строкам корзины, отзывам
+QueryBudget = namedtuple('QueryBudget', ['max_queries', 'max_duplicates'], defaults=[0])
+
+# Бюджеты по имени URL из shop/urls.py, проверяются в shop/tests.py.
+# Бюджет указан для авторизованного пользователя с корзиной и избранным - это самый тяжёлый случай.
+# Бюджеты выставлены впритык: новый запрос на странице - повод осознанно поднять число здесь
+QUERY_BUDGETS = {
+    'index': QueryBudget(5),
+    # Для авторизованных ETag страниц каталога включает версию избранного - плюс один запрос
+    'category_detail': QueryBudget(10),
+    # Фото самого товара и похожих товаров - два prefetch-запроса с одинаковым отпечатком
+    'product_page': QueryBudget(9, max_duplicates=1),
+    'favorite_product_page': QueryBudget(4),
+    'login_registration': QueryBudget(1),
+    'cart': QueryBudget(6),
+    'checkout': QueryBudget(6),
+    # Заказы читаются из рабочей и архивной таблиц, строки - одним запросом на каждую из них
+    'order_history': QueryBudget(5),
+    'csrf_token': QueryBudget(1),
+}
+
+# Адреса, которые не рендерят страницу на GET: меняют данные, ходят во внешние сервисы,
+# принимают только POST или служебные (проверка готовности, метрики)
+NOT_RENDERED = {
+    'user_login', 'user_logout', 'user_registration', 'save_review', 'add_favorite', 'save_subscribers',
+    'to_cart', 'update_cart', 'payment', 'success', 'payment_cancel', 'send_email', 'readiness', 'metrics',
+}
+
+NUMBER_RE = re.compile(r'\b\d+(\.\d+)?\b')
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:\?|%s),?)+\)', re.IGNORECASE)
+
+
+def fingerprint(sql):
+    """Запрос без конкретных значений: одинаковые запросы с разными параметрами совпадают"""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryReport:
+    """Запросы, выполненные внутри блока with"""
+
+    def __init__(self, using=connection):
+        self.context = CaptureQueriesContext(using)
+
+    def __enter__(self):
+        self.context.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.context.__exit__(*exc_info)
+
+    @property
+    def queries(self):
+        return [query['sql'] for query in self.context.captured_queries]
+
+    @property
+    def sql_time(self):
+        """Суммарное время SQL-запросов, секунды"""
+        return sum(float(query['time']) for query in self.context.captured_queries)
+
+    @property
+    def duplicates(self):
+        """{fingerprint: сколько раз запрос повторился сверх первого}"""
+        counts = Counter(fingerprint(sql) for sql in self.queries)
+        return {sql: count - 1 for sql, count in counts.items() if count > 1}
+
+    def check(self, budget):
+        """Список нарушений бюджета, пустой - если страница в него укладывается"""
+        errors = []
+        if len(self.queries) > budget.max_queries:
+            errors.append(f'запросов {len(self.queries)}, бюджет {budget.max_queries}')
+        repeated = sum(self.duplicates.values())
+        if repeated > budget.max_duplicates:
+            details = '\n'.join(f'  x{count + 1}: {sql}' for sql, count in self.duplicates.items())
+            errors.append(f'повторов {repeated}, бюджет {budget.max_duplicates}:\n{details}')
+        return errors
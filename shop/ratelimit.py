@@ -0,0 +1,109 @@
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def get_client_ip(request):
+    """IP клиента. За прокси берется заголовок из RATELIMIT_IP_HEADER (например, HTTP_X_REAL_IP)"""
+    header = getattr(settings, 'RATELIMIT_IP_HEADER', None)
+    if header and request.META.get(header):
+        return request.META[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def get_identity(request, key):
+    """Кого ограничиваем: 'ip' - адрес клиента, 'user_or_ip' - пользователя, а анонима по адресу"""
+    if key == 'user_or_ip' and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{get_client_ip(request)}'
+
+
+def is_rate_limited(request, group, rate, key='user_or_ip'):
+    """Скользящее окно: счетчик текущего окна плюс счетчик предыдущего с весом той доли,
+    на которую предыдущее окно еще попадает в последние period секунд. Фиксированное окно
+    пропустило бы на стыке двух окон вдвое больше лимита. Возвращает 0, если лимит не превышен,
+    иначе сколько секунд ждать. Две операции с кешем: атомарный incr и чтение предыдущего счетчика"""
+    limit, period = parse_rate(rate)
+    window, elapsed = divmod(time.time(), period)
+    prefix = f'ratelimit:{group}:{get_identity(request, key)}'
+    cache_key = f'{prefix}:{int(window)}'
+    cache = caches[settings.RATELIMIT_CACHE]
+
+    try:
+        count = cache.incr(cache_key)
+    except ValueError:
+        # Первый запрос в окне; add не перезапишет счетчик, если его успел создать параллельный запрос.
+        # Счетчик живет два окна: в следующем он читается как предыдущий
+        if cache.add(cache_key, 1, timeout=2 * period + 1):
+            count = 1
+        else:
+            count = cache.incr(cache_key)
+    previous = cache.get(f'{prefix}:{int(window) - 1}', 0)
+
+    if previous * (1 - elapsed / period) + count <= limit:
+        return 0
+    if count <= limit:
+        # Лимит превышен за счет предыдущего окна: ждем, пока его вес опустится достаточно
+        wait = period * (1 - (limit - count) / previous) - elapsed
+    else:
+        # Текущее окно переполнено само: ждем его конца и пока оно, став предыдущим, не потеряет вес
+        wait = period - elapsed + period * (1 - limit / count)
+    return max(math.ceil(wait), 1)
+
+
+def too_many_requests(request, retry_after):
+    """Ответ 429 с Retry-After"""
+    text = 'Слишком много запросов, попробуйте позже'
+    if 'application/json' in request.headers.get('Accept', ''):
+        response = JsonResponse({'error': text}, status=429)
+    else:
+        response = HttpResponse(text, status=429, content_type='text/plain; charset=utf-8')
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(group, rate, key='user_or_ip', methods=None):
+    """Декоратор ограничения частоты запросов к view.
+    group - имя лимита, через settings.RATELIMITS[group] его можно переопределить без правки кода;
+    methods - какие HTTP-методы считать (по умолчанию все)"""
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if settings.RATELIMIT_ENABLE and (methods is None or request.method in methods):
+                retry_after = is_rate_limited(request, group, settings.RATELIMITS.get(group, rate), key)
+                if retry_after:
+                    return too_many_requests(request, retry_after)
+            return view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class RateLimitMixin:
+    """То же для классовых view: ratelimit_group, ratelimit_rate, ratelimit_key, ratelimit_methods"""
+    ratelimit_group = None
+    ratelimit_rate = None
+    ratelimit_key = 'user_or_ip'
+    ratelimit_methods = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if settings.RATELIMIT_ENABLE and (self.ratelimit_methods is None or request.method in self.ratelimit_methods):
+            rate = settings.RATELIMITS.get(self.ratelimit_group, self.ratelimit_rate)
+            retry_after = is_rate_limited(request, self.ratelimit_group, rate, self.ratelimit_key)
+            if retry_after:
+                return too_many_requests(request, retry_after)
+        return super().dispatch(request, *args, **kwargs)
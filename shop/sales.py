@@ -0,0 +1,108 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .archive import sales_lines
+from .models import ArchivedOrder, Category, Order, Product, SalesDaily, SalesHourly
+from .money import Money
+
+# Заказы, оплаченные позже этого, ждут следующего запуска: completed_at ставится до COMMIT
+ROLLUP_LAG = timedelta(minutes=5)
+# Первичный пересчёт истории идёт окнами, каждое - своя транзакция
+ROLLUP_WINDOW = timedelta(days=31)
+DASHBOARD_DAYS = (7, 30, 90, 365)
+
+
+def start_of_day(moment):
+    return timezone.make_aware(datetime.combine(timezone.localdate(moment), time.min))
+
+
+def rollup_window(start, end, cutoff):
+    """Пересчёт часов [start, end) из строк заказов (рабочих и архивных), оплаченных до cutoff,
+    и дней, которые они задевают"""
+    lines = sales_lines(start, min(end, cutoff))
+    day_start = start_of_day(start)
+    with transaction.atomic():
+        SalesHourly.objects.filter(hour__gte=start, hour__lt=end).delete()
+        SalesHourly.objects.bulk_create([
+            SalesHourly(hour=hour, product_id=product_id, category_id=category_id, units=units, revenue=revenue)
+            for hour, product_id, category_id, units, revenue in lines
+        ], batch_size=1000)
+
+        days = (SalesHourly.objects.filter(hour__gte=day_start, hour__lt=end)
+                .annotate(day=TruncDate('hour'))
+                .values_list('day', 'product_id', 'category_id')
+                .annotate(units=Sum('units'), revenue=Sum('revenue')).order_by())
+        SalesDaily.objects.filter(day__gte=timezone.localdate(day_start), day__lte=timezone.localdate(end)).delete()
+        SalesDaily.objects.bulk_create([
+            SalesDaily(day=day, product_id=product_id, category_id=category_id, units=units, revenue=revenue)
+            for day, product_id, category_id, units, revenue in days
+        ], batch_size=1000)
+
+
+def rollup_sales(rebuild=False):
+    """Инкрементальное обновление агрегатов продаж.
+    Высшая отметка - последний уже посчитанный час: он пересчитывается заново вместе со всем, что было
+    оплачено после него, поэтому повторный запуск безопасен. Возвращает (начало, конец) пересчитанного
+    периода или None, если пересчитывать нечего"""
+    cutoff = timezone.now() - ROLLUP_LAG
+    start = None if rebuild else SalesHourly.objects.aggregate(last=Max('hour'))['last']
+    if start is None:
+        firsts = [model.objects.filter(completed_at__isnull=False).aggregate(first=Min('completed_at'))['first']
+                  for model in (Order, ArchivedOrder)]
+        first = min((moment for moment in firsts if moment), default=None)
+        if first is None:
+            return None
+        start = first.replace(minute=0, second=0, microsecond=0)
+        if rebuild:
+            SalesHourly.objects.all().delete()
+            SalesDaily.objects.all().delete()
+
+    window_start = start
+    while window_start < cutoff:
+        window_end = window_start + ROLLUP_WINDOW
+        # Последнее окно включает и неполный текущий час: на следующем запуске он пересчитается
+        rollup_window(window_start, window_end, cutoff)
+        window_start = window_end
+    return start, cutoff
+
+
+def with_titles(model, rows):
+    """Строки (id, штук, выручка) с названиями; удалённые товары и категории остаются в отчёте"""
+    rows = list(rows)
+    titles = dict(model.objects.filter(pk__in=[pk for pk, units, revenue in rows]).values_list('pk', 'title'))
+    return [{'pk': pk, 'title': titles.get(pk, f'#{pk}'), 'units': units, 'revenue': revenue}
+            for pk, units, revenue in rows]
+
+
+def dashboard(days=30):
+    """Данные дашборда продаж за последние days дней - только из таблиц агрегатов"""
+    today = timezone.localdate()
+    since = today - timedelta(days=days - 1)
+    daily = SalesDaily.objects.filter(day__gte=since)
+
+    by_day = {day: (units, revenue) for day, units, revenue in
+              daily.values_list('day').annotate(units=Sum('units'), revenue=Sum('revenue')).order_by()}
+    series = [(since + timedelta(days=i),) + by_day.get(since + timedelta(days=i), (0, Money(0)))
+              for i in range(days)]
+    top_revenue = max((revenue for day, units, revenue in series), default=0) or 1
+
+    hours = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=23)
+    by_hour = dict(SalesHourly.objects.filter(hour__gte=hours).values_list('hour')
+                   .annotate(revenue=Sum('revenue')).order_by())
+
+    return {
+        'days': days,
+        'total_units': sum(units for day, units, revenue in series),
+        'total_revenue': sum((revenue for day, units, revenue in series), Money(0)),
+        'series': [{'day': day, 'units': units, 'revenue': revenue, 'percent': int(revenue * 100 / top_revenue)}
+                   for day, units, revenue in series],
+        'last_day_revenue': sum(by_hour.values(), Money(0)),
+        'top_products': with_titles(Product, daily.values_list('product_id')
+                                    .annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue')[:10]),
+        'categories': with_titles(Category, daily.values_list('category_id')
+                                  .annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue')),
+    }
@@ -0,0 +1,189 @@
+import mimetypes
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+# Имя с хешем содержимого от ManifestStaticFilesStorage: style.default.3f2a9c1b7d4e.css
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+# Порядок важен: brotli сжимает лучше, поэтому пробуем его первым
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+# Поддерживается один диапазон: bytes=0-99, bytes=100-, bytes=-100
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Размер блока, если файл читает сам Python (без wsgi.file_wrapper): у FileResponse по умолчанию 4 КБ
+MEDIA_BLOCK_SIZE = 64 * 1024
+
+
+def accepted_encodings(request):
+    """Набор кодировок из Accept-Encoding (без учета q=0)"""
+    encodings = set()
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        encoding, _, params = item.strip().partition(';')
+        if encoding and params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            encodings.add(encoding.lower())
+    return encodings
+
+
+def serve_static(request, path):
+    """Отдача собранной статики из STATIC_ROOT.
+    Если клиент поддерживает сжатие и рядом лежит .br/.gz копия - отдаем ее,
+    файлы с хешем в имени кешируются клиентом навсегда"""
+    try:
+        fullpath = Path(safe_join(settings.STATIC_ROOT, path))
+    except (ValueError, SuspiciousFileOperation):
+        raise Http404
+    if not fullpath.is_file():
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(fullpath.name)
+    content_type = content_type or 'application/octet-stream'
+
+    selected, content_encoding = fullpath, None
+    accepted = accepted_encodings(request)
+    for encoding, extension in PRECOMPRESSED:
+        candidate = fullpath.with_name(fullpath.name + extension)
+        if encoding in accepted and candidate.is_file():
+            selected, content_encoding = candidate, encoding
+            break
+
+    stat = selected.stat()
+    etag = file_etag(stat)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = FileResponse(selected.open('rb'), content_type=content_type)
+        if content_encoding:
+            response.headers['Content-Encoding'] = content_encoding
+
+    set_cache_headers(response, fullpath.name, stat, etag)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def file_etag(stat):
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def set_cache_headers(response, name, stat, etag):
+    """Валидаторы и Cache-Control: файлы с хешем в имени кешируются навсегда, остальные - с проверкой по ETag"""
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    if HASHED_NAME_RE.search(name):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+
+
+def parse_range(header, size):
+    """Диапазон из заголовка Range -> (начало, конец включительно).
+    None - диапазон не поддерживается (несколько частей, ошибка синтаксиса): отдаётся весь файл.
+    ValueError - диапазон за пределами файла, ответ 416"""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        if int(end) == 0:
+            raise ValueError(header)
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    if start >= size:
+        raise ValueError(header)
+    end = min(int(end), size - 1) if end else size - 1
+    if end < start:
+        return None
+    return start, end
+
+
+class FileRange:
+    """Часть открытого файла для FileResponse: чтение останавливается на конце диапазона"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        data = self.file.read(self.remaining if size < 0 else min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def file_response(request, fullpath, size, etag, content_type):
+    """Файл целиком или запрошенный диапазон (206). Range учитывается, только если If-Range
+    совпадает с текущим ETag - иначе файл изменился и клиенту нужен весь"""
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if 'Range' in request.headers and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(request.headers['Range'], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(fullpath.open('rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(fullpath.open('rb'), start, end - start + 1),
+                                content_type=content_type, status=206)
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response.headers['Content-Length'] = end - start + 1
+    response.block_size = MEDIA_BLOCK_SIZE
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_media(request, path):
+    """Отдача загрузок из MEDIA_ROOT: ETag/Last-Modified и 304, Range и If-Range.
+    Весь файл уходит через FileResponse - под gunicorn это wsgi.file_wrapper и os.sendfile без копирования
+    в Python. С MEDIA_ACCEL_REDIRECT тело отдаёт nginx (X-Accel-Redirect), в том числе диапазоны"""
+    try:
+        fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    except (ValueError, SuspiciousFileOperation):
+        raise Http404
+    if not fullpath.is_file():
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(fullpath.name)
+    content_type = content_type or 'application/octet-stream'
+    stat = fullpath.stat()
+    etag = file_etag(stat)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        if settings.MEDIA_ACCEL_REDIRECT:
+            response = HttpResponse(content_type=content_type)
+            response.headers['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT.rstrip('/') + '/' + quote(path)
+        else:
+            response = file_response(request, fullpath, stat.st_size, etag, content_type)
+
+    set_cache_headers(response, fullpath.name, stat, etag)
+    return response
+
+
+class MediaMiddleware:
+    """Загрузки (MEDIA_URL) отдаются до сессий, авторизации и выбора языка - картинке товара они не нужны.
+    Включается MEDIA_SERVE, без него middleware не подключается"""
+
+    def __init__(self, get_response):
+        if not settings.MEDIA_SERVE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path_info.startswith(settings.MEDIA_URL) and request.method in ('GET', 'HEAD'):
+            return serve_media(request, request.path_info[len(settings.MEDIA_URL):])
+        return self.get_response(request)
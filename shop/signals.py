@@ -0,0 +1,30 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Category, Product, Gallery, Review
+
+
+@receiver([post_save, post_delete], sender=Gallery)
+@receiver([post_save, post_delete], sender=Review)
+def touch_product(sender, instance, **kwargs):
+    """Изменение фото или отзыва меняет страницу товара - обновляем его updated_at"""
+    if instance.product_id:
+        Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Product)
+def touch_category_on_delete(sender, instance, **kwargs):
+    """Удаленный товар пропадает со страницы категории, а MAX(updated_at) по оставшимся товарам
+    этого не видит - обновляем updated_at категории"""
+    Category.objects.filter(pk=instance.category_id).update(updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=Product)
+def touch_category_on_move(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Товар перенесен в другую категорию - старая категория тоже изменилась"""
+    if raw or instance.pk is None or (update_fields is not None and 'category' not in update_fields):
+        return
+    old_category_id = Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+    if old_category_id is not None and old_category_id != instance.category_id:
+        Category.objects.filter(pk=old_category_id).update(updated_at=timezone.now())
@@ -111,4 +111,149 @@ document.addEventListener('DOMContentLoaded', function () {
 			siblings.value = parseInt(siblings.value, 10) + 1;
 		});
 	});
+
+	/* ===============================================================
+		CART QUANTITY (JSON API)
+	=============================================================== */
+	const cartTable = document.querySelector('[data-cart-api]');
+	if (cartTable) {
+		// Изменения копятся и уходят на сервер одним запросом после паузы в кликах
+		const pendingQuantities = new Map();
+		let flushTimer = null;
+
+		const renderCart = (data) => {
+			const lines = new Map(data.lines.map((line) => [String(line.product), line]));
+			cartTable.querySelectorAll('[data-cart-row]').forEach((row) => {
+				const line = lines.get(row.dataset.cartRow);
+				if (!line) {
+					row.remove();
+					return;
+				}
+				const quantity = row.querySelector('[data-cart-quantity]');
+				if (quantity) {
+					quantity.textContent = line.quantity;
+					quantity.dataset.max = line.quantity + line.stock;
+				}
+				row.querySelector('[data-cart-line-total]').textContent = line.total_price;
+			});
+			document.querySelectorAll('[data-cart-total-quantity]').forEach((el) => {
+				el.textContent = data.cart_total_quantity;
+			});
+			document.querySelectorAll('[data-cart-total-price]').forEach((el) => {
+				el.textContent = data.cart_total_price;
+			});
+		};
+
+		const flushCart = () => {
+			flushTimer = null;
+			const items = Array.from(pendingQuantities, ([product, quantity]) => ({ product: product, quantity: quantity }));
+			pendingQuantities.clear();
+			fetch(cartTable.dataset.cartApi, {
+				method: 'POST',
+				headers: { 'Content-Type': 'application/json', 'X-CSRFToken': cartTable.dataset.csrf },
+				body: JSON.stringify({ items: items }),
+			})
+				.then((response) => response.json())
+				.then((data) => {
+					// При ошибке (например, не хватает товара) сервер возвращает актуальное состояние корзины
+					if (data.lines) {
+						renderCart(data);
+					}
+				});
+		};
+
+		const setQuantity = (row, quantity) => {
+			pendingQuantities.set(row.dataset.cartRow, quantity);
+			const quantityEl = row.querySelector('[data-cart-quantity]');
+			if (quantityEl) {
+				quantityEl.textContent = quantity;
+			}
+			clearTimeout(flushTimer);
+			flushTimer = setTimeout(flushCart, 400);
+		};
+
+		cartTable.addEventListener('click', (e) => {
+			const link = e.target.closest('[data-cart-step], [data-cart-remove]');
+			if (!link) {
+				return;
+			}
+			e.preventDefault();
+			const row = link.closest('[data-cart-row]');
+			if (link.hasAttribute('data-cart-remove')) {
+				setQuantity(row, 0);
+				return;
+			}
+			const quantityEl = row.querySelector('[data-cart-quantity]');
+			const quantity = parseInt(quantityEl.textContent, 10) + parseInt(link.dataset.cartStep, 10);
+			if (quantity >= 0 && quantity <= parseInt(quantityEl.dataset.max, 10)) {
+				setQuantity(row, quantity);
+			}
+		});
+	}
+
+	/* ===============================================================
+		FAVORITES TOGGLE (JSON API)
+	=============================================================== */
+	const renderFavorite = (link, isFavorite) => {
+		const icon = link.querySelector('.fa-heart');
+		icon.classList.toggle('fas', isFavorite);
+		icon.style.color = isFavorite ? 'black' : '';
+		const label = link.querySelector('[data-favorite-label]');
+		if (label) {
+			label.textContent = isFavorite ? link.dataset.labelOn : link.dataset.labelOff;
+		}
+	};
+
+	document.querySelectorAll('[data-favorite-toggle]').forEach((link) => {
+		link.addEventListener('click', (e) => {
+			e.preventDefault();
+			fetch(link.href, {
+				method: 'POST',
+				headers: { Accept: 'application/json', 'X-CSRFToken': link.dataset.csrf },
+			}).then((response) => {
+				// Неавторизованного пользователя обычный переход отправит на страницу входа
+				if (!response.ok) {
+					window.location.href = link.href;
+					return;
+				}
+				response.json().then((data) => {
+					document.querySelectorAll('[data-favorite-toggle]').forEach((el) => {
+						if (el.href === link.href) {
+							renderFavorite(el, data.is_favorite);
+						}
+					});
+				});
+			});
+		});
+	});
+
+	/* ===============================================================
+		CSRF ДЛЯ СТАТИЧЕСКИХ СТРАНИЦ (prerender_pages)
+	=============================================================== */
+	// В сохранённых страницах токен вырезан: перед отправкой формы он запрашивается у сервера.
+	// Статические страницы видят только анонимные посетители, избранное для них и так ведёт на вход
+	let csrfRequest = null;
+	const fetchCsrfToken = () => {
+		csrfRequest = csrfRequest || fetch('/csrf/', { credentials: 'same-origin' })
+			.then((response) => response.json())
+			.then((data) => data.token);
+		return csrfRequest;
+	};
+
+	document.querySelectorAll('form').forEach((form) => {
+		const input = form.querySelector('input[name="csrfmiddlewaretoken"]');
+		if (!input || input.value) {
+			return;
+		}
+		form.addEventListener('submit', (e) => {
+			if (input.value) {
+				return;
+			}
+			e.preventDefault();
+			fetchCsrfToken().then((token) => {
+				input.value = token;
+				form.submit();
+			});
+		});
+	});
 });
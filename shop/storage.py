@@ -0,0 +1,77 @@
+import gzip
+import hashlib
+import posixpath
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен, без него собираются только .gz
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.xml', '.html', '.map')
+# Сжимать файлы меньше этого размера нет смысла: заголовки съедают выигрыш
+MIN_COMPRESS_SIZE = 512
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем содержимого в имени файла и заранее сжатыми копиями .gz и .br рядом.
+    Сжатие делается один раз в collectstatic, воркеры на лету ничего не сжимают"""
+    # Шаблоны ссылаются на пару несуществующих файлов (custom.css, favicon.png) -
+    # для них отдаем исходное имя вместо ошибки рендера
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            # Файла нет в STATIC_ROOT (или на него ссылается css/js) - оставляем имя как есть
+            if content is None and not self.manifest_strict:
+                return name
+            raise
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for name in self.hashed_files.values():
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+
+    def compress(self, name):
+        """Создание сжатых копий файла рядом с оригиналом"""
+        path = self.path(name)
+        with open(path, 'rb') as file:
+            content = file.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+
+        compressed = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['.br'] = brotli.compress(content, quality=11)
+
+        for extension, data in compressed.items():
+            # Сжатая копия, которая не меньше оригинала, только мешает
+            if len(data) < len(content):
+                with open(path + extension, 'wb') as file:
+                    file.write(data)
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """Загрузки с хешем содержимого в имени: products/watch.3f2a9c1b7d4e.jpg.
+    Файл по такому имени никогда не меняется - serve_media и nginx отдают его с кешем навсегда.
+    Повторная загрузка того же файла под тем же именем не создаёт копию"""
+
+    def save(self, name, content, max_length=None):
+        md5 = hashlib.md5()
+        for chunk in content.chunks():
+            md5.update(chunk)
+        content.seek(0)
+        root, extension = posixpath.splitext(name)
+        hashed = f'{root}.{md5.hexdigest()[:12]}{extension}'
+        if self.exists(hashed):
+            return hashed
+        return super().save(hashed, content, max_length)
@@ -0,0 +1,110 @@
+import csv
+import hashlib
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .inventory import record
+from .models import Product, OrderProduct, StockMovement
+from .money import Money
+
+CHUNK_SIZE = 1000
+# Колонки файла поставщика: товар ищется по slug, цена - в основных единицах, количество - остаток на складе
+COLUMNS = {'key': 'slug', 'price': 'price', 'quantity': 'quantity'}
+
+
+def row_hash(price, quantity):
+    """Отпечаток строки файла: только те значения, которые переносятся в товар"""
+    return hashlib.md5(f'{price.strip()}|{quantity.strip()}'.encode()).hexdigest()
+
+
+def reserved_quantities(product_ids):
+    """Сколько единиц товаров лежит в незавершённых корзинах: {id товара: количество}"""
+    rows = (OrderProduct.objects.filter(product_id__in=product_ids, order__is_completed=False)
+            .values_list('product_id').annotate(total=Sum('quantity')).order_by())
+    return {product_id: total or 0 for product_id, total in rows}
+
+
+def apply_chunk(rows, stats, force=False):
+    """Одна пачка строк файла - одна короткая транзакция.
+    Товары пачки читаются и блокируются одним запросом; строки, чей отпечаток совпал с сохранённым,
+    пропускаются без разбора. Цена и остаток пишутся только у действительно изменившихся товаров,
+    у них же обновляется updated_at - от него зависят ETag страниц, кеш фасетов и prerender_pages"""
+    parsed = {}
+    for row in rows:
+        stats['scanned'] += 1
+        key = (row.get(COLUMNS['key']) or '').strip()
+        price, quantity = row.get(COLUMNS['price']) or '', row.get(COLUMNS['quantity']) or ''
+        if not key:
+            stats['invalid'] += 1
+            continue
+        parsed[key] = price, quantity
+
+    with transaction.atomic():
+        products = {product.slug: product for product in
+                    Product.objects.select_for_update().filter(slug__in=list(parsed))
+                    .only('pk', 'slug', 'price', 'quantity', 'supplier_hash')}
+        stats['unknown'] += len(parsed) - len(products)
+
+        candidates = []
+        for slug, (price, quantity) in parsed.items():
+            product = products.get(slug)
+            if product is None:
+                continue
+            fingerprint = row_hash(price, quantity)
+            if fingerprint == product.supplier_hash and not force:
+                stats['unchanged'] += 1
+                continue
+            try:
+                values = Money.parse(price.strip()), int(quantity)
+            except ValueError:
+                stats['invalid'] += 1
+                continue
+            if values[0] < 0 or values[1] < 0:
+                stats['invalid'] += 1
+                continue
+            candidates.append((product, fingerprint, values))
+
+        # Остаток на сайте - это остаток поставщика минус уже зарезервированное в корзинах
+        reserved = reserved_quantities([product.pk for product, fingerprint, values in candidates])
+        now = timezone.now()
+        changed, rehashed, movements = [], [], []
+        for product, fingerprint, (price, stock) in candidates:
+            quantity = max(stock - reserved.get(product.pk, 0), 0)
+            product.supplier_hash = fingerprint
+            if product.price == price and product.quantity == quantity:
+                rehashed.append(product)
+                continue
+            delta = quantity - product.quantity
+            movements.append(StockMovement(product_id=product.pk, delta=delta,
+                                           kind=StockMovement.RESTOCK if delta > 0 else StockMovement.ADJUSTMENT))
+            product.price, product.quantity, product.updated_at = price, quantity, now
+            changed.append(product)
+
+        Product.objects.bulk_update(changed, ['price', 'quantity', 'supplier_hash', 'updated_at'])
+        Product.objects.bulk_update(rehashed, ['supplier_hash'])
+        record(movements)
+    stats['changed'] += len(changed)
+    stats['unchanged'] += len(rehashed)
+
+
+def sync_supplier_feed(file, chunk_size=CHUNK_SIZE, delimiter=',', force=False):
+    """Синхронизация цен и остатков с полным файлом поставщика (CSV с заголовком).
+    Файл читается потоком, пачками по chunk_size строк. Возвращает Counter:
+    scanned - строк прочитано, changed - товаров изменено, unchanged - без изменений,
+    unknown - нет такого товара, invalid - строка не разобрана"""
+    reader = csv.DictReader(file, delimiter=delimiter)
+    missing = set(COLUMNS.values()) - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f'В файле нет колонок: {", ".join(sorted(missing))}')
+
+    stats = Counter()
+    while True:
+        rows = list(islice(reader, chunk_size))
+        if not rows:
+            break
+        apply_chunk(rows, stats, force=force)
+    return stats
@@ -0,0 +1,124 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connection
+from django.template.library import InclusionNode, SimpleNode
+from django.template.loader_tags import IncludeNode
+
+from .metrics import inc, observe, registry
+
+# Сколько самых медленных узлов попадает в заголовок Server-Timing
+SERVER_TIMING_ROWS = 20
+
+state = threading.local()
+installed = False
+
+
+def include_label(node):
+    template = node.template
+    return f'include {template.var if isinstance(template.var, str) else template.token}'
+
+
+def tag_label(node):
+    return f'tag {node.func.__name__}'
+
+
+def timed(render, label):
+    """Обёртка render узла: вызовы, собственное время и SQL-запросы - без вложенных include и тегов,
+    у них своя строка. Поэтому суммы по узлам не считают одно и то же время дважды.
+    Вне блока profiling() - один getattr сверху"""
+
+    @wraps(render)
+    def wrapper(node, context):
+        stats = getattr(state, 'stats', None)
+        if stats is None or label(node) is None:
+            return render(node, context)
+        outer_seconds, outer_queries = state.nested
+        state.nested = (0.0, 0)
+        queries, started = state.queries, time.perf_counter()
+        try:
+            return render(node, context)
+        finally:
+            seconds, queries = time.perf_counter() - started, state.queries - queries
+            nested_seconds, nested_queries = state.nested
+            # Родителю узел отдаёт полное время: из его собственного оно вычитается
+            state.nested = (outer_seconds + seconds, outer_queries + queries)
+            entry = stats.setdefault(label(node), [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds - nested_seconds
+            entry[2] += queries - nested_queries
+
+    return wrapper
+
+
+def install(force=False):
+    """Подмена render у {% include %} и у тегов из shop/templatetags на весь процесс:
+    в Django нет сигнала о рендере отдельного узла. Разрешена только в режиме TEMPLATE_PROFILE
+    (TemplateProfileMiddleware) и из команды profile_templates (force=True), при импорте приложения не вызывается"""
+    global installed
+    if installed:
+        return
+    if not (settings.TEMPLATE_PROFILE or force):
+        raise ImproperlyConfigured('Профилирование шаблонов включается TEMPLATE_PROFILE=1 или командой profile_templates')
+    installed = True
+    IncludeNode.render = timed(IncludeNode.render, include_label)
+    for node_class in (SimpleNode, InclusionNode):
+        node_class.render = timed(node_class.render, lambda node: tag_label(node)
+                                  if node.func.__module__.startswith('shop.') else None)
+
+
+@contextmanager
+def profiling():
+    """Сбор статистики рендера внутри блока: {метка: [вызовов, секунд, SQL-запросов]}.
+    Узлы должны быть подменены заранее - install()"""
+    if not installed:
+        raise ImproperlyConfigured('Перед profiling() нужен install()')
+    stats = {}
+    state.stats, state.queries, state.nested = stats, 0, (0.0, 0)
+
+    def count_query(execute, sql, params, many, context):
+        state.queries += 1
+        return execute(sql, params, many, context)
+
+    try:
+        with connection.execute_wrapper(count_query):
+            yield stats
+    finally:
+        state.stats = None
+
+
+def server_timing(stats):
+    """Заголовок Server-Timing: самые медленные узлы видны во вкладке Network браузера"""
+    rows = sorted(stats.items(), key=lambda item: item[1][1], reverse=True)[:SERVER_TIMING_ROWS]
+    return ', '.join(f'tpl{i};dur={seconds * 1000:.2f};desc="{label} x{calls}, SQL {queries}"'
+                     for i, (label, (calls, seconds, queries)) in enumerate(rows))
+
+
+class TemplateProfileMiddleware:
+    """Профиль рендера шаблонов по каждому запросу: метрики shop_template_* и заголовок Server-Timing.
+    Включается TEMPLATE_PROFILE=1, без него middleware не подключается вовсе"""
+
+    def __init__(self, get_response):
+        if not settings.TEMPLATE_PROFILE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        with profiling() as stats:
+            response = self.get_response(request)
+            # TemplateResponse (админка) рендерится после view
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+
+        for label, (calls, seconds, queries) in stats.items():
+            observe('shop_template_render_seconds', seconds / calls, node=label)
+            inc('shop_template_queries_total', queries, node=label)
+        if stats:
+            response.headers['Server-Timing'] = server_timing(stats)
+        registry.flush()
+        return response
@@ -1,5 +1,8 @@
 from django import template
+from django.conf import settings
 from django.template.defaulttags import register as range_register
+from django.templatetags.static import static
+from django.utils.html import format_html_join
 from django.utils.translation import gettext_lazy as _
 
 from shop.models import Category, FavoriteProducts
@@ -54,10 +57,30 @@ def get_negative_range(value):
     return range(5 - int(value))
 
 
+@register.simple_tag(takes_context=True)
+def get_favorite_products(context, user):
+    """ID избранных товаров пользователя.
+    Тег вызывается в каждой карточке товара, поэтому результат запоминается на время запроса"""
+    request = context.get('request')
+    if request is not None and hasattr(request, '_favorite_product_ids'):
+        return request._favorite_product_ids
+    product_ids = set(FavoriteProducts.objects.filter(user=user).values_list('product_id', flat=True))
+    if request is not None:
+        request._favorite_product_ids = product_ids
+    return product_ids
+
+
 @register.simple_tag()
-def get_favorite_products(user):
-    """Вывод избранных товаров на страницу"""
-    fav = FavoriteProducts.objects.filter(user=user)
-    products = [i.product for i in fav]
-    return products
+def static_bundle(name):
+    """Подключение бандла статики (app.css / app.js).
+    Без собранных бандлов (режим разработки) подключаются исходные файлы по одному"""
+    if settings.STATIC_BUNDLES_ENABLED:
+        files = [f'shop/dist/{name}']
+    else:
+        files = settings.STATIC_BUNDLES[name]
 
+    if name.endswith('.js'):
+        tag = '<script src="{}"></script>'
+    else:
+        tag = '<link rel="stylesheet" href="{}">'
+    return format_html_join('\n', tag, ((static(file),) for file in files))
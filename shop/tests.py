@@ -1,3 +1,1024 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .inventory import SNAPSHOT_LAG, take_snapshot
+from .models import (Category, Product, Gallery, Review, FavoriteProducts, Customer, Order, OrderProduct,
+                     StockMovement, StockSnapshot, SalesHourly, SalesDaily, ArchivedOrder, ArchivedOrderProduct,
+                     ShippingAddress)
+from .archive import archive_orders, completed_orders
+from .bulkedit import apply_changes, read_csv
+from .exports import export_response, iter_export
+from .facets import count_facets, filter_products
+from .feeds import build_feeds
+from .money import MAX_CENTS, Money, MoneyField, MoneyFormField
+from .ratelimit import is_rate_limited
+from .sales import ROLLUP_LAG, dashboard, rollup_sales
+from .querybudget import QUERY_BUDGETS, NOT_RENDERED, QueryReport
+from .supplier import sync_supplier_feed
+from .serving import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, serve_media, serve_static
+from .storage import CompressedManifestStaticFilesStorage, HashedFileSystemStorage
+from .urls import urlpatterns
+from .utils import CART_SESSION_KEY, CartForAuthenticatedUser, release_stale_carts, toggle_favorite
+
+
+class QueryBudgetTests(TestCase):
+    """Каждая страница из shop/urls.py рендерится на двух объёмах данных.
+    Число запросов не должно расти вместе с данными и не должно превышать бюджет из QUERY_BUDGETS"""
+    sizes = (2, 6)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='password')
+        cls.parent = Category.objects.create(title='Часы', slug='chasy')
+        cls.subcategories = [Category.objects.create(title=f'Подкатегория {i}', slug=f'sub-{i}', parent=cls.parent)
+                             for i in range(2)]
+        cls.customer = Customer.objects.create(user=cls.user, first_name='Покупатель')
+        cls.order = Order.objects.create(customer=cls.customer)
+        cls.products = []
+
+    def seed(self, size):
+        """Догоняет данные до size товаров в каждой подкатегории, у каждого товара - size фото и отзывов.
+        Все товары лежат в корзине и в избранном пользователя, в истории - size завершённых заказов"""
+        for category in self.subcategories:
+            for i in range(category.products.count(), size):
+                product = Product.objects.create(title=f'{category.slug} {i}', slug=f'{category.slug}-{i}', price=100,
+                                                 quantity=10, watched=i, category=category)
+                self.products.append(product)
+                OrderProduct.objects.create(order=self.order, product=product, quantity=1)
+                FavoriteProducts.objects.create(user=self.user, product=product)
+
+        for product in self.products:
+            for i in range(product.images.count(), size):
+                Gallery.objects.create(product=product, image=f'products/{product.slug}-{i}.jpg')
+            for i in range(Review.objects.filter(product=product).count(), size):
+                author, created = User.objects.get_or_create(username=f'author-{i}')
+                Review.objects.create(product=product, author=author, text='Отзыв', grade='5')
+
+        for i in range(Order.objects.filter(is_completed=True).count(), size):
+            order = Order.objects.create(customer=self.customer, is_completed=True, total_price=200, total_quantity=2)
+            OrderProduct.objects.bulk_create([OrderProduct(order=order, product=product, quantity=1, price=product.price)
+                                              for product in self.products[:2]])
+
+    def url_kwargs(self, pattern):
+        return {
+            'category_detail': {'slug': self.parent.slug},
+            'product_page': {'slug': self.products[0].slug},
+        }.get(pattern.name, {})
+
+    def render(self, pattern):
+        url = reverse(pattern.name, kwargs=self.url_kwargs(pattern))
+        with QueryReport() as report:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return report
+
+    def test_every_url_has_budget(self):
+        names = {pattern.name for pattern in urlpatterns}
+        self.assertEqual(names - NOT_RENDERED - set(QUERY_BUDGETS), set(),
+                         'Для новых страниц нужен бюджет в shop/querybudget.py')
+
+    def test_query_budgets(self):
+        self.client.force_login(self.user)
+        patterns = [pattern for pattern in urlpatterns if pattern.name in QUERY_BUDGETS]
+        reports = {}
+        for size in self.sizes:
+            self.seed(size)
+            for pattern in patterns:
+                # Первый запрос прогревает сессию и корзину, меряется второй
+                self.render(pattern)
+                reports[pattern.name, size] = self.render(pattern)
+
+        small, large = self.sizes
+        for pattern in patterns:
+            with self.subTest(url=pattern.name):
+                before, after = reports[pattern.name, small], reports[pattern.name, large]
+                self.assertEqual(len(before.queries), len(after.queries),
+                                 f'Число запросов растёт с объёмом данных: {len(before.queries)} -> '
+                                 f'{len(after.queries)}\n' + '\n'.join(after.queries))
+                errors = after.check(QUERY_BUDGETS[pattern.name])
+                self.assertFalse(errors, '\n'.join(errors))
+
+
+class StaleCartTests(TestCase):
+    """Сборщик брошенных корзин возвращает резерв на склад и пишет возврат в журнал движений"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Кольца', slug='rings')
+        cls.ring = Product.objects.create(title='Кольцо', slug='ring', price=100, quantity=5, category=category)
+        cls.watch = Product.objects.create(title='Часы', slug='watch', price=300, quantity=1, category=category)
+
+    def cart(self, lines, idle):
+        """Корзина без покупателя с последней активностью idle назад"""
+        order = Order.objects.create()
+        OrderProduct.objects.bulk_create([OrderProduct(order=order, product=product, quantity=quantity)
+                                          for product, quantity in lines])
+        Order.objects.filter(pk=order.pk).update(updated_at=timezone.now() - idle)
+        return order
+
+    def test_releases_stock_of_stale_carts(self):
+        first = self.cart([(self.ring, 2), (self.watch, 1)], idle=timedelta(days=5))
+        second = self.cart([(self.ring, 1), (None, 4)], idle=timedelta(days=4))
+        fresh = self.cart([(self.ring, 3)], idle=timedelta(hours=1))
+        before = self.ring.updated_at
+
+        # Пачка по одной корзине: каждая корзина - своя транзакция
+        result = release_stale_carts(timezone.now() - timedelta(days=3), batch_size=1)
+
+        # Строка удалённого товара убирается, но на склад ничего не возвращает
+        self.assertEqual(result, (2, 4, 4))
+        self.ring.refresh_from_db()
+        self.watch.refresh_from_db()
+        self.assertEqual((self.ring.quantity, self.watch.quantity), (8, 2))
+        self.assertGreater(self.ring.updated_at, before)
+        self.assertFalse(OrderProduct.objects.filter(order__in=[first, second]).exists())
+        self.assertEqual(OrderProduct.objects.get(order=fresh).quantity, 3)
+
+        movements = StockMovement.objects.order_by('order_id', 'product_id').values_list(
+            'kind', 'product_id', 'order_id', 'delta')
+        self.assertEqual(list(movements), [
+            (StockMovement.RELEASE, self.ring.pk, first.pk, 2),
+            (StockMovement.RELEASE, self.watch.pk, first.pk, 1),
+            (StockMovement.RELEASE, self.ring.pk, second.pk, 1),
+        ])
+
+    def test_nothing_to_release(self):
+        self.cart([(self.ring, 1)], idle=timedelta(hours=1))
+        self.assertEqual(release_stale_carts(timezone.now() - timedelta(days=3)), (0, 0, 0))
+        self.assertFalse(StockMovement.objects.exists())
+
+
+class ActiveCartTests(TestCase):
+    """У покупателя одна активная корзина (частичный уникальный индекс), ее id хранится в сессии"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer')
+        cls.customer = Customer.objects.create(user=cls.user)
+
+    def test_one_active_cart_per_customer(self):
+        Order.objects.create(customer=self.customer)
+        Order.objects.create(customer=self.customer, is_completed=True)
+        Order.objects.create(customer=self.customer, is_completed=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Order.objects.create(customer=self.customer)
+
+    def test_cart_resolved_by_primary_key(self):
+        request = SimpleNamespace(user=self.user, session={})
+        order = CartForAuthenticatedUser(request).get_order()
+        self.assertEqual(request.session[CART_SESSION_KEY], order.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(CartForAuthenticatedUser(request).get_order(), order)
+
+    def test_completed_cart_in_session_is_replaced(self):
+        request = SimpleNamespace(user=self.user, session={})
+        order = CartForAuthenticatedUser(request).get_order()
+        Order.objects.filter(pk=order.pk).update(is_completed=True)
+        new_order = CartForAuthenticatedUser(request).get_order()
+        self.assertNotEqual(new_order.pk, order.pk)
+        self.assertEqual(request.session[CART_SESSION_KEY], new_order.pk)
+
+
+class MergeActiveCartsTests(TransactionTestCase):
+    """Миграция 0011 сливает лишние активные корзины покупателя в самую свежую.
+    Без индекса дубликаты можно создать, поэтому он снимается на время теста"""
+
+    def setUp(self):
+        self.constraint = next(constraint for constraint in Order._meta.constraints
+                               if constraint.name == 'shop_order_one_active_cart')
+        with connection.schema_editor() as editor:
+            editor.remove_constraint(Order, self.constraint)
+
+    def tearDown(self):
+        with connection.schema_editor() as editor:
+            editor.add_constraint(Order, self.constraint)
+
+    def test_merge_active_carts(self):
+        category = Category.objects.create(title='Кольца', slug='rings')
+        ring, watch = (Product.objects.create(title=slug, slug=slug, price=100, quantity=5, category=category)
+                       for slug in ('ring', 'watch'))
+        customer = Customer.objects.create(user=User.objects.create_user('buyer'))
+        old, new = Order.objects.create(customer=customer), Order.objects.create(customer=customer)
+        completed = Order.objects.create(customer=customer, is_completed=True)
+        Order.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        OrderProduct.objects.create(order=old, product=ring, quantity=2)
+        OrderProduct.objects.create(order=old, product=watch, quantity=1)
+        OrderProduct.objects.create(order=new, product=ring, quantity=3)
+
+        import_module('shop.migrations.0011_order_one_active_cart').merge_active_carts(apps, None)
+
+        self.assertEqual(list(Order.objects.filter(customer=customer).order_by('pk')), [new, completed])
+        self.assertEqual(dict(new.ordered.values_list('product_id', 'quantity')), {ring.pk: 5, watch.pk: 1})
+
+
+class StaticServingTests(SimpleTestCase):
+    """Собранная статика: сжатые копии рядом с файлом, выбор копии по Accept-Encoding,
+    кеш навсегда для имён с хешем и 304 по ETag"""
+    hashed = 'app.0123456789ab.css'
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(STATIC_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.content = b'body { color: red; }\n' * 100
+        (self.root / self.hashed).write_bytes(self.content)
+        (self.root / 'small.css').write_bytes(b'a{}')
+        storage = CompressedManifestStaticFilesStorage(location=self.root)
+        storage.compress(self.hashed)
+        storage.compress('small.css')
+
+    def get(self, name, **headers):
+        response = serve_static(RequestFactory().get(f'/static/{name}', headers=headers), name)
+        self.addCleanup(response.close)
+        return response
+
+    def test_compressed_copies(self):
+        self.assertEqual(gzip.decompress((self.root / f'{self.hashed}.gz').read_bytes()), self.content)
+        # Маленький файл не сжимается: заголовки съели бы выигрыш
+        self.assertFalse((self.root / 'small.css.gz').exists())
+
+    def test_precompressed_copy_is_served(self):
+        response = self.get(self.hashed, accept_encoding='gzip, deflate')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(b''.join(response.streaming_content), (self.root / f'{self.hashed}.gz').read_bytes())
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(response.headers['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+    def test_identity_when_encoding_refused(self):
+        for accept_encoding in ('', 'gzip;q=0'):
+            response = self.get(self.hashed, accept_encoding=accept_encoding)
+            self.assertNotIn('Content-Encoding', response.headers)
+            self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_not_modified(self):
+        etag = self.get('small.css').headers['ETag']
+        response = self.get('small.css', if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['Cache-Control'], REVALIDATE_CACHE_CONTROL)
+
+    def test_outside_root(self):
+        for name in ('../secret.txt', 'missing.css'):
+            with self.assertRaises(Http404):
+                self.get(name)
+
+
+class CartQuantitiesTests(TestCase):
+    """Установка количества сразу для нескольких товаров: остатки, журнал и JSON API корзины"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer')
+        category = Category.objects.create(title='Кольца', slug='rings')
+        cls.ring = Product.objects.create(title='Кольцо', slug='ring', price=100, quantity=5, category=category)
+        cls.watch = Product.objects.create(title='Часы', slug='watch', price=300, quantity=1, category=category)
+
+    def setUp(self):
+        self.cart = CartForAuthenticatedUser(SimpleNamespace(user=self.user, session={}))
+
+    def stock(self):
+        return dict(Product.objects.values_list('pk', 'quantity'))
+
+    def lines(self):
+        return dict(self.cart.get_order().ordered.values_list('product_id', 'quantity'))
+
+    def test_set_quantities(self):
+        self.assertEqual(self.cart.set_quantities({self.ring.pk: 3, self.watch.pk: 1}), {})
+        self.assertEqual(self.stock(), {self.ring.pk: 2, self.watch.pk: 0})
+        self.assertEqual(self.lines(), {self.ring.pk: 3, self.watch.pk: 1})
+
+        # 0 убирает товар из корзины, уменьшение возвращает разницу на склад
+        self.assertEqual(self.cart.set_quantities({self.ring.pk: 1, self.watch.pk: 0}), {})
+        self.assertEqual(self.stock(), {self.ring.pk: 4, self.watch.pk: 1})
+        self.assertEqual(self.lines(), {self.ring.pk: 1})
+        self.assertEqual(list(StockMovement.objects.order_by('pk').values_list('kind', 'product_id', 'delta')), [
+            (StockMovement.RESERVATION, self.ring.pk, -3),
+            (StockMovement.RESERVATION, self.watch.pk, -1),
+            (StockMovement.RELEASE, self.ring.pk, 2),
+            (StockMovement.RELEASE, self.watch.pk, 1),
+        ])
+
+    def test_over_stock_changes_nothing(self):
+        self.cart.set_quantities({self.ring.pk: 2})
+        movements = StockMovement.objects.count()
+
+        # Кольцо в корзине уже снято со склада: доступно 3 + 2. Часов не хватает, и кольцо тоже не меняется
+        errors = self.cart.set_quantities({self.ring.pk: 5, self.watch.pk: 2, 0: 1})
+        self.assertEqual(errors, {self.watch.pk: 1, 0: 0})
+        self.assertEqual(self.stock(), {self.ring.pk: 3, self.watch.pk: 1})
+        self.assertEqual(self.lines(), {self.ring.pk: 2})
+        self.assertEqual(StockMovement.objects.count(), movements)
+
+    def post(self, items):
+        return self.client.post(reverse('update_cart'), json.dumps({'items': items}), content_type='application/json')
+
+    def test_update_cart_api(self):
+        self.client.force_login(self.user)
+        response = self.post([{'product': str(self.ring.pk), 'quantity': 2}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'lines': [{'product': self.ring.pk, 'quantity': 2, 'total_price': '200.00', 'stock': 3}],
+            'cart_total_quantity': 2,
+            'cart_total_price': '200.00',
+        })
+
+        response = self.post([{'product': self.watch.pk, 'quantity': 3}])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['errors'], {str(self.watch.pk): {'available': 1}})
+
+    def test_update_cart_api_rejects_bad_input(self):
+        self.client.force_login(self.user)
+        for quantity in (2.9, True, '2', None, -1):
+            with self.subTest(quantity=quantity):
+                self.assertEqual(self.post([{'product': self.ring.pk, 'quantity': quantity}]).status_code, 400)
+        self.assertEqual(self.post([{'product': 1.5, 'quantity': 1}]).status_code, 400)
+        self.assertEqual(self.stock(), {self.ring.pk: 5, self.watch.pk: 1})
+
+    def test_update_cart_api_skips_deleted_products(self):
+        self.client.force_login(self.user)
+        self.post([{'product': self.ring.pk, 'quantity': 1}])
+        order = Order.objects.get(customer__user=self.user, is_completed=False)
+        OrderProduct.objects.create(order=order, product=None, quantity=2)
+
+        response = self.post([{'product': self.ring.pk, 'quantity': 2}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([line['product'] for line in response.json()['lines']], [self.ring.pk])
+        self.assertEqual(response.json()['cart_total_price'], '200.00')
+
+
+class FavoriteTests(TestCase):
+    """Избранное переключается одним DELETE или INSERT, для fetch отвечает JSON"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer')
+        category = Category.objects.create(title='Кольца', slug='rings')
+        cls.ring = Product.objects.create(title='Кольцо', slug='ring', price=100, quantity=5, category=category)
+
+    def test_toggle_favorite(self):
+        with self.assertNumQueries(2):
+            self.assertIs(toggle_favorite(self.user, self.ring.pk), True)
+        with self.assertNumQueries(1):
+            self.assertIs(toggle_favorite(self.user, self.ring.pk), False)
+        self.assertFalse(FavoriteProducts.objects.exists())
+
+    def test_json_endpoint(self):
+        url = reverse('add_favorite', kwargs={'product_slug': self.ring.slug})
+        self.assertEqual(self.client.post(url, headers={'accept': 'application/json'}).status_code, 401)
+
+        self.client.force_login(self.user)
+        response = self.client.post(url, headers={'accept': 'application/json'})
+        self.assertEqual(response.json(), {'is_favorite': True})
+        self.assertTrue(FavoriteProducts.objects.filter(user=self.user, product=self.ring).exists())
+        self.assertEqual(self.client.post(url, headers={'accept': 'application/json'}).json(), {'is_favorite': False})
+
+        missing = reverse('add_favorite', kwargs={'product_slug': 'missing'})
+        self.assertEqual(self.client.post(missing, headers={'accept': 'application/json'}).status_code, 404)
+
+
+class ExportTests(TestCase):
+    """Потоковые выгрузки CSV и JSONL: строки читаются курсором, цена строки - на момент покупки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(user=User.objects.create_user('buyer'), first_name='Анна')
+        category = Category.objects.create(title='Кольца', slug='rings')
+        ring = Product.objects.create(title='Кольцо', slug='ring', price=150, quantity=5, category=category)
+        cls.completed = Order.objects.create(customer=customer, is_completed=True)
+        cls.cart = Order.objects.create(customer=customer)
+        OrderProduct.objects.create(order=cls.completed, product=ring, quantity=2, price=100)
+        OrderProduct.objects.create(order=cls.cart, product=ring, quantity=1)
+
+    def test_csv(self):
+        rows = ''.join(iter_export('orders', 'csv', chunk_size=1)).splitlines()
+        self.assertEqual(rows[0], 'order,order_created_at,is_completed,customer,first_name,last_name,email,phone,'
+                                  'product,product_title,price,quantity,added_at')
+        # Завершённая строка - по замороженной цене, строка корзины - по текущей цене товара
+        self.assertEqual([row.split(',')[10] for row in rows[1:]], ['100.00', '150.00'])
+
+    def test_jsonl(self):
+        lines = [json.loads(line) for line in iter_export('orders', 'jsonl')]
+        self.assertEqual([(line['order'], line['first_name'], line['price']) for line in lines],
+                         [(self.completed.pk, 'Анна', '100.00'), (self.cart.pk, 'Анна', '150.00')])
+
+    def test_streaming_response(self):
+        response = export_response('customers', 'csv', Customer.objects.all())
+        self.assertTrue(response.streaming)
+        self.assertRegex(response.headers['Content-Disposition'], r'^attachment; filename="customers_\d{8}_\d{6}\.csv"$')
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines()[1].split(',')[1:3],
+                         ['buyer', 'Анна'])
+
+
+@override_settings(RATELIMIT_ENABLE=True, RATELIMITS={'subscribe': '3/m'})
+class RateLimitTests(TestCase):
+    """Лимиты частоты запросов: 429 с Retry-After, скользящее окно без удвоения лимита на стыке окон"""
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def subscribe(self, email, **headers):
+        return self.client.post(reverse('save_subscribers'), {'email': email}, headers=headers)
+
+    def test_too_many_requests(self):
+        for i in range(3):
+            self.assertEqual(self.subscribe(f'{i}@example.com').status_code, 302)
+        response = self.subscribe('3@example.com')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response.headers['Retry-After']), 0)
+        self.assertEqual(self.subscribe('4@example.com', accept='application/json').json(),
+                         {'error': 'Слишком много запросов, попробуйте позже'})
+        # Лимит считается по адресу клиента
+        self.assertEqual(self.client.post(reverse('save_subscribers'), {'email': '5@example.com'},
+                                          REMOTE_ADDR='10.0.0.2').status_code, 302)
+
+    @override_settings(RATELIMIT_ENABLE=False)
+    def test_disabled(self):
+        for i in range(5):
+            self.assertEqual(self.subscribe(f'{i}@example.com').status_code, 302)
+
+    def test_sliding_window(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        now = [60 * 1000 + 50]
+
+        def limited():
+            with mock.patch('shop.ratelimit.time.time', lambda: now[0]):
+                return is_rate_limited(request, 'test', '10/m', 'ip')
+
+        # 10 запросов в конце окна проходят, 11-й - нет
+        self.assertEqual([limited() for i in range(10)], [0] * 10)
+        self.assertTrue(limited())
+        # Сразу после границы предыдущее окно еще весит почти целиком: фиксированное окно пропустило бы здесь еще 10
+        now[0] += 15
+        self.assertTrue(limited())
+        # К концу текущего окна предыдущее почти ничего не весит
+        now[0] += 50
+        self.assertEqual(limited(), 0)
+
+
+class MoneyTests(TestCase):
+    """Суммы в целых центах: точная арифметика, разбор ввода и MoneyField"""
+
+    def test_arithmetic(self):
+        price = Money(1999)
+        self.assertEqual(price * 3, Money(5997))
+        self.assertIsInstance(3 * price, Money)
+        self.assertEqual(sum([price, Money(1)], Money(0)), Money(2000))
+        self.assertEqual(Money(100) - price, Money(-1899))
+        self.assertEqual(str(-price), '-19.99')
+        self.assertEqual(f'{Money(123456):,.2f}', '1,234.56')
+        self.assertEqual(Money(123456).amount, Decimal('1234.56'))
+
+    def test_parse(self):
+        cases = {'950.50': 95050, '950,5': 95050, ' 1 ': 100, '0.005': 1, '-0.004': 0, 0.1: 10,
+                 Decimal('19.99'): 1999, '92233720368547758.07': MAX_CENTS}
+        for value, cents in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(Money.parse(value), Money(cents))
+        for value in ('', 'abc', 'inf', '-Infinity', 'NaN', 'sNaN', '1e20', '1e400', '92233720368547758.08', None):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                Money.parse(value)
+
+    def test_field_to_python(self):
+        field = MoneyField()
+        # Центы - только Money, всё остальное - основные единицы
+        for value in (100, '100', 100.0, Decimal('100')):
+            with self.subTest(value=value):
+                self.assertEqual(field.to_python(value), Money(10000))
+        self.assertEqual(field.to_python(Money(100)), Money(100))
+        self.assertIsNone(field.to_python(None))
+        for value in (True, 'inf', '1e20'):
+            with self.subTest(value=value), self.assertRaises(ValidationError):
+                field.to_python(value)
+
+    def test_form_field(self):
+        field = MoneyFormField()
+        self.assertEqual(field.clean('12.5'), Money(1250))
+        self.assertEqual(field.prepare_value(Money(1250)), Decimal('12.50'))
+        with self.assertRaises(ValidationError):
+            field.clean('12.505')
+
+    def test_database_roundtrip(self):
+        category = Category.objects.create(title='Кольца', slug='rings')
+        product = Product.objects.create(title='Кольцо', slug='ring', price='19.99', quantity=5, category=category)
+        product.refresh_from_db()
+        self.assertEqual(product.price, Money(1999))
+        self.assertIsInstance(product.price, Money)
+
+        order = Order.objects.create()
+        OrderProduct.objects.create(order=order, product=product, quantity=3)
+        self.assertEqual(order.get_cart_total_price, Money(5997))
+        self.assertEqual(Product.objects.filter(price__gte=Money.parse('19.99')).count(), 1)
+
+
+@mock.patch('shop.feeds.SITEMAP_LIMIT', 4)
+class FeedTests(TestCase):
+    """Инкрементальная сборка sitemap и фидов: перезаписываются только изменившиеся куски.
+    SITEMAP_LIMIT уменьшен, чтобы в кусок попадало по два товара (по адресу на каждый из двух языков)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Кольца', slug='rings')
+        cls.products = [Product.objects.create(title=f'Кольцо {i}', title_en=f'Ring {i}' if i else '', slug=f'ring-{i}',
+                                               price=150, quantity=i, category=cls.category) for i in range(3)]
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(FEEDS_ROOT=self.root, SITE_URL='https://shop.example')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def chunk(self, product):
+        return str(product.pk // 2)
+
+    def test_build_and_rebuild(self):
+        changed, removed = build_feeds()
+        self.assertEqual(sorted(changed), sorted({self.chunk(product) for product in self.products}))
+        self.assertEqual(removed, [])
+        index = (self.root / 'sitemap.xml').read_text()
+        for chunk in changed:
+            self.assertIn(f'https://shop.example/sitemap-products-{chunk}.xml', index)
+
+        # Ничего не менялось - ничего не пересобирается
+        self.assertEqual(build_feeds(), ([], []))
+
+        product = self.products[1]
+        product.quantity = 0
+        product.save()
+        self.assertEqual(build_feeds(), ([self.chunk(product)], []))
+
+        chunk = self.chunk(self.products[0])
+        Product.objects.filter(pk__in=[product.pk for product in self.products if self.chunk(product) == chunk]).delete()
+        changed, removed = build_feeds()
+        self.assertEqual(removed, [chunk])
+        self.assertFalse((self.root / f'sitemap-products-{chunk}.xml').exists())
+
+    def test_contents(self):
+        build_feeds()
+        sitemap = (self.root / f'sitemap-products-{self.chunk(self.products[0])}.xml').read_text()
+        # Непереведённый товар - только на языке по умолчанию
+        self.assertIn('/ring-0/', sitemap)
+        self.assertNotIn('/en/product/ring-0/', sitemap)
+
+        rows = (self.root / 'products.csv').read_text().splitlines()
+        self.assertEqual(rows[0], 'id,title,description,link,image_link,price,availability')
+        self.assertEqual([row.rsplit(',', 2)[1:] for row in rows[1:]],
+                         [['150.00 USD', 'out of stock'], ['150.00 USD', 'in stock'], ['150.00 USD', 'in stock']])
+
+
+class FacetTests(TestCase):
+    """Счётчики фасетов одним GROUP BY: каждый счётчик равен числу товаров, которое покажет выбор этого значения"""
+
+    @classmethod
+    def setUpTestData(cls):
+        parent = Category.objects.create(title='Украшения', slug='jewelry')
+        rings = Category.objects.create(title='Кольца', slug='rings', parent=parent)
+        chains = Category.objects.create(title='Цепочки', slug='chains', parent=parent)
+        specs = [
+            (rings, 'Золото', 'Gold', 16, 300), (rings, 'Золото', 'Gold', 17, 700), (rings, 'Серебро', '', 16, 1500),
+            (chains, 'Золото', 'Gold', 45, 2500), (chains, 'Серебро', '', 50, 450), (chains, 'Серебро', '', 45, 900),
+        ]
+        for i, (category, color, color_en, size, price) in enumerate(specs):
+            Product.objects.create(title=f'Товар {i}', slug=f'item-{i}', category=category, color=color,
+                                   color_en=color_en, size=size, price=price, quantity=1)
+        cls.products = Product.objects.filter(category__in=[rings, chains])
+
+    def assert_counts(self, filters, language='ru'):
+        counts = count_facets(self.products, filters, language)
+        for name, values in counts.items():
+            for value, count in values.items():
+                with self.subTest(filters=filters, facet=name, value=value):
+                    expected = filter_products(self.products, {**filters, name: {value}}, language).count()
+                    self.assertEqual(count, expected)
+        return counts
+
+    def test_counts_without_filters(self):
+        counts = self.assert_counts({})
+        self.assertEqual(counts['type'], {'rings': 3, 'chains': 3})
+        self.assertEqual(counts['color'], {'Золото': 3, 'Серебро': 3})
+        self.assertEqual(counts['price'], {'0-500': 2, '500-1000': 2, '1000-2000': 1, '2000-': 1})
+
+    def test_counts_with_filters(self):
+        counts = self.assert_counts({'color': {'Золото'}, 'size': {'16', '45'}})
+        # Выбор внутри фасета не обнуляет его же счётчики
+        self.assertEqual(counts['color'], {'Золото': 2, 'Серебро': 2})
+        self.assertEqual(counts['type'], {'rings': 1, 'chains': 1})
+        self.assertEqual(filter_products(self.products, {'color': {'Золото'}, 'size': {'16', '45'}}, 'ru').count(), 2)
+
+    def test_translated_colors(self):
+        # Без перевода цвет берётся с языка по умолчанию
+        counts = self.assert_counts({'price': {'0-500', '2000-'}}, language='en')
+        self.assertEqual(counts['color'], {'Gold': 2, 'Серебро': 1})
+
+
+class SupplierSyncTests(TestCase):
+    """Синхронизация с файлом поставщика: неизменившиеся строки пропускаются по отпечатку,
+    остаток на сайте - остаток поставщика за вычетом резерва в корзинах"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Кольца', slug='rings')
+        cls.ring = Product.objects.create(title='Кольцо', slug='ring', price=100, quantity=5, category=category)
+        cls.watch = Product.objects.create(title='Часы', slug='watch', price=300, quantity=2, category=category)
+        cls.chain = Product.objects.create(title='Цепочка', slug='chain', price=50, quantity=1, category=category)
+        OrderProduct.objects.create(order=Order.objects.create(), product=cls.ring, quantity=3)
+        # Завершённый заказ уже продан и из остатка поставщика не вычитается
+        OrderProduct.objects.create(order=Order.objects.create(is_completed=True), product=cls.watch, quantity=1)
+
+    def sync(self, text, **kwargs):
+        return sync_supplier_feed(io.StringIO(text), chunk_size=2, **kwargs)
+
+    def state(self):
+        return {slug: (str(price), quantity) for slug, price, quantity in
+                Product.objects.values_list('slug', 'price', 'quantity')}
+
+    def test_sync(self):
+        feed = ('slug,price,quantity\n'
+                'ring,120.50,10\n'
+                'watch,300,4\n'
+                'chain,50,1\n'
+                'missing,10,1\n'
+                ',10,1\n')
+        stats = self.sync(feed)
+        self.assertEqual(dict(stats), {'scanned': 5, 'changed': 2, 'unchanged': 1, 'unknown': 1, 'invalid': 1})
+        self.assertEqual(self.state(), {'ring': ('120.50', 7), 'watch': ('300.00', 4), 'chain': ('50.00', 1)})
+        self.assertEqual(list(StockMovement.objects.order_by('product_id').values_list('product_id', 'kind', 'delta')),
+                         [(self.ring.pk, StockMovement.RESTOCK, 2), (self.watch.pk, StockMovement.RESTOCK, 2)])
+
+        # Тот же файл: строки с сохранённым отпечатком не разбираются и ничего не пишут
+        updated = dict(Product.objects.values_list('slug', 'updated_at'))
+        movements = StockMovement.objects.count()
+        stats = self.sync(feed)
+        self.assertEqual((stats['changed'], stats['unchanged']), (0, 3))
+        self.assertEqual(StockMovement.objects.count(), movements)
+        self.assertEqual(dict(Product.objects.values_list('slug', 'updated_at')), updated)
+
+        stats = self.sync(feed, force=True)
+        self.assertEqual((stats['changed'], stats['unchanged']), (0, 3))
+
+    def test_reserved_exceeds_stock(self):
+        self.sync('slug,price,quantity\nring,100,2\n')
+        self.ring.refresh_from_db()
+        self.assertEqual(self.ring.quantity, 0)
+        self.assertEqual(StockMovement.objects.get().delta, -5)
+
+    def test_invalid_rows(self):
+        stats = self.sync('slug;price;quantity\nring;10;2.5\nwatch;1e20;1\nchain;-5;1\nghost;abc;1\n', delimiter=';')
+        self.assertEqual((stats['invalid'], stats['unknown'], stats['changed']), (3, 1, 0))
+        with self.assertRaises(ValueError):
+            self.sync('slug,cost\nring,10\n')
+
+
+class ReconcileTests(TestCase):
+    """Сверка журнала движений с Product.quantity: reconcile_stock находит расхождения, --fix их закрывает"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer')
+        category = Category.objects.create(title='Кольца', slug='rings')
+        cls.ring = Product.objects.create(title='Кольцо', slug='ring', price=100, quantity=5, category=category)
+        cls.watch = Product.objects.create(title='Часы', slug='watch', price=300, quantity=2, category=category)
+
+    def reconcile(self, *args):
+        out = io.StringIO()
+        call_command('reconcile_stock', '--batch-size', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_fix(self):
+        # Товары созданы без движений: по журналу у них 0
+        with self.assertRaises(CommandError) as error:
+            self.reconcile()
+        self.assertEqual(error.exception.returncode, 1)
+
+        self.assertIn('записаны корректировки', self.reconcile('--fix'))
+        self.assertEqual(sorted(StockMovement.objects.values_list('product_id', 'kind', 'delta')),
+                         [(self.ring.pk, StockMovement.ADJUSTMENT, 5), (self.watch.pk, StockMovement.ADJUSTMENT, 2)])
+        self.assertIn('расхождений: 0', self.reconcile())
+        self.assertIn('расхождений: 0', self.reconcile('--full'))
+
+    def test_snapshot_and_tail(self):
+        self.reconcile('--fix')
+        # Снимок учитывает только движения старше SNAPSHOT_LAG
+        self.assertEqual(take_snapshot(), (0, 0))
+        StockMovement.objects.update(created_at=timezone.now() - SNAPSHOT_LAG * 2)
+        count, watermark = take_snapshot(batch_size=1)
+        self.assertEqual(count, 2)
+        self.assertEqual(dict(StockSnapshot.objects.values_list('product_id', 'quantity')),
+                         {self.ring.pk: 5, self.watch.pk: 2})
+
+        # Движения после снимка досчитываются хвостом журнала
+        cart = CartForAuthenticatedUser(SimpleNamespace(user=self.user, session={}))
+        cart.set_quantities({self.ring.pk: 2})
+        self.assertIn('расхождений: 0', self.reconcile())
+
+        # Остаток изменён мимо журнала
+        Product.objects.filter(pk=self.watch.pk).update(quantity=7)
+        with self.assertRaises(CommandError):
+            self.reconcile()
+        self.assertIn(f'товар {self.watch.pk}: на складе 7, по журналу 2 (+5)', self.reconcile('--fix'))
+        self.assertIn('расхождений: 0', self.reconcile('--full'))
+
+
+class SalesRollupTests(TestCase):
+    """Агрегаты продаж по часам и дням: из рабочих и архивных заказов, окнами, повторный запуск ничего не удваивает"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Кольца', slug='rings')
+        cls.ring = Product.objects.create(title='Кольцо', slug='ring', price=100, quantity=50, category=category)
+        cls.watch = Product.objects.create(title='Часы', slug='watch', price=300, quantity=50, category=category)
+        cls.hour = (timezone.now() - timedelta(days=3)).replace(minute=0, second=0, microsecond=0)
+        cls.order(cls.hour + timedelta(minutes=10), [(cls.ring, 2, 100)])
+        cls.order(cls.hour + timedelta(minutes=50), [(cls.ring, 1, 100), (cls.watch, 1, 300)])
+        # 40 дней назад - первичный пересчёт идёт двумя окнами по ROLLUP_WINDOW
+        cls.old_hour = cls.hour - timedelta(days=40)
+        cls.order(cls.old_hour + timedelta(minutes=5), [(cls.watch, 1, 300)])
+        # Только что оплаченный заказ ждёт ROLLUP_LAG, открытая корзина не считается
+        cls.recent = cls.order(timezone.now() - timedelta(minutes=1), [(cls.ring, 1, 100)])
+        OrderProduct.objects.create(order=Order.objects.create(), product=cls.ring, quantity=5)
+
+        cls.archived_hour = cls.hour + timedelta(days=1)
+        archived = ArchivedOrder.objects.create(id=10 ** 6, created_at=cls.archived_hour, updated_at=cls.archived_hour,
+                                                completed_at=cls.archived_hour)
+        ArchivedOrderProduct.objects.create(order=archived, product=cls.ring, quantity=3, price=90,
+                                            added_at=cls.archived_hour)
+
+    @classmethod
+    def order(cls, completed_at, lines):
+        order = Order.objects.create(is_completed=True, completed_at=completed_at)
+        OrderProduct.objects.bulk_create([OrderProduct(order=order, product=product, quantity=quantity, price=price)
+                                          for product, quantity, price in lines])
+        return order
+
+    def hourly(self):
+        return {(hour, product_id): (units, str(revenue)) for hour, product_id, units, revenue in
+                SalesHourly.objects.values_list('hour', 'product_id', 'units', 'revenue')}
+
+    def test_rollup(self):
+        start, cutoff = rollup_sales()
+        self.assertEqual(start, self.old_hour)
+        self.assertEqual(self.hourly(), {
+            (self.old_hour, self.watch.pk): (1, '300.00'),
+            (self.hour, self.ring.pk): (3, '300.00'),
+            (self.hour, self.watch.pk): (1, '300.00'),
+            (self.archived_hour, self.ring.pk): (3, '270.00'),
+        })
+        self.assertEqual(SalesDaily.objects.get(day=timezone.localdate(self.hour), product=self.ring).units, 3)
+
+        # Следующий запуск пересчитывает с последнего посчитанного часа и подхватывает отложенный заказ
+        Order.objects.filter(pk=self.recent.pk).update(completed_at=timezone.now() - ROLLUP_LAG * 2)
+        rollup_sales()
+        rollup_sales()
+        hourly = self.hourly()
+        self.assertEqual(sum(units for units, revenue in hourly.values()), 9)
+        self.assertEqual(hourly[self.hour, self.ring.pk], (3, '300.00'))
+        self.assertEqual(SalesDaily.objects.aggregate(units=Sum('units'))['units'], 9)
+
+        rollup_sales(rebuild=True)
+        self.assertEqual(self.hourly(), hourly)
+
+    def test_dashboard(self):
+        Order.objects.filter(pk=self.recent.pk).update(completed_at=timezone.now() - ROLLUP_LAG * 2)
+        rollup_sales()
+        data = dashboard(days=7)
+        # Заказ 40-дневной давности в неделю не попадает
+        self.assertEqual((data['total_units'], str(data['total_revenue'])), (8, '970.00'))
+        self.assertEqual(len(data['series']), 7)
+        self.assertEqual(data['top_products'][0], {'pk': self.ring.pk, 'title': 'Кольцо', 'units': 7,
+                                                   'revenue': Money(67000)})
+
+
+class ArchiveTests(TestCase):
+    """Перенос старых заказов в архив и история заказов по рабочим и архивным таблицам"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Кольца', slug='rings')
+        cls.ring = Product.objects.create(title='Кольцо', slug='ring', price=100, quantity=50, category=category)
+        cls.user = User.objects.create_user('buyer', password='password')
+        cls.customer = Customer.objects.create(user=cls.user, first_name='Покупатель')
+        other = Customer.objects.create(user=User.objects.create_user('other'), first_name='Другой')
+        now = timezone.now()
+        # Три заказа старше cutoff, два свежих; старая открытая корзина и чужой заказ в историю не попадают
+        cls.old = [cls.order(cls.customer, now - timedelta(days=100 + i), quantity=i + 1) for i in range(3)]
+        cls.recent = [cls.order(cls.customer, now - timedelta(days=1 + i), quantity=1) for i in range(2)]
+        cls.other = cls.order(other, now - timedelta(days=50), quantity=1)
+        cls.cart = Order.objects.create(customer=cls.customer)
+        Order.objects.filter(pk=cls.cart.pk).update(created_at=now - timedelta(days=200))
+        ShippingAddress.objects.create(customer=cls.customer, order=cls.old[0], city='Москва', state='Москва',
+                                       street='Тверская, 1')
+
+    @classmethod
+    def order(cls, customer, created_at, quantity):
+        order = Order.objects.create(customer=customer, is_completed=True, completed_at=created_at,
+                                     total_price=100 * quantity, total_quantity=quantity)
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        OrderProduct.objects.create(order=order, product=cls.ring, quantity=quantity, price=100)
+        return order
+
+    def setUp(self):
+        self.jsonl_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.jsonl_dir)
+
+    def archive(self):
+        return archive_orders(timezone.now() - timedelta(days=30), batch_size=2, jsonl_dir=self.jsonl_dir)
+
+    def test_archive_orders(self):
+        self.assertEqual(self.archive(), (4, 4))
+        self.assertEqual(self.archive(), (0, 0))
+        self.assertQuerySetEqual(Order.objects.order_by('pk'), [*self.recent, self.cart])
+        self.assertFalse(OrderProduct.objects.filter(order__in=[*self.old, self.other]).exists())
+        self.assertFalse(ShippingAddress.objects.exists())
+
+        archived = ArchivedOrder.objects.get(pk=self.old[0].pk)
+        self.assertEqual((archived.customer, archived.total_price, archived.total_quantity),
+                         (self.customer, Money(10000), 1))
+        self.assertEqual([(a['city'], a['street']) for a in archived.shipping_addresses], [('Москва', 'Тверская, 1')])
+        self.assertEqual(list(archived.ordered.values_list('product', 'quantity', 'price')),
+                         [(self.ring.pk, 1, Money(10000))])
+
+        # Копия каждой пачки в JSONL, суммы в центах
+        files = sorted(Path(self.jsonl_dir).glob('orders-*.jsonl.gz'))
+        self.assertEqual(len(files), 2)
+        with gzip.open(files[0], 'rt', encoding='utf-8') as file:
+            record = json.loads(file.readline())
+        self.assertEqual((record['id'], record['total_price'], record['lines'][0]['price']),
+                         (self.old[0].pk, 10000, 10000))
+
+    def test_history_spans_archive(self):
+        self.archive()
+        expected = [order.pk for order in [*self.recent, *self.old]]
+
+        orders = completed_orders(self.user, limit=10)
+        self.assertEqual([order.pk for order in orders], expected)
+        self.assertIsInstance(orders[-1], ArchivedOrder)
+        with self.assertNumQueries(0):
+            self.assertEqual([line.quantity for order in orders for line in order.ordered.all()], [1, 1, 1, 2, 3])
+
+        # Страницы по ключу проходят обе таблицы без пропусков и повторов
+        self.client.force_login(self.user)
+        seen, cursor = [], None
+        with mock.patch('shop.views.orders.ORDERS_PER_PAGE', 2):
+            for _ in range(3):
+                response = self.client.get(reverse('order_history'), {'after': cursor} if cursor else {})
+                seen += [order.pk for order in response.context['orders']]
+                cursor = response.context['next_cursor']
+        self.assertEqual(seen, expected)
+        self.assertIsNone(cursor)
+
+
+class BulkEditTests(TestCase):
+    """Массовая правка товаров из CSV: один UPDATE с CASE на пачку, изменения остатка - в журнал движений"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Кольца', slug='rings')
+        cls.ring = Product.objects.create(title='Кольцо', slug='ring', price=100, quantity=5, size=18, color='Золото',
+                                          category=category)
+        cls.chain = Product.objects.create(title='Цепь', slug='chain', price=100, quantity=5, category=category)
+        cls.watch = Product.objects.create(title='Часы', slug='watch', price=50, quantity=0, category=category)
+
+    def test_read_csv_errors(self):
+        # Некорректная цена, отрицательный остаток, повтор товара и пустой slug
+        key, rows, errors = read_csv('slug,price,quantity\nring,1,1\nchain,abc,1\nwatch,1,-2\nring,2,2\n,1,1\n')
+        self.assertEqual(key, 'slug')
+        self.assertEqual(rows, [(2, 'ring', {'price': Money.parse('1'), 'quantity': 1})])
+        self.assertEqual([line for line, error in errors], [3, 4, 5, 6])
+        self.assertEqual(read_csv('name,price\nring,1\n')[2], [(1, 'Нужна колонка id или slug')])
+
+    def test_apply_changes(self):
+        last_movement = StockMovement.objects.order_by('pk').values_list('pk', flat=True).last() or 0
+        watch_updated_at = Product.objects.get(pk=self.watch.pk).updated_at
+        key, rows, errors = read_csv('slug,price,quantity,color\n'
+                                     'ring,120,8,Серебро\n'
+                                     'chain,120,2,\n'
+                                     'watch,50,0,\n'
+                                     'missing,1,1,\n')
+        self.assertEqual(errors, [])
+
+        with CaptureQueriesContext(connection) as queries:
+            stats, errors = apply_changes(key, rows)
+        self.assertEqual(stats, {'changed': 2, 'unchanged': 1})
+        self.assertEqual(errors, [(5, 'Товар missing не найден')])
+        # Одна общая цена - один WHEN, всё одним UPDATE
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updates[0].count('WHEN'), 5)
+
+        ring, chain, watch = (Product.objects.get(pk=product.pk) for product in (self.ring, self.chain, self.watch))
+        self.assertEqual((ring.price, ring.quantity, ring.size, ring.color_ru), (Money(12000), 8, 18, 'Серебро'))
+        self.assertEqual((chain.price, chain.quantity, chain.color_ru), (Money(12000), 2, 'Серебро'))
+        self.assertEqual(watch.updated_at, watch_updated_at)
+        self.assertEqual(sorted(StockMovement.objects.filter(pk__gt=last_movement)
+                                .values_list('product', 'kind', 'delta')),
+                         sorted([(self.ring.pk, StockMovement.RESTOCK, 3),
+                                 (self.chain.pk, StockMovement.ADJUSTMENT, -3)]))
+
+
+class MediaServingTests(SimpleTestCase):
+    """Загрузки: имя с хешем содержимого, диапазоны (206/416), If-Range, 304 по ETag и X-Accel-Redirect"""
+    name = 'products/watch.0123456789ab.jpg'
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(MEDIA_ROOT=self.root, MEDIA_ACCEL_REDIRECT='')
+        override.enable()
+        self.addCleanup(override.disable)
+        self.content = bytes(range(256)) * 4
+        (self.root / 'products').mkdir()
+        (self.root / self.name).write_bytes(self.content)
+
+    def get(self, name=None, **headers):
+        response = serve_media(RequestFactory().get(f'/media/{name or self.name}', headers=headers),
+                               name or self.name)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertEqual(response.headers['Content-Type'], 'image/jpeg')
+        self.assertEqual(response.headers['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+    def test_range(self):
+        response = self.get(range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(response.headers['Content-Length'], '10')
+        self.assertEqual(self.body(response), self.content[10:20])
+
+        # Последние N байт и открытый конец
+        self.assertEqual(self.body(self.get(range='bytes=-5')), self.content[-5:])
+        response = self.get(range='bytes=1000-')
+        self.assertEqual(response.headers['Content-Range'], f'bytes 1000-1023/{len(self.content)}')
+        self.assertEqual(self.body(response), self.content[1000:])
+
+        # Несколько частей не поддерживаются - весь файл
+        response = self.get(range='bytes=0-1,5-6')
+        self.assertEqual((response.status_code, self.body(response)), (200, self.content))
+
+    def test_range_not_satisfiable(self):
+        for header in ('bytes=1024-', 'bytes=-0'):
+            response = self.get(range=header)
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response.headers['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_conditional(self):
+        etag = self.get().headers['ETag']
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+        # If-Range с текущим ETag - диапазон, с чужим - файл изменился, отдаётся целиком
+        self.assertEqual(self.get(range='bytes=0-9', if_range=etag).status_code, 206)
+        response = self.get(range='bytes=0-9', if_range='"stale"')
+        self.assertEqual((response.status_code, self.body(response)), (200, self.content))
+
+    def test_accel_redirect(self):
+        with override_settings(MEDIA_ACCEL_REDIRECT='/protected-media/'):
+            response = self.get(range='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+    def test_not_found(self):
+        for name in ('products/missing.jpg', 'products', '../secret.txt'):
+            with self.subTest(name=name), self.assertRaises(Http404):
+                serve_media(RequestFactory().get('/media/x'), name)
+
+    def test_hashed_storage(self):
+        storage = HashedFileSystemStorage(location=self.root)
+        name = storage.save('products/ring.jpg', ContentFile(b'ring'))
+        self.assertRegex(name, r'^products/ring\.[0-9a-f]{12}\.jpg$')
+        # Тот же файл - то же имя без копии, другой - новое имя
+        self.assertEqual(storage.save('products/ring.jpg', ContentFile(b'ring')), name)
+        self.assertNotEqual(storage.save('products/ring.jpg', ContentFile(b'ring2')), name)
+        self.assertEqual(len(list((self.root / 'products').glob('ring.*'))), 2)
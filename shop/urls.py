@@ -1,24 +1,30 @@
 from django.urls import path
 
-from .views import *
+from .views import catalog, accounts, orders, payment, mailing, health
 
 
 urlpatterns = [
-    path('', Index.as_view(), name='index'),
-    path('category/<slug:slug>/', SubCategories.as_view(), name='category_detail'),
-    path('product/<slug:slug>/', ProductPage.as_view(), name='product_page'),
-    path('user_favorites/', FavoriteProductsView.as_view(), name='favorite_product_page'),
-    path('login_registration/', login_registration, name='login_registration'),
-    path('login', user_login, name='user_login'),
-    path('logout', user_logout, name='user_logout'),
-    path('registration', user_registration, name='user_registration'),
-    path('save_review/<int:product_pk>', save_review, name='save_review'),
-    path('add_favorite/<slug:product_slug>/', save_favorite_product, name='add_favorite'),
-    path('save_email/', save_subscribers, name='save_subscribers'),
-    path('cart/', cart, name='cart'),
-    path('to_cart/<int:product_id>/<str:action>/', to_cart, name='to_cart'),
-    path('checkout/', checkout, name='checkout'),
-    path('payment/', create_checkout_session, name='payment'),
-    path('payment_success/', successPayment, name='success'),
-    path('send_email/', send_mail_to_subscribers, name='send_email')
+    path('', catalog.Index.as_view(), name='index'),
+    path('category/<slug:slug>/', catalog.SubCategories.as_view(), name='category_detail'),
+    path('product/<slug:slug>/', catalog.ProductPage.as_view(), name='product_page'),
+    path('user_favorites/', catalog.FavoriteProductsView.as_view(), name='favorite_product_page'),
+    path('login_registration/', accounts.login_registration, name='login_registration'),
+    path('login', accounts.user_login, name='user_login'),
+    path('logout', accounts.user_logout, name='user_logout'),
+    path('registration', accounts.user_registration, name='user_registration'),
+    path('save_review/<int:product_pk>', catalog.save_review, name='save_review'),
+    path('add_favorite/<slug:product_slug>/', catalog.save_favorite_product, name='add_favorite'),
+    path('save_email/', mailing.save_subscribers, name='save_subscribers'),
+    path('cart/', orders.cart, name='cart'),
+    path('to_cart/<int:product_id>/<str:action>/', orders.to_cart, name='to_cart'),
+    path('cart/update/', orders.update_cart, name='update_cart'),
+    path('checkout/', orders.checkout, name='checkout'),
+    path('orders/', orders.order_history, name='order_history'),
+    path('payment/', payment.create_checkout_session, name='payment'),
+    path('payment_success/', payment.successPayment, name='success'),
+    path('payment_cancel/', payment.cancelPayment, name='payment_cancel'),
+    path('send_email/', mailing.send_mail_to_subscribers, name='send_email'),
+    path('ready/', health.readiness, name='readiness'),
+    path('metrics/', health.metrics, name='metrics'),
+    path('csrf/', accounts.csrf_token, name='csrf_token')
 ]
\ No newline at end of file
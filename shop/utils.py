@@ -1,4 +1,14 @@
-from .models import Product, OrderProduct, Order, Customer
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import inventory, metrics
+from .models import Product, OrderProduct, Order, Customer, FavoriteProducts, StockMovement
+from .money import Money
+
+
+CART_SESSION_KEY = 'cart_order_id'
 
 
 class CartForAuthenticatedUser:
@@ -6,14 +16,37 @@ class CartForAuthenticatedUser:
 
     def __init__(self, request, product_id=None, action=None):
         self.user = request.user
+        self.session = request.session
+        self.order = None
         if product_id and action:
             self.add_or_delete(product_id, action)
 
+    def get_order(self):
+        """Активная (незавершенная) корзина пользователя.
+        ID корзины хранится в сессии, поэтому обычно это один запрос по первичному ключу"""
+        if self.order is not None:
+            return self.order
+
+        order_id = self.session.get(CART_SESSION_KEY)
+        if order_id:
+            self.order = Order.objects.filter(pk=order_id, is_completed=False).first()
+            if self.order:
+                return self.order
+
+        customer, created = Customer.objects.get_or_create(user=self.user)
+        self.order, created = Order.objects.get_or_create(customer=customer, is_completed=False)
+        self.session[CART_SESSION_KEY] = self.order.pk
+        return self.order
+
+    def forget_order(self):
+        """Сброс закешированной в сессии корзины (например, после завершения заказа)"""
+        self.session.pop(CART_SESSION_KEY, None)
+        self.order = None
+
     def get_cart_info(self):
         """Получение информации о корзине (кол-во и сумма товаров) и заказчике"""
-        customer, created = Customer.objects.get_or_create(user=self.user)
-        order, created = Order.objects.get_or_create(customer=customer)
-        order_products = order.ordered.all()
+        order = self.get_order()
+        order_products = order.ordered.select_related('product').prefetch_related('product__images')
         cart_total_quantity = order.get_cart_total_quantity
         cart_total_price = order.get_cart_total_price
 
@@ -25,34 +58,128 @@ class CartForAuthenticatedUser:
         }
 
     def add_or_delete(self, product_id, action):
-        """Добавление и удаление товара по нажатию на плюс и минус"""
-        order = self.get_cart_info()['order']
-        product = Product.objects.get(pk=product_id)
-        order_product, created = OrderProduct.objects.get_or_create(order=order, product=product)
-
-        if action == 'add' and product.quantity > 0:
-            order_product.quantity += 1
-            product.quantity -= 1
-        elif action == 'delete':
-            order_product.quantity -= 1
-            product.quantity += 1
-        elif action == 'remove':
-            product.quantity += order_product.quantity
-            order_product.quantity -= order_product.quantity
-
-        product.save()
-        order_product.save()
-
-        if order_product.quantity < 1:
-            order_product.delete()
+        """Добавление и удаление товара по нажатию на плюс и минус.
+        Остаток меняется одним UPDATE с F() без чтения строки товара (популярный товар - горячая строка),
+        движение пишется в журнал в той же транзакции"""
+        with transaction.atomic():
+            order = self.get_order()
+            product = Product.objects.get(pk=product_id)
+            order_product, created = OrderProduct.objects.get_or_create(order=order, product=product)
+            current = order_product.quantity or 0
+
+            delta = 0  # изменение остатка на складе
+            if action == 'add':
+                delta = -1
+            elif action == 'delete' and current > 0:
+                delta = 1
+            elif action == 'remove':
+                delta = current
+
+            products = Product.objects.filter(pk=product.pk)
+            if delta < 0:
+                products = products.filter(quantity__gte=-delta)
+            if delta and products.update(quantity=F('quantity') + delta, updated_at=timezone.now()):
+                order_product.quantity = current - delta
+                order_product.save(update_fields=['quantity'])
+                inventory.record([inventory.cart_movement(product.pk, delta, order.pk)])
+            # Отмечаем активность корзины, чтобы ее не забрал сборщик брошенных корзин
+            order.save(update_fields=['updated_at'])
+
+            if order_product.quantity < 1:
+                order_product.delete()
+        metrics.inc('shop_cart_actions_total', action=action)
+
+    def set_quantities(self, quantities):
+        """Установка количества сразу для нескольких товаров корзины.
+        quantities - словарь {id товара: новое количество}, 0 убирает товар из корзины.
+        Остатки всех товаров проверяются одним запросом; если какого-то товара не хватает,
+        корзина не меняется и возвращается словарь {id товара: доступное количество}"""
+        with transaction.atomic():
+            order = self.get_order()
+            products = Product.objects.select_for_update().in_bulk(list(quantities))
+            lines = {line.product_id: line for line in
+                     OrderProduct.objects.select_for_update().filter(order=order, product_id__in=list(quantities))}
+
+            errors = {}
+            for product_id, quantity in quantities.items():
+                product = products.get(product_id)
+                line = lines.get(product_id)
+                # Товар в корзине уже снят со склада, поэтому он тоже доступен
+                available = (product.quantity if product else 0) + ((line.quantity or 0) if line else 0)
+                if product is None or quantity > available:
+                    errors[product_id] = available
+            if errors:
+                return errors
+
+            now = timezone.now()
+            changed_products, changed_lines, new_lines, removed_lines, movements = [], [], [], [], []
+            for product_id, quantity in quantities.items():
+                product = products[product_id]
+                line = lines.get(product_id)
+                current = (line.quantity or 0) if line else 0
+                if quantity == current:
+                    continue
+
+                product.quantity -= quantity - current
+                product.updated_at = now
+                changed_products.append(product)
+                movements.append(inventory.cart_movement(product_id, current - quantity, order.pk))
+                if line is None:
+                    new_lines.append(OrderProduct(order=order, product=product, quantity=quantity))
+                elif quantity == 0:
+                    removed_lines.append(line.pk)
+                else:
+                    line.quantity = quantity
+                    changed_lines.append(line)
+
+            Product.objects.bulk_update(changed_products, ['quantity', 'updated_at'])
+            OrderProduct.objects.bulk_update(changed_lines, ['quantity'])
+            OrderProduct.objects.bulk_create(new_lines)
+            OrderProduct.objects.filter(pk__in=removed_lines).delete()
+            inventory.record(movements)
+            order.save(update_fields=['updated_at'])
+        metrics.inc('shop_cart_actions_total', action='set')
+        return {}
+
+    def complete(self, expected_total=None):
+        """Завершение заказа после оплаты: цены строк и итоги фиксируются в заказе,
+        дальше история заказов не зависит от изменения цен и не пересчитывает суммы.
+        expected_total - сумма, которую подтвердил платёжный сервис: если корзину изменили
+        после оплаты и итог с ней не совпадает, заказ не завершается.
+        Возвращает завершённый заказ или None, если корзина пуста или сумма не совпала"""
+        with transaction.atomic():
+            order = self.get_order()
+            lines = list(order.ordered.select_related('product').select_for_update(of=('self',))
+                         .filter(product__isnull=False, quantity__gt=0))
+            if not lines:
+                return None
+            for line in lines:
+                line.price = line.product.price
+            total_price = sum((line.price * line.quantity for line in lines), Money(0))
+            if expected_total is not None and total_price != expected_total:
+                return None
+            OrderProduct.objects.bulk_update(lines, ['price'])
+            # Товар уже снят со склада резервом: резерв возвращается и тут же продаётся
+            inventory.record([StockMovement(product_id=line.product_id, kind=kind, delta=sign * line.quantity,
+                                            order_id=order.pk)
+                              for line in lines for kind, sign in ((StockMovement.RELEASE, 1), (StockMovement.SALE, -1))])
+            order.total_price = total_price
+            order.total_quantity = sum(line.quantity for line in lines)
+            order.is_completed = True
+            order.completed_at = timezone.now()
+            order.save(update_fields=['total_price', 'total_quantity', 'is_completed', 'completed_at', 'updated_at'])
+        self.forget_order()
+        metrics.inc('shop_cart_actions_total', action='complete')
+        return order
 
     def clear(self):
         """Удаление всех товаров с корзины"""
-        order = self.get_cart_info()['order']
+        order = self.get_order()
         order_products = order.ordered.all()
         for product in order_products:
             product.delete()
         order.save()
+        metrics.inc('shop_cart_actions_total', action='clear')
 
 
 def get_cart_data(request):
@@ -66,3 +193,75 @@ def get_cart_data(request):
         'cart_total_quantity': cart_info['cart_total_quantity'],
         'cart_total_price': cart_info['cart_total_price']
     }
+
+
+def toggle_favorite(user, product_id):
+    """Добавление/удаление товара из избранного.
+    Сначала DELETE; если удалять было нечего - INSERT, дубликат отсекает уникальный индекс.
+    Возвращает True, если товар теперь в избранном"""
+    deleted, _ = FavoriteProducts.objects.filter(user=user, product_id=product_id).delete()
+    if deleted:
+        return False
+    FavoriteProducts.objects.bulk_create([FavoriteProducts(user=user, product_id=product_id)], ignore_conflicts=True)
+    return True
+
+
+def release_stale_carts(cutoff, batch_size=500):
+    """Возврат на склад товаров из корзин, брошенных до cutoff.
+    Обрабатывает корзины пачками по batch_size заказов, каждая пачка -
+    отдельная короткая транзакция. Возвращает (кол-во корзин, кол-во строк, кол-во единиц товара)"""
+    orders_count = lines_count = units_count = 0
+
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                OrderProduct.objects
+                .filter(order__is_completed=False, order__updated_at__lt=cutoff)
+                .values_list('order_id', flat=True)
+                .distinct()
+                .order_by('order_id')[:batch_size]
+            )
+            if not order_ids:
+                break
+
+            # Блокируем только строки текущей пачки
+            lines = list(
+                OrderProduct.objects
+                .select_for_update(of=('self',))
+                .filter(order_id__in=order_ids, order__updated_at__lt=cutoff)
+                .values_list('pk', 'product_id', 'quantity', 'order_id')
+            )
+
+            released, movements = {}, []
+            for pk, product_id, quantity, order_id in lines:
+                if product_id and quantity:
+                    released[product_id] = released.get(product_id, 0) + quantity
+                    movements.append(inventory.cart_movement(product_id, quantity, order_id))
+
+            # Один UPDATE на товар, без чтения текущего остатка. updated_at тоже меняется:
+            # от него зависят ETag, фасеты и пререндер страниц с остатком товара
+            now = timezone.now()
+            for product_id, quantity in sorted(released.items()):
+                Product.objects.filter(pk=product_id).update(quantity=F('quantity') + quantity, updated_at=now)
+
+            OrderProduct.objects.filter(pk__in=[line[0] for line in lines]).delete()
+            inventory.record(movements)
+
+        orders_count += len(order_ids)
+        lines_count += len(lines)
+        units_count += sum(released.values())
+
+    return orders_count, lines_count, units_count
+
+
+def clear_expired_sessions(batch_size=1000):
+    """Удаление истёкших сессий пачками по batch_size: короткие DELETE по первичному ключу
+    вместо одного долгого, который блокирует таблицу сессий. Возвращает кол-во удалённых сессий"""
+    now = timezone.now()
+    deleted_count = 0
+    while True:
+        keys = list(Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted_count
+        deleted, _ = Session.objects.filter(session_key__in=keys).delete()
+        deleted_count += deleted
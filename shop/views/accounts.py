@@ -0,0 +1,58 @@
+from django.shortcuts import render, redirect
+from django.http import JsonResponse
+from django.contrib.auth import login, logout
+from django.contrib import messages
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import never_cache
+
+from shop.forms import LoginForm, RegistrationForm
+from shop.ratelimit import ratelimit
+
+
+def login_registration(request):
+    """Страница Входа/Регистрации"""
+    context = {
+        'title': 'Войти/Зарегистрироваться',
+        'login_form': LoginForm,
+        'registration_form': RegistrationForm
+    }
+    return render(request, 'shop/login_registration.html', context)
+
+
+@ratelimit('login', '10/m', key='ip', methods=('POST',))
+def user_login(request):
+    """Авторизация пользователя"""
+    form = LoginForm(data=request.POST)
+    if form.is_valid():
+        user = form.get_user()
+        login(request, user)
+        return redirect('index')
+    else:
+        messages.error(request, 'Неверное имя пользователя или пароль')
+        return redirect('login_registration')
+
+
+@ratelimit('registration', '10/h', key='ip', methods=('POST',))
+def user_registration(request):
+    """Регистрация пользователя"""
+    form = RegistrationForm(data=request.POST)
+    if form.is_valid():
+        form.save()
+        messages.success(request, 'Аккаунт пользователя успешно создан! Пожалуйста войдите в свой аккаунт!')
+        return redirect('login_registration')
+    else:
+        for error in form.errors:
+            messages.error(request, form.errors[error].as_text())
+        return redirect('login_registration')
+
+
+def user_logout(request):
+    """Выход пользователя из личного кабинета"""
+    logout(request)
+    return redirect('login_registration')
+
+
+@never_cache
+def csrf_token(request):
+    """Токен CSRF для форм статических страниц (prerender_pages), заодно ставит cookie csrftoken"""
+    return JsonResponse({'token': get_token(request)})
@@ -0,0 +1,146 @@
+from django.shortcuts import redirect
+from django.http import JsonResponse, Http404
+from django.views.generic import ListView, DetailView
+from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
+from django.utils.translation import get_language
+from django.contrib.auth.mixins import LoginRequiredMixin
+
+from shop.models import Category, Product, Review, FavoriteProducts
+from shop.forms import ReviewForm
+from shop.utils import toggle_favorite
+from shop.caching import catalog_condition, category_last_modified, product_last_modified
+from shop.facets import build_facets, filter_products, selected_filters
+from shop.ratelimit import ratelimit
+
+
+class Index(ListView):
+    """Главная страница"""
+    model = Product
+    context_object_name = 'categories'
+    extra_context = {'title': 'Главная страница'}
+    template_name = 'shop/index.html'
+
+    def get_queryset(self):
+        """Вывод родительской категории"""
+        categories = Category.objects.filter(parent=None)
+        return categories
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        """Вывод на страницу дополнительных элементов"""
+        context = super().get_context_data()
+        context['top_products'] = Product.objects.order_by('-watched').prefetch_related('images')[:3]
+        return context
+
+
+@method_decorator(catalog_condition(category_last_modified), name='dispatch')
+class SubCategories(ListView):
+    """Вывод подкатегории на отдельной странице"""
+    paginate_by = 2
+    model = Product
+    context_object_name = 'products'
+    template_name = 'shop/category_page.html'
+
+    @cached_property
+    def parent_category(self):
+        """Родительская категория из адреса, один запрос на страницу"""
+        return Category.objects.get(slug=self.kwargs['slug'])
+
+    @cached_property
+    def subcategories(self):
+        return list(self.parent_category.subcategories.all())
+
+    def get_queryset(self):
+        """Получение товаров подкатегорий с учетом выбранных фильтров (?type=, ?color=, ?size=, ?price=)"""
+        products = Product.objects.filter(category__in=self.subcategories).prefetch_related('images')
+        products = filter_products(products, selected_filters(self.request.GET), get_language())
+
+        sort_field = self.request.GET.get('sort')
+        if sort_field:
+            products = products.order_by(sort_field)
+
+        return products
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        """Дополнительные элементы"""
+        context = super().get_context_data()
+        context['category'] = self.parent_category
+        context['title'] = self.parent_category.title
+        context['facets'] = build_facets(self.request, self.parent_category, self.subcategories)
+        return context
+
+
+@method_decorator(catalog_condition(product_last_modified), name='dispatch')
+class ProductPage(DetailView):
+    """Вывод товара на отдельной странице"""
+    model = Product
+    context_object_name = 'product'
+    template_name = 'shop/product_page.html'
+
+    def get_queryset(self):
+        """Товар вместе с категорией и фотографиями для слайдера"""
+        return Product.objects.select_related('category').prefetch_related('images')
+
+    def get_context_data(self, **kwargs):
+        """Вывод на страницу дополнительных элементов"""
+        context = super().get_context_data()
+        product = self.object
+        products = (Product.objects.exclude(pk=product.pk).filter(category_id=product.category_id)
+                    .order_by('pk').prefetch_related('images')[:5])
+        context['title'] = product.title
+        context['products'] = products
+        context['reviews'] = Review.objects.filter(product=product).select_related('author').order_by('-pk')
+
+        # Показывать форму отзыва, если пользователь прошел авторизацию
+        if self.request.user.is_authenticated:
+            context['review_form'] = ReviewForm
+
+        return context
+
+
+class FavoriteProductsView(LoginRequiredMixin, ListView):
+    """Для вывода избранных на страницу"""
+    model = FavoriteProducts
+    context_object_name = 'products'
+    template_name = 'shop/favorite_products.html'
+    login_url = 'user_registration'
+
+    def get_queryset(self):
+        """Получаем товары конкретного пользователя"""
+        user = self.request.user
+        products = Product.objects.filter(favoriteproducts__user=user).prefetch_related('images')
+        return products
+
+
+@ratelimit('review', '5/h', methods=('POST',))
+def save_review(request, product_pk):
+    """Сохранение отзыва"""
+    form = ReviewForm(data=request.POST)
+    if form.is_valid():
+        review = form.save(commit=False)
+        review.author = request.user
+        product = Product.objects.get(pk=product_pk)
+        review.product = product
+        review.save()
+        return redirect('product_page', product.slug)
+
+
+@ratelimit('favorites', '60/m')
+def save_favorite_product(request, product_slug):
+    """Добавление/удаление товара с избранных.
+    Для запросов с Accept: application/json отвечает JSON, чтобы обновить кнопку без перезагрузки"""
+    wants_json = 'application/json' in request.headers.get('Accept', '')
+    if not request.user.is_authenticated:
+        if wants_json:
+            return JsonResponse({'error': 'Авторизуйтесь, чтобы добавлять товары в избранное'}, status=401)
+        return redirect('login_registration')
+
+    product_id = Product.objects.filter(slug=product_slug).values_list('pk', flat=True).first()
+    if product_id is None:
+        raise Http404
+    is_favorite = toggle_favorite(request.user, product_id)
+
+    if wants_json:
+        return JsonResponse({'is_favorite': is_favorite})
+    next_page = request.META.get('HTTP_REFERER', 'category_detail')
+    return redirect(next_page)
@@ -0,0 +1,26 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
+
+from shop.metrics import render_prometheus
+
+
+@never_cache
+def readiness(request):
+    """Проверка готовности для балансировщика: 200 после успешного прогрева (warm_caches), иначе 503"""
+    if Path(settings.WARMUP_READY_FILE).exists():
+        return HttpResponse('ready', content_type='text/plain')
+    return HttpResponse('warming up', content_type='text/plain', status=503)
+
+
+@never_cache
+def metrics(request):
+    """Метрики в текстовом формате Prometheus. Доступ: персонал или Authorization: Bearer METRICS_TOKEN"""
+    token = settings.METRICS_TOKEN
+    has_token = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (has_token or (request.user.is_active and request.user.is_staff)):
+        return HttpResponse('Forbidden', content_type='text/plain', status=403)
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
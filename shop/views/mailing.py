@@ -0,0 +1,42 @@
+from django.shortcuts import render, redirect
+from django.contrib import messages
+from django.db.utils import IntegrityError
+
+from shop import metrics
+from shop.models import Mail
+from shop.ratelimit import ratelimit
+from app import settings
+
+
+@ratelimit('subscribe', '5/h', methods=('POST',))
+def save_subscribers(request):
+    """Собиратель почтовых адресов"""
+    email = request.POST.get('email')
+    user = request.user if request.user.is_authenticated else None
+    if email:
+        try:
+            Mail.objects.create(mail=email, user=user)
+            messages.success(request, 'Ваш почтовый адрес успешно зарегистрирован')
+        except IntegrityError:
+            messages.error(request, 'Вы уже являетесь подписчиком')
+    return redirect('index')
+
+
+def send_mail_to_subscribers(request):
+    """Отправка писем подписчикам"""
+    if request.method == 'POST':
+        # Почтовый клиент нужен только здесь: импорт и SMTP-соединение (одно на всю рассылку) -
+        # при первой отправке
+        from django.core.mail import EmailMessage, get_connection
+
+        text = request.POST.get('text')
+        emails = [
+            EmailMessage(subject='У нас новая акция', body=text, from_email=settings.EMAIL_HOST_USER, to=[mail])
+            for mail in Mail.objects.values_list('mail', flat=True)
+        ]
+        with get_connection(fail_silently=False) as connection:
+            sent = connection.send_messages(emails)
+        metrics.inc('shop_mails_sent_total', sent)
+
+    context = {'title': 'Спаммер'}
+    return render(request, 'shop/send_email.html', context)
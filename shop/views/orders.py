@@ -0,0 +1,131 @@
+import json
+from datetime import datetime
+
+from django.shortcuts import render, redirect
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from django.contrib import messages
+
+from shop.archive import completed_orders
+from shop.forms import ShippingForm, CustomerForm
+from shop.utils import CartForAuthenticatedUser, get_cart_data
+from shop.ratelimit import ratelimit
+
+
+def cart(request):
+    """Страница корзины"""
+    cart_info = get_cart_data(request)
+    context = {
+        'order': cart_info['order'],
+        'order_products': cart_info['order_products'],
+        'cart_total_quantity': cart_info['cart_total_quantity'],
+        'cart_total_price': cart_info['cart_total_price'],
+        'title': 'Корзина'
+    }
+    return render(request, 'shop/cart.html', context)
+
+
+@ratelimit('cart', '60/m')
+def to_cart(request, product_id, action):
+    """Добавляет товар в корзину"""
+    if request.user.is_authenticated:
+        CartForAuthenticatedUser(request, product_id, action)
+        return redirect('cart')
+    else:
+        messages.error(request, 'Авторизуйтесь или зарегистрируйтесь, чтобы совершать покупки')
+        return redirect('login_registration')
+
+
+@require_POST
+@ratelimit('cart', '60/m')
+def update_cart(request):
+    """JSON API корзины: установка количества сразу для нескольких товаров.
+    Тело запроса: {"items": [{"product": 1, "quantity": 3}, ...]}"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Авторизуйтесь, чтобы совершать покупки'}, status=401)
+
+    try:
+        items = json.loads(request.body)['items']
+        quantities = {}
+        for item in items:
+            product, quantity = item['product'], item['quantity']
+            # int() молча обрезал бы 2.9 и принял бы true; id товара из data-атрибута приходит строкой
+            if isinstance(product, (bool, float)) or not isinstance(quantity, int) or isinstance(quantity, bool):
+                raise ValueError
+            quantities[int(product)] = quantity
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Некорректный запрос'}, status=400)
+    if any(quantity < 0 for quantity in quantities.values()):
+        return JsonResponse({'error': 'Количество не может быть отрицательным'}, status=400)
+
+    user_cart = CartForAuthenticatedUser(request)
+    errors = user_cart.set_quantities(quantities)
+
+    order = user_cart.get_order()
+    # Строки удалённых товаров (product обнулён) не показываются и не считаются, как и при оплате
+    lines = list(order.ordered.select_related('product').filter(product__isnull=False))
+    data = {
+        'lines': [{'product': line.product_id,
+                   'quantity': line.quantity,
+                   'total_price': str(line.get_total_price),
+                   'stock': line.product.quantity} for line in lines],
+        'cart_total_quantity': sum(line.quantity for line in lines),
+        'cart_total_price': str(sum(line.get_total_price for line in lines)),
+    }
+    if errors:
+        data['errors'] = {product_id: {'available': available} for product_id, available in errors.items()}
+        return JsonResponse(data, status=409)
+    return JsonResponse(data)
+
+
+def checkout(request):
+    """Страница оформления заказа"""
+    cart_info = get_cart_data(request)
+    context = {
+        'order': cart_info['order'],
+        'order_products': cart_info['order_products'],
+        'cart_total_quantity': cart_info['cart_total_quantity'],
+        'cart_total_price': cart_info['cart_total_price'],
+        'customer_form': CustomerForm(),
+        'shipping_form': ShippingForm(),
+        'title': 'Оформление заказа'
+    }
+    return render(request, 'shop/checkout.html', context)
+
+
+ORDERS_PER_PAGE = 10
+
+
+def parse_cursor(value):
+    """Ключ последнего заказа страницы '<created_at>_<pk>' -> (datetime, pk) или None"""
+    created_at, _, pk = (value or '').rpartition('_')
+    try:
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError:
+        return None
+
+
+def order_history(request):
+    """История завершённых заказов покупателя, новые сверху, вместе с архивными.
+    Страницы по ключу (?after=<created_at>_<pk> последнего заказа), а не по OFFSET: каждая страница -
+    чтение ORDERS_PER_PAGE строк индексов shop_order_history_idx и shop_archive_history_idx,
+    сколько бы заказов ни было раньше. Строки заказов страницы загружаются одним запросом на таблицу"""
+    if not request.user.is_authenticated:
+        messages.error(request, 'Авторизуйтесь или зарегистрируйтесь, чтобы увидеть свои заказы')
+        return redirect('login_registration')
+
+    cursor = parse_cursor(request.GET.get('after'))
+    # Лишний заказ только показывает, что есть следующая страница
+    orders = completed_orders(request.user, cursor, ORDERS_PER_PAGE + 1)
+    next_cursor = None
+    if len(orders) > ORDERS_PER_PAGE:
+        orders = orders[:ORDERS_PER_PAGE]
+        next_cursor = f'{orders[-1].created_at.isoformat()}_{orders[-1].pk}'
+
+    context = {
+        'orders': orders,
+        'next_cursor': next_cursor,
+        'is_first_page': cursor is None,
+        'title': 'Мои заказы'
+    }
+    return render(request, 'shop/order_history.html', context)
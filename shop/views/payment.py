@@ -0,0 +1,106 @@
+from django.urls import reverse
+from django.shortcuts import render, redirect
+from django.contrib import messages
+
+from shop import metrics
+from shop.models import Customer, Order
+from shop.forms import ShippingForm, CustomerForm
+from shop.utils import CartForAuthenticatedUser
+from app import settings
+
+
+def get_stripe():
+    """Клиент Stripe. Импортируется при первой оплате, а не при старте воркера"""
+    import stripe
+
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    return stripe
+
+
+def create_checkout_session(request):
+    """Оплата на Stripe"""
+    if request.method == 'POST':
+        stripe = get_stripe()
+        user_cart = CartForAuthenticatedUser(request)
+        cart_info = user_cart.get_cart_info()
+        customer_form = CustomerForm(data=request.POST)
+        if customer_form.is_valid():
+            customer = Customer.objects.get(user=request.user)
+            customer.first_name = customer_form.cleaned_data['first_name']
+            customer.last_name = customer_form.cleaned_data['last_name']
+            customer.email = customer_form.cleaned_data['email']
+            customer.phone = customer_form.cleaned_data['phone']
+            customer.save()
+        shipping_form = ShippingForm(data=request.POST)
+        if shipping_form.is_valid():
+            address = shipping_form.save(commit=False)
+            address.customer = Customer.objects.get(user=request.user)
+            address.order = cart_info['order']
+            address.save()
+
+        # Цены хранятся в центах - в Stripe они уходят как есть, без перевода из float.
+        # Строки удалённых товаров и пустые строки не оплачиваются - как и в complete()
+        order_products = list(cart_info['order_products'].select_related('product')
+                              .filter(product__isnull=False, quantity__gt=0))
+        if not order_products:
+            messages.error(request, 'Корзина пуста')
+            return redirect('cart')
+
+        try:
+            session = stripe.checkout.Session.create(
+                line_items=[{
+                    'price_data': {'currency': 'usd',
+                                   'product_data': {'name': item.product.title},
+                                   'unit_amount': int(item.product.price)},
+                    'quantity': item.quantity} for item in order_products],
+                mode='payment',
+                # По client_reference_id страница успеха находит оплаченный заказ.
+                # Шаблон {CHECKOUT_SESSION_ID} подставляет Stripe, поэтому он дописывается после build_absolute_uri
+                client_reference_id=str(cart_info['order'].pk),
+                success_url=request.build_absolute_uri(reverse('success')) + '?session_id={CHECKOUT_SESSION_ID}',
+                cancel_url=request.build_absolute_uri(reverse('payment_cancel'))
+            )
+        except stripe.error.StripeError:
+            metrics.inc('shop_checkout_sessions_total', result='error')
+            raise
+        metrics.inc('shop_checkout_sessions_total', result='created')
+        return redirect(session.url, 303)
+
+
+def successPayment(request):
+    """Оплата прошла успешно: корзина становится завершённым заказом в истории.
+    Заказ завершается только если Stripe подтвердил оплату сессии этого пользователя"""
+    session_id = request.GET.get('session_id')
+    if not session_id or not request.user.is_authenticated:
+        return redirect('cart')
+    stripe = get_stripe()
+    try:
+        session = stripe.checkout.Session.retrieve(session_id)
+    except stripe.error.StripeError:
+        messages.error(request, 'Не удалось проверить оплату')
+        return redirect('cart')
+
+    order = Order.objects.filter(pk=session.client_reference_id, customer__user=request.user).first()
+    if order is None or session.payment_status != 'paid':
+        messages.error(request, 'Оплата не подтверждена')
+        return redirect('cart')
+    if not order.is_completed:
+        user_cart = CartForAuthenticatedUser(request)
+        if user_cart.get_order().pk != order.pk:
+            messages.error(request, 'Оплата не подтверждена')
+            return redirect('cart')
+        # Корзину могли изменить в другой вкладке уже после создания сессии:
+        # завершается только то, за что заплачено (amount_total - в центах, как и Money)
+        if user_cart.complete(expected_total=session.amount_total) is None:
+            metrics.inc('shop_checkout_sessions_total', result='mismatch')
+            messages.error(request, 'Корзина изменилась после оплаты, заказ не оформлен. Свяжитесь с нами')
+            return redirect('cart')
+        metrics.inc('shop_checkout_sessions_total', result='paid')
+        messages.success(request, 'Оплата прошла успешно')
+    return render(request, 'shop/success.html')
+
+
+def cancelPayment(request):
+    """Покупатель вернулся со Stripe без оплаты: корзина остаётся как была"""
+    messages.warning(request, 'Оплата отменена')
+    return redirect('cart')